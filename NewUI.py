@@ -1,23 +1,71 @@
+import os
 import sys
+import threading
 import time
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
-from PyQt6.QtCore import Qt, QThread, pyqtSignal as Signal
-from PyQt6.QtGui import QPixmap, QFont, QImage
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QRectF, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal as Signal
+from PyQt6.QtGui import QPixmap, QFont, QImage, QImageReader, QPainter, QPen, QColor
 from PyQt6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QLabel, QFileDialog,
+    QApplication, QWidget, QVBoxLayout, QGridLayout, QLabel, QFileDialog,
     QHeaderView, QTableWidgetItem, QFormLayout, QDoubleSpinBox, QHBoxLayout, QCheckBox, QComboBox,
     QSpinBox
 )
 from qfluentwidgets import (
     FluentWindow, NavigationItemPosition, MessageBox,
-    IndeterminateProgressBar, ScrollArea, PrimaryPushButton,
-    StrongBodyLabel, TableWidget, setTheme, Theme, FluentIcon as FIF
+    IndeterminateProgressBar, ProgressBar, ScrollArea, PrimaryPushButton,
+    StrongBodyLabel, BodyLabel, LineEdit, TableView, TableWidget, setTheme, Theme, FluentIcon as FIF
 )
-from ultralytics import YOLO
 
+from app_settings import detection_config, settings_store
+from batch_detect import collect_images
+from camera_capture import CameraGrabber, StreamScheduler
+from camera_discovery import load_cached_cameras, save_cached_cameras, scan_cameras
+from detection_cache import CACHE_CONF_FLOOR, DETECTION_CACHE_DIR, CachedDetections, detection_cache, file_digest, model_checksum
+from detection_log import AnnotatedVideoWriter, DetectionLogWriter, run_paths
+from detection_service import DEFAULT_PORT, RemoteModel
+from defect_tracker import DEFAULT_DETECT_INTERVAL, DefectTracker, save_defects, track_arrays
+from detection_utils import read_image_reduced
+from frame_display import DisplayFrameConverter
+from frame_gating import DEFAULT_MOTION_THRESHOLD, StreamGate
+from frame_scheduler import FrameScheduler
+from history_store import HistoryFilter, history_store
+from inference_backends import BACKENDS, DEFAULT_IMGSZ, compare_backends, format_report, load_backend
+from model_quantization import PRECISIONS, format_validation, load_quantized, quantize_model, validate_quantized
+from model_registry import DEFAULT_MODEL_PATH, registry
+from overlay_renderer import OverlayRenderer, result_arrays
+from parallel_video import ParallelVideoJob, format_summary
+from perf_monitor import format_hud, perf_monitor
+from tiled_inference import DEFAULT_TILE_OVERLAP, DEFAULT_TILE_SIZE, detect_tiled, load_image_mmap, tiling_variant
+from video_pipeline import VideoPipeline
+
+
+# ========================== 性能 HUD ==========================
+class PerfHudLabel(BodyLabel):
+    # 叠在检测画面下方的性能面板：定时从 perf_monitor 读取指定前缀各阶段的 P50/P95 与耗时分布，仅在可见时刷新
+    def __init__(self, prefix: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.prefix = prefix
+        self.setFont(QFont("Consolas", 9))
+        self.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.timer = QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh) # type: ignore
+        self.hide()
+
+    def refresh(self):
+        self.setText(format_hud(perf_monitor.snapshot(self.prefix), self.prefix) or "暂无性能数据")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
 
 # ========================== 视频检测界面 ==========================
 class VideoDetectionInterface(ScrollArea):
@@ -41,16 +89,13 @@ class VideoDetectionInterface(ScrollArea):
         self.video_path = None
         self.detection_model = None
         self.detection_thread = None
+        self.analysis_thread = None
+        self.frameConverter = DisplayFrameConverter()  # 显示帧的缩放与颜色转换在检测线程中完成
 
         self.initUI()
-        self.loadDetectionModel()
 
-    def loadDetectionModel(self):
-        path = 'models/best.pt'  # 确保模型文件路径正确
-        try:
-            self.detection_model = YOLO(path, task='detect')
-        except Exception as e:
-            MessageBox("错误", f"加载模型失败: {e}", self).exec()
+    def setDetectionModel(self, model):
+        self.detection_model = model  # 由 MainWindow 在模型加载完成后注入
 
     def initUI(self):
         layout = QVBoxLayout(self.view)
@@ -80,12 +125,24 @@ class VideoDetectionInterface(ScrollArea):
         self.stopButton.clicked.connect(self.stopVideoDetection) # type: ignore
         self.stopButton.setEnabled(False)
         controlsLayout.addWidget(self.stopButton)
+
+        self.analyzeButton = PrimaryPushButton("并行离线分析", self)
+        self.analyzeButton.clicked.connect(self.startParallelAnalysis) # type: ignore
+        self.analyzeButton.setEnabled(False)
+        controlsLayout.addWidget(self.analyzeButton)
         layout.addLayout(controlsLayout)
 
         self.progressBar = IndeterminateProgressBar(self)
         self.progressBar.hide()
         layout.addWidget(self.progressBar)
 
+        self.analysisProgressBar = ProgressBar(self)
+        self.analysisProgressBar.hide()
+        layout.addWidget(self.analysisProgressBar)
+
+        self.perfHud = PerfHudLabel("video/", self)
+        layout.addWidget(self.perfHud)
+
     def selectVideoFile(self):
         path, _ = QFileDialog.getOpenFileName(
             self, "选择视频文件", "", "视频文件 (*.mp4 *.avi *.mov *.mkv)"
@@ -93,43 +150,111 @@ class VideoDetectionInterface(ScrollArea):
         if path:
             self.video_path = path
             self.startButton.setEnabled(True)
+            self.analyzeButton.setEnabled(self.analysis_thread is None)
             self.videoDisplayLabel.setText(f"已选择视频: {path.split('/')[-1]}")
             if self.detection_thread and self.detection_thread.isRunning():
                 self.stopVideoDetection()
 
     def startVideoDetection(self):
-        if self.video_path and self.detection_model:
+        if self.detection_model is None:
+            MessageBox("提示", "检测模型正在加载，请稍候", self).exec()
+            return
+        if self.video_path:
             self.startButton.setEnabled(False)
             self.stopButton.setEnabled(True)
             self.progressBar.show()
-            confidence_threshold = self.main_window.confidenceSpinBox.value()
-            max_detections = self.main_window.maxDetSpinBox.value()
-            self.detection_thread = VideoDetectionThread(self.video_path, self.detection_model, conf=confidence_threshold, max_det=max_detections)
+            realtime = self.main_window.videoPacingComboBox.currentData()
+            track_interval = self.main_window.trackInterval()
+            log_path, export_path, defects_path = run_paths(self.video_path)
+            save_log = self.main_window.videoLogCheckBox.isChecked()
+            self.frameConverter.set_target_size(self.videoDisplayLabel.width(), self.videoDisplayLabel.height())
+            # 跟踪模式下检测记录为按缺陷汇总的列表，而不是逐帧记录
+            self.detection_thread = VideoDetectionThread(
+                self.video_path, detection_config, self.frameConverter, realtime=realtime,
+                log_path=log_path if save_log and not track_interval else None,
+                export_path=export_path if self.main_window.videoExportCheckBox.isChecked() else None,
+                track_interval=track_interval, defects_path=defects_path if save_log and track_interval else None
+            )
             self.detection_thread.processedFrameReady.connect(self.updateVideoFrame) # type: ignore
             self.detection_thread.detectionFinished.connect(self.videoDetectionFinished) # type: ignore
             self.detection_thread.start()
 
+    def startParallelAnalysis(self):
+        if self.detection_model is None:
+            MessageBox("提示", "检测模型正在加载，请稍候", self).exec()
+            return
+        if not self.video_path or self.analysis_thread is not None:
+            return
+        if isinstance(self.detection_model, RemoteModel):
+            MessageBox("提示", "使用检测服务时不支持并行离线分析，请在服务器上运行 parallel_video.py", self).exec()
+            return
+        if self.detection_thread and self.detection_thread.isRunning():
+            self.stopVideoDetection()
+        self.startButton.setEnabled(False)
+        self.analyzeButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        self.analysisProgressBar.setValue(0)
+        self.analysisProgressBar.show()
+        self.videoDisplayLabel.setText("正在切分视频并启动工作进程...")
+        # 工作进程各自加载与当前相同的模型文件（含所选后端与量化精度）
+        self.analysis_thread = ParallelAnalysisThread(
+            self.video_path, self.detection_model.path, imgsz=self.detection_model.imgsz,
+            conf=self.main_window.confidenceSpinBox.value(), max_det=self.main_window.maxDetSpinBox.value(),
+            batch_size=self.main_window.batchSizeSpinBox.value(), workers=self.main_window.analysisWorkersSpinBox.value()
+        )
+        self.analysis_thread.progressChanged.connect(self.updateAnalysisProgress) # type: ignore
+        self.analysis_thread.analysisFinished.connect(self.parallelAnalysisFinished) # type: ignore
+        self.analysis_thread.analysisFailed.connect(self.parallelAnalysisFailed) # type: ignore
+        self.analysis_thread.start()
+
+    def updateAnalysisProgress(self, done: int, total: int):
+        self.analysisProgressBar.setRange(0, total)
+        self.analysisProgressBar.setValue(done)
+        self.videoDisplayLabel.setText(f"并行离线分析中: 已完成 {done}/{total} 段")
+
+    def parallelAnalysisFinished(self, summary: dict):
+        self.resetAnalysisControls()
+        self.videoDisplayLabel.setText(format_summary(summary))
+
+    def parallelAnalysisFailed(self, message: str):
+        self.resetAnalysisControls()
+        self.videoDisplayLabel.setText("并行离线分析失败")
+        MessageBox("并行离线分析失败", message, self).exec()
+
+    def resetAnalysisControls(self):
+        self.analysis_thread = None
+        self.analysisProgressBar.hide()
+        self.startButton.setEnabled(True)
+        self.analyzeButton.setEnabled(True)
+        self.stopButton.setEnabled(False)
+
     def stopVideoDetection(self):
+        if self.analysis_thread is not None:
+            self.analysis_thread.stop()
+            self.stopButton.setEnabled(False)
+            self.videoDisplayLabel.setText("正在等待进行中的段完成...")
+            return
         if self.detection_thread and self.detection_thread.isRunning():
-            self.detection_thread.stop_flag = True
+            self.detection_thread.stop()
             self.startButton.setEnabled(True)
             self.stopButton.setEnabled(False)
             self.progressBar.hide()
 
     def updateVideoFrame(self, frame: QImage):
-        pixmap = QPixmap.fromImage(frame)
-        scaled_pixmap = pixmap.scaled(
-            self.videoDisplayLabel.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.videoDisplayLabel.setPixmap(scaled_pixmap)
+        # 帧已在检测线程中缩放到标签大小，这里只需上传为 QPixmap，随后归还缓冲槽
+        with perf_monitor.stage("video/present"):
+            self.videoDisplayLabel.setPixmap(QPixmap.fromImage(frame))
+        self.frameConverter.release()
+        self.frameConverter.set_target_size(self.videoDisplayLabel.width(), self.videoDisplayLabel.height())
 
     def videoDetectionFinished(self):
         self.startButton.setEnabled(True)
         self.stopButton.setEnabled(False)
         self.progressBar.hide()
-        self.videoDisplayLabel.setText("视频检测完成")
+        thread = self.detection_thread
+        outputs = [path for path in (thread.log_path, thread.export_path, thread.defects_path) if path]
+        summary = f"，共 {thread.defect_count} 个缺陷" if thread.track_interval else ""
+        self.videoDisplayLabel.setText("视频检测完成" + summary + "".join(f"\n已保存: {path}" for path in outputs))
         self.detection_thread = None
 
 # ========================== 视频检测线程 ==========================
@@ -137,39 +262,206 @@ class VideoDetectionThread(QThread):
     processedFrameReady = Signal(QImage)
     detectionFinished = Signal()
 
-    def __init__(self, video_path, model, conf=0.25, max_det=1000):
+    def __init__(self, video_path, config, display, realtime=True,
+                 log_path=None, export_path=None, track_interval=0, defects_path=None):
         super().__init__()
         self.video_path = video_path
-        self.model = model
+        self.config = config  # ConfigChannel：置信度、最大检测数量、批大小与模型，检测过程中可随时修改
+        self.names = config.current.model.names
+        self.display = display
         self.stop_flag = False
-        self.conf = conf
-        self.max_det = max_det
+        self.realtime = realtime  # True 按视频原始帧率播放，False 尽可能快地离线处理
+        self.log_path = log_path  # 逐帧检测记录，None 表示不记录
+        self.export_path = export_path  # 标注视频，None 表示不导出
+        self.track_interval = track_interval  # 跟踪模式每隔多少帧检测一次，0 表示逐帧检测
+        self.defects_path = defects_path  # 跟踪模式的缺陷列表，None 表示不保存
+        self.defect_count = 0
+        self.pipeline = None
+        self.scheduler = None
+        self.renderer = None
 
     def run(self):
-        cap = cv2.VideoCapture(self.video_path)
-        if not cap.isOpened():
+        self.pipeline = VideoPipeline(self.video_path, self.inferFrames, batch_size=self.config.current.batch_size,
+                                      monitor=perf_monitor,
+                                      detect_interval=max(1, self.track_interval))
+        if not self.pipeline.open():
             print(f"Error: Could not open video at {self.video_path}")
             self.detectionFinished.emit()
             return
 
-        while not self.stop_flag and cap.isOpened():
-            success, frame = cap.read()
-            if success:
-                results = self.model(frame, conf=self.conf, max_det=self.max_det)
-                annotated_frame = results[0].plot()
+        self.scheduler = FrameScheduler(self.pipeline.fps if self.realtime else 0.0)
+        self.renderer = OverlayRenderer(self.names)
+        # 保存检测记录或导出标注视频时每一帧都要推理并写盘，赶不上显示时刻的帧只跳过显示；
+        # 否则在推理前就丢弃，连推理也省掉
+        recording = bool(self.log_path or self.export_path)
+        if not recording:
+            self.pipeline.scheduler = self.scheduler
+        # 检测记录与标注视频各由后台线程写盘，这里只投递数组和帧
+        log = DetectionLogWriter(self.log_path, dict(self.names)) if self.log_path else None
+        encoder = AnnotatedVideoWriter(self.export_path, self.pipeline.fps, self.names) if self.export_path else None
+        for writer in (log, encoder):
+            if writer is not None:
+                writer.start()
+        # 跟踪模式：中间帧不推理，由跟踪器外推检测框；每个缺陷只在其轨迹结束时记入历史一次
+        tracker = DefectTracker(dict(self.names), detect_interval=self.track_interval) if self.track_interval else None
+        perf_monitor.reset("video/")
+        self.pipeline.start()
+        waiting_since = time.perf_counter()
+        try:
+            for packet in self.pipeline:  # 解码与推理在流水线后台线程中并行进行
+                # 等待时间长说明瓶颈在解码或推理，而不是标注与显示
+                perf_monitor.add("video/wait", (time.perf_counter() - waiting_since) * 1000, waiting_since)
+                if self.stop_flag:
+                    break
+                ids = None
+                if tracker is None:
+                    detections = result_arrays(packet.result)
+                    history_store.record('video', self.video_path, packet.index, *detections, self.names)
+                else:
+                    if packet.detect:
+                        *detections, ids = tracker.update(*result_arrays(packet.result), packet.index)
+                    else:
+                        *detections, ids = tracker.predict(packet.index)
+                    self.recordDefects(tracker.pop_finished())
+                if log is not None:
+                    log.write(packet.index, packet.timestamp, *detections)
+                if encoder is not None:
+                    encoder.write(packet.frame, *detections)
+                if recording and self.scheduler.is_late(packet.index):
+                    perf_monitor.set_counter("video/dropped_late", self.scheduler.dropped)
+                    waiting_since = time.perf_counter()
+                    continue  # 已写入记录与标注视频，只是来不及显示
+                self.scheduler.wait(packet.index)  # 按原始帧率出帧，替代固定的 sleep
+                perf_monitor.set_counter("video/dropped_late", self.scheduler.dropped)
+                if not self.display.acquire(timeout=self.scheduler.interval):
+                    perf_monitor.set_counter("video/display_skipped", self.display.skipped)
+                    waiting_since = time.perf_counter()
+                    continue  # 界面来不及显示，跳过该帧的标注与转换
+                with perf_monitor.stage("video/render"):
+                    overlay = self.renderer.overlay_arrays(*detections, ids)  # 在缩放后的显示帧上绘制，而不是原图
+                    image = self.display.convert(packet.frame, overlay)
+                self.processedFrameReady.emit(image)
+                waiting_since = time.perf_counter()
+        finally:
+            self.pipeline.stop()
+            for writer in (log, encoder):
+                if writer is not None:
+                    writer.close()
+            if tracker is not None:
+                self.recordDefects(tracker.finish())
+                self.defect_count = tracker.defect_count
+                if self.defects_path:
+                    save_defects(self.defects_path, tracker.defects(), self.pipeline.fps)
+
+        if self.pipeline.error is not None:
+            print(f"Error: Video detection failed: {self.pipeline.error}")
+        self.detectionFinished.emit()
 
-                height, width, channel = annotated_frame.shape
-                bytes_per_line = 3 * width
-                q_image = QImage(annotated_frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888).rgbSwapped()
-                self.processedFrameReady.emit(q_image)
-            else:
-                break
-            time.sleep(0.03) # 控制帧率，避免过快
+    def inferFrames(self, frames: List[np.ndarray]) -> list:
+        # 每批取一次配置快照：阈值与模型的修改从下一批起生效，批大小的修改从下一次凑批起生效
+        config = self.config.current
+        self.pipeline.batch_size = config.batch_size  # 在推理线程内修改，与凑批的是同一个线程
+        source = frames[0] if len(frames) == 1 else frames  # 多帧时一次批量推理
+        return list(config.model(source, conf=config.conf, max_det=config.max_det))
+
+    def recordDefects(self, tracks):
+        for track in tracks:  # 以首次出现的帧和置信度最高的一次检测框代表该缺陷
+            history_store.record('video', self.video_path, track.first_frame, *track_arrays([track]), self.names)
+
+    def stop(self):
+        self.stop_flag = True
+        if self.pipeline is not None:
+            self.pipeline.stop(wait=False)
+
+# ========================== 并行离线分析线程 ==========================
+class ParallelAnalysisThread(QThread):
+    # 长视频离线分析：按关键帧分段交给多个工作进程，本线程只负责调度与汇报进度
+    progressChanged = Signal(int, int)  # 已完成段数、总段数
+    analysisFinished = Signal(dict)
+    analysisFailed = Signal(str)
+
+    def __init__(self, video_path, model_path, imgsz=None, conf=0.25, max_det=1000, batch_size=1, workers=None):
+        super().__init__()
+        self.job = ParallelVideoJob(video_path, model_path=model_path, conf=conf, max_det=max_det, imgsz=imgsz,
+                                    batch_size=batch_size, workers=workers)
 
-        cap.release()
-        self.detectionFinished.emit()
+    def run(self):
+        try:
+            summary = self.job.run(progress=self.progressChanged.emit)
+        except Exception as e:
+            self.analysisFailed.emit(str(e))
+            return
+        self.analysisFinished.emit(summary)
+
+    def stop(self):
+        self.job.cancel()  # 已完成的段保留在检查点中，下次对同一视频分析时继续
 
 # ========================== 摄像头检测界面 ==========================
+class RoiSelectLabel(QLabel):
+    # 摄像头画面标签：左键拖动框选检测区域 (ROI)，右键清除；ROI 以相对画面的归一化 (x, y, w, h) 发出
+    roiChanged = Signal(int, object)  # 摄像头编号、ROI 或 None
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.stream_id = -1
+        self.roi = None
+        self._drag_start = None
+        self._drag_end = None
+
+    def imageRect(self) -> Optional[QRectF]:
+        # 画面居中显示，返回图像在标签内的区域；尚无画面时返回 None
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return None
+        return QRectF((self.width() - pixmap.width()) / 2, (self.height() - pixmap.height()) / 2,
+                      pixmap.width(), pixmap.height())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.RightButton:
+            self.setRoi(None, emit=True)
+        elif event.button() == Qt.MouseButton.LeftButton and self.imageRect() is not None:
+            self._drag_start = self._drag_end = event.position()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            self._drag_end = event.position()
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        rect = self.imageRect()
+        if self._drag_start is not None and rect is not None:
+            drag = QRectF(self._drag_start, event.position()).normalized().intersected(rect)
+            if drag.width() > 8 and drag.height() > 8:
+                self.setRoi(((drag.x() - rect.x()) / rect.width(), (drag.y() - rect.y()) / rect.height(),
+                             drag.width() / rect.width(), drag.height() / rect.height()), emit=True)
+        self._drag_start = self._drag_end = None
+        self.update()
+        super().mouseReleaseEvent(event)
+
+    def setRoi(self, roi, emit: bool = False):
+        self.roi = roi
+        self.update()
+        if emit:
+            self.roiChanged.emit(self.stream_id, roi)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        rect = self.imageRect()
+        if rect is None or (self.roi is None and self._drag_start is None):
+            return
+        painter = QPainter(self)
+        painter.setPen(QPen(QColor(255, 210, 0), 2, Qt.PenStyle.DashLine))
+        if self._drag_start is not None:
+            painter.drawRect(QRectF(self._drag_start, self._drag_end).normalized())
+        elif self.roi is not None:
+            x, y, w, h = self.roi
+            painter.drawRect(QRectF(rect.x() + x * rect.width(), rect.y() + y * rect.height(),
+                                    w * rect.width(), h * rect.height()))
+        painter.end()
+
+
 class CameraDetectionInterface(ScrollArea):
     processedFrameReady = Signal(QImage)
     detectionFinished = Signal()
@@ -182,63 +474,97 @@ class CameraDetectionInterface(ScrollArea):
         self.setWidget(self.view)
         self.setWidgetResizable(True)
 
-        self.cameraComboBox: QComboBox
-        self.videoDisplayLabel: QLabel
+        self.cameraStatusLabel: BodyLabel
+        self.cameraCheckBoxes: List[QCheckBox] = []
+        self.videoGrid: QGridLayout
+        self.videoDisplayLabel: RoiSelectLabel  # 第一路画面，单路检测时即唯一的画面，可框选 ROI
+        self.latencyLabel: BodyLabel
         self.startButton: PrimaryPushButton
         self.stopButton: PrimaryPushButton
 
         self.detection_model = None
         self.detection_thread = None
-        self.available_cameras = self.get_available_cameras()
+        self.streamLabels = {}  # 摄像头编号 -> (画面标签, 统计标签)
+        self.frameConverters = {}  # 摄像头编号 -> DisplayFrameConverter，跨多次检测复用
+        self.stream_stats = {}  # 摄像头编号 -> 平滑后的延迟/帧率
+        self.rois = {}  # 摄像头编号 -> 归一化 ROI，跨多次检测保留
+        self.scan_thread = None
+        cached_cameras = load_cached_cameras()  # 优先使用上次扫描的缓存，启动时不探测硬件
+        self.available_cameras = cached_cameras or []
 
         self.initUI()
-        self.loadDetectionModel()
+        if cached_cameras is None:
+            QTimer.singleShot(0, self.scanCameras)  # 没有缓存时在窗口显示后后台扫描
 
-    def loadDetectionModel(self):
-        path = 'models/best.pt'  # 确保模型文件路径正确
-        try:
-            self.detection_model = YOLO(path, task='detect')
-        except Exception as e:
-            MessageBox("错误", f"加载模型失败: {e}", self).exec()
-
-    def get_available_cameras(self):
-        index = 0
-        cameras = []
-        while True:
-            cap = cv2.VideoCapture(index)
-            if not cap.read()[0]:
-                break
-            else:
-                cameras.append(index)
-            cap.release()
-            index += 1
-        return cameras
+    def setDetectionModel(self, model):
+        self.detection_model = model  # 由 MainWindow 在模型加载完成后注入
+
+    def scanCameras(self):
+        if self.scan_thread is not None:
+            return
+        self.rescanButton.setEnabled(False)
+        self.startButton.setEnabled(False)
+        self.clearCameraCheckBoxes()
+        self.cameraStatusLabel.setText("正在扫描摄像头...")
+        self.scan_thread = CameraScanThread()
+        self.scan_thread.camerasFound.connect(self.onCamerasFound) # type: ignore
+        self.scan_thread.start()
+
+    def onCamerasFound(self, cameras: list):
+        self.scan_thread = None
+        self.available_cameras = cameras
+        self.populateCameraSelection()
+        self.rescanButton.setEnabled(self.detection_thread is None)
+
+    def clearCameraCheckBoxes(self):
+        for checkBox in self.cameraCheckBoxes:
+            self.cameraSelectLayout.removeWidget(checkBox)
+            checkBox.deleteLater()
+        self.cameraCheckBoxes = []
+
+    def populateCameraSelection(self):
+        # 每个摄像头一个复选框，可同时勾选多路；默认只勾选第一路
+        self.clearCameraCheckBoxes()
+        for i, camera_index in enumerate(self.available_cameras):
+            checkBox = QCheckBox(f"摄像头 {camera_index}", self)
+            checkBox.setProperty("cameraIndex", camera_index)
+            checkBox.setChecked(i == 0)
+            self.cameraSelectLayout.addWidget(checkBox)
+            self.cameraCheckBoxes.append(checkBox)
+        self.cameraStatusLabel.setText("选择摄像头:" if self.available_cameras else "未检测到摄像头")
+        self.startButton.setEnabled(bool(self.available_cameras) and self.detection_thread is None)
+
+    def selectedCameras(self) -> List[int]:
+        return [checkBox.property("cameraIndex") for checkBox in self.cameraCheckBoxes if checkBox.isChecked()]
 
     def initUI(self):
         layout = QVBoxLayout(self.view)
 
-        self.cameraComboBox = QComboBox(self)
-        for camera_index in self.available_cameras:
-            self.cameraComboBox.addItem(f"摄像头 {camera_index}", camera_index)
-        if not self.available_cameras:
-            self.cameraComboBox.addItem("未检测到摄像头", -1)
-            self.cameraComboBox.setEnabled(False)
-        layout.addWidget(self.cameraComboBox)
-
-        self.videoDisplayLabel = QLabel(self)
-        self.videoDisplayLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.videoDisplayLabel.setStyleSheet("""
-            background-color: #333;
-            color: #fff;
-            border-radius: 8px;
-        """)
+        cameraLayout = QHBoxLayout()
+        self.cameraStatusLabel = BodyLabel(self)
+        cameraLayout.addWidget(self.cameraStatusLabel)
+        self.cameraSelectLayout = QHBoxLayout()
+        cameraLayout.addLayout(self.cameraSelectLayout)
+        cameraLayout.addStretch(1)
+
+        self.rescanButton = PrimaryPushButton("重新扫描", self)
+        self.rescanButton.setIcon(FIF.SYNC)
+        self.rescanButton.clicked.connect(self.scanCameras) # type: ignore
+        cameraLayout.addWidget(self.rescanButton)
+        layout.addLayout(cameraLayout)
+
+        # 画面网格：每路摄像头一个画面标签及其帧率/延迟统计
+        self.videoGrid = QGridLayout()
+        self.videoDisplayLabel = self.createVideoLabel()
         self.videoDisplayLabel.setMinimumSize(640, 480)
-        layout.addWidget(self.videoDisplayLabel)
+        self.latencyLabel = BodyLabel(self)
+        self.videoGrid.addWidget(self.videoDisplayLabel, 0, 0)
+        self.videoGrid.addWidget(self.latencyLabel, 1, 0)
+        layout.addLayout(self.videoGrid)
 
         controlsLayout = QHBoxLayout()
         self.startButton = PrimaryPushButton("开始检测", self)
         self.startButton.clicked.connect(self.startCameraDetection) # type: ignore
-        self.startButton.setEnabled(bool(self.available_cameras))
         controlsLayout.addWidget(self.startButton)
 
         self.stopButton = PrimaryPushButton("停止检测", self)
@@ -247,17 +573,90 @@ class CameraDetectionInterface(ScrollArea):
         controlsLayout.addWidget(self.stopButton)
         layout.addLayout(controlsLayout)
 
+        self.perfHud = PerfHudLabel("camera", self)
+        layout.addWidget(self.perfHud)
+
+        self.populateCameraSelection()
+
+    def createVideoLabel(self) -> RoiSelectLabel:
+        label = RoiSelectLabel(self)
+        label.roiChanged.connect(self.setCameraRoi) # type: ignore
+        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        label.setStyleSheet("""
+            background-color: #333;
+            color: #fff;
+            border-radius: 8px;
+        """)
+        label.setMinimumSize(320, 240)
+        return label
+
+    def buildVideoGrid(self, camera_indices: List[int]):
+        # 第一路复用 videoDisplayLabel，其余各路按需创建；1 路单列，2~4 路两列，更多三列
+        self.clearVideoGrid()
+        columns = 1 if len(camera_indices) == 1 else 2 if len(camera_indices) <= 4 else 3
+        if columns == 1:
+            self.videoDisplayLabel.setMinimumSize(640, 480)
+        else:
+            self.videoDisplayLabel.setMinimumSize(320, 240)
+        for i, camera_index in enumerate(camera_indices):
+            if i == 0:
+                videoLabel, statLabel = self.videoDisplayLabel, self.latencyLabel
+            else:
+                videoLabel, statLabel = self.createVideoLabel(), BodyLabel(self)
+            row, column = divmod(i, columns)
+            self.videoGrid.addWidget(videoLabel, row * 2, column)
+            self.videoGrid.addWidget(statLabel, row * 2 + 1, column)
+            statLabel.setText(f"摄像头 {camera_index}")
+            videoLabel.stream_id = camera_index
+            videoLabel.setRoi(self.rois.get(camera_index))
+            self.streamLabels[camera_index] = (videoLabel, statLabel)
+            self.frameConverters.setdefault(camera_index, DisplayFrameConverter())
+            self.stream_stats[camera_index] = {"latency": 0.0, "fps": 0.0, "last": 0.0}
+
+    def clearVideoGrid(self):
+        for videoLabel, statLabel in self.streamLabels.values():
+            if videoLabel is self.videoDisplayLabel:
+                continue
+            for widget in (videoLabel, statLabel):
+                self.videoGrid.removeWidget(widget)
+                widget.deleteLater()
+        self.streamLabels = {}
+        self.stream_stats = {}
+
     def startCameraDetection(self):
-        selected_camera_index = self.cameraComboBox.currentData()
-        if selected_camera_index != -1 and self.detection_model:
-            self.startButton.setEnabled(False)
-            self.stopButton.setEnabled(True)
-            confidence_threshold = self.main_window.confidenceSpinBox.value()
-            max_detections = self.main_window.maxDetSpinBox.value()
-            self.detection_thread = CameraDetectionThread(selected_camera_index, self.detection_model, conf=confidence_threshold, max_det=max_detections)
-            self.detection_thread.processedFrameReady.connect(self.updateVideoFrame) # type: ignore
-            self.detection_thread.detectionFinished.connect(self.cameraDetectionFinished) # type: ignore
-            self.detection_thread.start()
+        if self.detection_model is None:
+            MessageBox("提示", "检测模型正在加载，请稍候", self).exec()
+            return
+        camera_indices = self.selectedCameras()
+        if not camera_indices:
+            MessageBox("提示", "请至少选择一个摄像头", self).exec()
+            return
+        self.startButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        self.rescanButton.setEnabled(False)  # 检测期间摄像头被占用，不允许重新扫描
+        self.buildVideoGrid(camera_indices)
+        converters = {}
+        for camera_index in camera_indices:
+            videoLabel = self.streamLabels[camera_index][0]
+            converters[camera_index] = self.frameConverters[camera_index]
+            converters[camera_index].set_target_size(videoLabel.minimumWidth(), videoLabel.minimumHeight())
+        batch = self.main_window.multiStreamModeComboBox.currentData()
+        self.detection_thread = CameraDetectionThread(
+            camera_indices, detection_config, converters, batch=batch, rois=self.rois,
+            motion_threshold=self.main_window.motionThreshold(), track_interval=self.main_window.trackInterval()
+        )
+        self.detection_thread.processedFrameReady.connect(self.updateVideoFrame) # type: ignore
+        self.detection_thread.detectionFinished.connect(self.cameraDetectionFinished) # type: ignore
+        self.detection_thread.start()
+
+    def setCameraRoi(self, camera_index: int, roi):
+        # ROI 在检测过程中也可以随时调整，检测线程从下一帧开始生效
+        if roi is None:
+            self.rois.pop(camera_index, None)
+        else:
+            self.rois[camera_index] = roi
+        if self.detection_thread is not None:
+            self.detection_thread.setRoi(camera_index, roi)
 
     def stopCameraDetection(self):
         if self.detection_thread and self.detection_thread.isRunning():
@@ -265,57 +664,240 @@ class CameraDetectionInterface(ScrollArea):
             self.startButton.setEnabled(True)
             self.stopButton.setEnabled(False)
 
-    def updateVideoFrame(self, frame: QImage):
-        pixmap = QPixmap.fromImage(frame)
-        scaled_pixmap = pixmap.scaled(
-            self.videoDisplayLabel.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
+    def updateVideoFrame(self, camera_index: int, frame: QImage, captured_at: float):
+        converter = self.frameConverters[camera_index]
+        if camera_index not in self.streamLabels:
+            converter.release()
+            return
+        videoLabel, statLabel = self.streamLabels[camera_index]
+        with perf_monitor.stage("camera/present"):
+            videoLabel.setPixmap(QPixmap.fromImage(frame))  # 帧已在检测线程中缩放到标签大小
+        converter.release()
+        converter.set_target_size(videoLabel.width(), videoLabel.height())
+
+        # 采集到显示的延迟与显示帧率，指数平滑后显示
+        now = time.perf_counter()
+        stats = self.stream_stats[camera_index]
+        latency = (now - captured_at) * 1000
+        perf_monitor.add(f"camera{camera_index}/latency", latency, captured_at)
+        stats["latency"] = latency if stats["latency"] == 0 else 0.9 * stats["latency"] + 0.1 * latency
+        if stats["last"] > 0 and now > stats["last"]:
+            fps = 1.0 / (now - stats["last"])
+            stats["fps"] = fps if stats["fps"] == 0 else 0.9 * stats["fps"] + 0.1 * fps
+        stats["last"] = now
+        dropped = self.detection_thread.droppedFrames(camera_index) if self.detection_thread else 0
+        skip_ratio, area_ratio = self.detection_thread.gateStats(camera_index) if self.detection_thread else (0.0, 1.0)
+        defects = self.detection_thread.defectCount(camera_index) if self.detection_thread else None
+        statLabel.setText(
+            f"摄像头 {camera_index}    帧率: {stats['fps']:.1f}    "
+            f"采集到显示延迟: {stats['latency']:.0f} ms    丢弃旧帧: {dropped}    "
+            f"跳过推理: {skip_ratio:.0%}    推理区域: {area_ratio:.0%}"
+            + (f"    缺陷: {defects}" if defects is not None else "")
         )
-        self.videoDisplayLabel.setPixmap(scaled_pixmap)
 
     def cameraDetectionFinished(self):
         self.startButton.setEnabled(True)
         self.stopButton.setEnabled(False)
+        self.clearVideoGrid()
+        self.videoDisplayLabel.setMinimumSize(640, 480)
+        self.videoGrid.addWidget(self.videoDisplayLabel, 0, 0)
+        self.videoGrid.addWidget(self.latencyLabel, 1, 0)
         self.videoDisplayLabel.setText("摄像头检测已停止")
         self.detection_thread = None
+        self.rescanButton.setEnabled(self.scan_thread is None)
+
+# ========================== 摄像头扫描线程 ==========================
+class CameraScanThread(QThread):
+    camerasFound = Signal(list)
+
+    def run(self):
+        cameras = scan_cameras()
+        try:
+            save_cached_cameras(cameras)
+        except OSError as e:
+            print(f"Error: Could not save camera cache: {e}")
+        self.camerasFound.emit(cameras)
 
 # ========================== 摄像头检测线程 ==========================
 class CameraDetectionThread(QThread):
-    processedFrameReady = Signal(QImage)
+    processedFrameReady = Signal(int, QImage, float)  # 摄像头编号、标注后的图像及其采集时刻 (perf_counter)
     detectionFinished = Signal()
 
-    def __init__(self, camera_index, model, conf=0.25, max_det=1000):
+    def __init__(self, camera_indices, config, displays, batch=True, rois=None,
+                 motion_threshold=0.0, track_interval=0):
         super().__init__()
-        self.camera_index = camera_index
-        self.model = model
+        self.camera_indices = list(camera_indices)
+        self.config = config  # ConfigChannel：置信度、最大检测数量与模型，检测过程中可随时修改
+        self.names = config.current.model.names
+        self.displays = displays  # 摄像头编号 -> DisplayFrameConverter
         self.stop_flag = False
-        self.conf = conf
-        self.max_det = max_det
+        self.batch = batch  # True 各路最新帧合并批量推理，False 各路轮询推理
+        self.grabbers = {}
+        # 每路一个门控：只推理 ROI，画面静止时跳过推理（motion_threshold 为 0 表示不做运动门控）
+        rois = rois or {}
+        self.gates = {index: StreamGate(rois.get(index), motion_threshold, max(1, track_interval))
+                      for index in self.camera_indices}
+        # 跟踪模式：每路一个跟踪器，同一缺陷在画面中停留期间只计数一次
+        self.trackers = {index: DefectTracker(dict(self.names), detect_interval=track_interval)
+                         for index in self.camera_indices} if track_interval else {}
+
+    def droppedFrames(self, camera_index: int) -> int:
+        grabber = self.grabbers.get(camera_index)
+        return grabber.dropped if grabber else 0
+
+    def gateStats(self, camera_index: int):
+        # (跳过推理的帧占比, ROI 面积占比)
+        gate = self.gates.get(camera_index)
+        return (gate.skip_ratio, gate.area_ratio) if gate else (0.0, 1.0)
+
+    def defectCount(self, camera_index: int) -> Optional[int]:
+        tracker = self.trackers.get(camera_index)
+        return tracker.defect_count if tracker else None
+
+    def recordDefects(self, camera_index: int, tracks):
+        for track in tracks:
+            history_store.record('camera', f"摄像头 {camera_index}", track.first_frame, *track_arrays([track]),
+                                 self.names)
+
+    def setRoi(self, camera_index: int, roi):
+        gate = self.gates.get(camera_index)
+        if gate is not None:
+            gate.roi = roi
 
     def run(self):
-        cap = cv2.VideoCapture(self.camera_index)
-        if not cap.isOpened():
-            print(f"Error: Could not open camera at index {self.camera_index}")
+        notify = threading.Event()
+        for camera_index in self.camera_indices:
+            grabber = CameraGrabber(camera_index, notify, monitor=perf_monitor)
+            if grabber.open():
+                self.grabbers[camera_index] = grabber
+            else:
+                print(f"Error: Could not open camera at index {camera_index}")
+        if not self.grabbers:
             self.detectionFinished.emit()
             return
+        perf_monitor.reset("camera")
+
+        # 每路一个采集线程独立排空摄像头缓冲，调度器每轮只取各路最新的一帧
+        for grabber in self.grabbers.values():
+            grabber.start()
+        scheduler = StreamScheduler(self.grabbers, self.inferFrames, batch=self.batch, notify=notify,
+                                    gate=lambda camera_index, frame: self.gates[camera_index].prepare(frame))
+        renderer = OverlayRenderer(self.names)
+        try:
+            while not self.stop_flag:
+                outputs = scheduler.next_round(timeout=1.0)
+                if not outputs:
+                    if not scheduler.running:
+                        break
+                    continue
+                for camera_index, frame, captured_at, result in outputs:
+                    display = self.displays[camera_index]
+                    gate = self.gates[camera_index]
+                    detections = gate.resolve(result)  # 跳过推理的帧沿用上一次结果
+                    tracker = self.trackers.get(camera_index)
+                    ids = None
+                    if tracker is not None:
+                        if result is not None:
+                            *detections, ids = tracker.update(*detections, gate.frames)
+                        else:
+                            *detections, ids = tracker.predict(gate.frames)  # 跟踪模式下按速度外推，而不是原地不动
+                        self.recordDefects(camera_index, tracker.pop_finished())
+                    elif result is not None:
+                        history_store.record('camera', f"摄像头 {camera_index}", gate.frames,
+                                             *detections, self.names)
+                    perf_monitor.set_counter(f"camera{camera_index}/dropped", self.droppedFrames(camera_index))
+                    perf_monitor.set_counter(f"camera{camera_index}/gate_skipped", gate.skipped)
+                    if not display.acquire():
+                        perf_monitor.set_counter(f"camera{camera_index}/display_skipped", display.skipped)
+                        continue  # 界面来不及显示，跳过该帧的标注与转换
+                    with perf_monitor.stage("camera/render"):
+                        overlay = renderer.overlay_arrays(*detections, ids)  # 在缩放后的显示帧上绘制，而不是原图
+                        image = display.convert(frame, overlay)
+                    self.processedFrameReady.emit(camera_index, image, captured_at)
+        finally:
+            for grabber in self.grabbers.values():
+                grabber.stop()
+            for camera_index, tracker in self.trackers.items():
+                self.recordDefects(camera_index, tracker.finish())
 
-        while not self.stop_flag and cap.isOpened():
-            success, frame = cap.read()
-            if success:
-                results = self.model(frame, conf=self.conf, max_det=self.max_det)
-                annotated_frame = results[0].plot()
+        self.detectionFinished.emit()
 
-                height, width, channel = annotated_frame.shape
-                bytes_per_line = 3 * width
-                q_image = QImage(annotated_frame.data, width, height, bytes_per_line, QImage.Format.Format_RGB888).rgbSwapped()
-                self.processedFrameReady.emit(q_image)
-            else:
-                break
-            time.sleep(0.03) # 控制帧率
+    def inferFrames(self, frames: List[np.ndarray]) -> list:
+        config = self.config.current  # 每轮取一次配置快照，设置页的修改从下一轮起生效
+        source = frames[0] if len(frames) == 1 else frames  # 多路时一次批量推理
+        with perf_monitor.stage("camera/infer"):
+            return list(config.model(source, conf=config.conf, max_det=config.max_det))
 
-        cap.release()
-        self.detectionFinished.emit()
+# ========================== 图片检测任务 ==========================
+class ImageDetectionSignals(QObject):
+    detectionDone = Signal(int, list, object, object)  # 请求编号、检测结果、标注后的图片、(缓存条目, 显示尺寸原图, 缩放比例)
+    detectionFailed = Signal(int, str)
+
+
+class ImageDetectionTask(QRunnable):
+    def __init__(self, request_id, image_path, model, signals, is_current, conf=0.25, max_det=1000, display_size=None,
+                 tiling=None):
+        super().__init__()
+        self.request_id = request_id
+        self.image_path = image_path
+        self.model = model
+        self.signals = signals
+        self.is_current = is_current
+        self.conf = conf
+        self.max_det = max_det
+        self.display_size = display_size or (640, 480)  # (宽, 高)，标注直接画在缩放到该尺寸的图上
+        self.tiling = tiling  # (切块尺寸, 重叠比例)，None 表示整图检测
+
+    def run(self):
+        if not self.is_current(self.request_id):
+            return  # 排队期间已有更新的上传，直接放弃
+
+        try:
+            # 先查缓存：同一图片内容 + 同一模型 + 同一 max_det 不再重复推理
+            digest = file_digest(self.image_path)
+            model_digest = self.model.checksum if isinstance(self.model, RemoteModel) else model_checksum(self.model.path)
+            # PyTorch 后端切换输入尺寸时模型文件不变，输入尺寸也要作为键的一部分
+            variant = "-".join(part for part in (tiling_variant(self.tiling),
+                                                 f"imgsz{self.model.imgsz}" if self.model.imgsz else '') if part)
+            key = detection_cache.key(digest, model_digest, self.max_det, variant)
+            entry = detection_cache.get(key, self.conf)
+            if entry is None and self.tiling:
+                # 高分辨率图片分块检测：原图内存映射读取，切块成批推理后跨块合并
+                raw_conf = min(self.conf, CACHE_CONF_FLOOR)
+                image = load_image_mmap(self.image_path, digest)
+                height, width = image.shape[:2]
+                entry = CachedDetections(
+                    *detect_tiled(self.model, image, *self.tiling, conf=raw_conf, max_det=self.max_det),
+                    dict(self.model.names), raw_conf, (width, height)
+                )
+                detection_cache.put(key, entry)
+                preview, scale = read_image_reduced(self.image_path, entry.image_size, self.display_size)
+            elif entry is None:
+                image = cv2.imread(self.image_path)
+                if image is None:
+                    raise ValueError("无法读取图片文件")
+                raw_conf = min(self.conf, CACHE_CONF_FLOOR)  # 按较低阈值推理，之后调高阈值只需重新过滤
+                results = self.model(image, conf=raw_conf, max_det=self.max_det)
+                entry = CachedDetections.from_result(results[0], raw_conf)
+                detection_cache.put(key, entry)
+                preview, scale = image, 1.0
+            else:
+                preview, scale = read_image_reduced(self.image_path, entry.image_size, self.display_size)
+
+            # 只保留显示尺寸的原图，供调整置信度时直接重绘
+            height, width = preview.shape[:2]
+            resize = min(self.display_size[0] / width, self.display_size[1] / height, 1.0)
+            if resize < 1.0:
+                preview = cv2.resize(preview, (max(1, int(width * resize)), max(1, int(height * resize))), interpolation=cv2.INTER_AREA)
+                scale *= resize
+
+            renderer = OverlayRenderer(entry.names, skip_empty=False)
+            detected_image = renderer.render_arrays(preview, *entry.filter(self.conf), scale=scale)  # 带标注的图片 (NumPy array)
+            detections = entry.to_detections(self.conf)
+        except Exception as e:
+            self.signals.detectionFailed.emit(self.request_id, str(e))
+            return
+        self.signals.detectionDone.emit(self.request_id, detections, detected_image, (entry, preview, scale))
 
 # ========================== 检测界面 ==========================
 class DetectionInterface(ScrollArea):
@@ -338,16 +920,21 @@ class DetectionInterface(ScrollArea):
         self.resultTable: TableWidget  # 用于显示检测结果表格
         self.showDetectedOnlyCheckBox: QCheckBox  # 新增的复选框
         self.show_detected_only = False  # 默认不开启只显示检测结果
+        self.current_image_path = None
+        self.current_detection = None  # (缓存条目, 显示尺寸原图, 缩放比例)，用于按新阈值重新过滤
+
+        # 推理放在后台线程池中执行，只保留最新一次上传的结果
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.latest_request = 0
+        self.detectionSignals = ImageDetectionSignals(self)
+        self.detectionSignals.detectionDone.connect(self.onDetectionDone) # type: ignore
+        self.detectionSignals.detectionFailed.connect(self.onDetectionFailed) # type: ignore
 
         self.initUI()
-        self.loadDetectionModel()
 
-    def loadDetectionModel(self):
-        path = 'models/best.pt'  # 确保模型文件路径正确
-        try:
-            self.detection_model = YOLO(path, task='detect')
-        except Exception as e:
-            MessageBox("错误", f"加载模型失败: {e}", self).exec()
+    def setDetectionModel(self, model):
+        self.detection_model = model  # 由 MainWindow 在模型加载完成后注入
 
     def initUI(self):
         # 主布局
@@ -418,26 +1005,30 @@ class DetectionInterface(ScrollArea):
             self, "选择图片", "", "图像文件 (*.png *.jpg *.jpeg *.bmp)"
         )
         if path:
+            if self.detection_model is None:
+                MessageBox("错误", "检测模型尚未加载，请稍候再试", self).exec()
+                return
             self.loadOriginalImage(path)
+            self.current_image_path = path
+            self.current_detection = None
             confidence_threshold = self.main_window.confidenceSpinBox.value() # 从 MainWindow 获取值
             max_detections = self.main_window.maxDetSpinBox.value() # 从 MainWindow 获取值
-            detection_results, detected_image = self.runDetection(path, conf=confidence_threshold, max_det=max_detections)
-            self.displayDetectedImage(detected_image)
-            self.displayDetectionResults(detection_results)
-            self.updateImageDisplay() # 初始加载后也更新显示
+            self.runDetection(path, conf=confidence_threshold, max_det=max_detections,
+                              tiling=self.main_window.tilingOptions())
 
     def loadOriginalImage(self, path: str):
-        pixmap = QPixmap(path)
-        if pixmap.isNull():
+        # 解码时直接缩放到标签大小，大图不必先完整解码再缩小
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(self.originalImageLabel.size(), Qt.AspectRatioMode.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
             MessageBox("错误", "无法加载图片文件", self).exec()
             return
 
-        scaled = pixmap.scaled(
-            self.originalImageLabel.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.originalImageLabel.setPixmap(scaled)
+        self.originalImageLabel.setPixmap(QPixmap.fromImage(image))
         if not self.show_detected_only:
             self.originalImageLabel.show()
         self.detectedImageLabel.clear() # 清空检测后的图片
@@ -475,35 +1066,57 @@ class DetectionInterface(ScrollArea):
             self.detectedImageLabel.show()
 
 
-    def runDetection(self, image_path: str, conf: float = 0.25, max_det: int = 1000) -> Tuple[list, Optional[np.ndarray]]:
-        results_list = []
-        detected_image_np = None
-
-        if self.detection_model is None:
-            MessageBox("错误", "检测模型尚未加载", self).exec()
-            return results_list, detected_image_np
-
+    def runDetection(self, image_path: str, conf: float = 0.25, max_det: int = 1000,
+                     tiling: Optional[Tuple[int, float]] = None) -> int:
+        self.latest_request += 1
+        task = ImageDetectionTask(
+            self.latest_request, image_path, self.detection_model, self.detectionSignals,
+            self.isCurrentRequest, conf=conf, max_det=max_det,
+            display_size=(self.detectedImageLabel.width(), self.detectedImageLabel.height()),
+            tiling=tiling
+        )
+        self.thread_pool.start(task)
         self.progressBar.show()
-        try:
-            results = self.detection_model(image_path, conf=conf, max_det=max_det)
-            res_plotted = results[0].plot()  # 获取带有标注的图片 (NumPy array)
-            detected_image_np = res_plotted.copy() # 保存检测后的图片
+        return self.latest_request
 
-            # 提取检测结果
-            if results and results[0].boxes and len(results[0].boxes.conf) > 0:
-                for i in range(len(results[0].boxes.conf)):
-                    confidence = results[0].boxes.conf[i].item()
-                    class_id = results[0].boxes.cls[i].item()
-                    label = results[0].names[class_id]
-                    results_list.append({"label": label, "confidence": confidence})
+    def isCurrentRequest(self, request_id: int) -> bool:
+        return request_id == self.latest_request
 
-            self.detectionResultReady.emit(results_list) # 发送信号
-
-        except Exception as e:
-            MessageBox("错误", f"检测过程中发生错误: {e}", self).exec()
-        finally:
-            self.progressBar.hide()
-            return results_list, detected_image_np
+    def onDetectionDone(self, request_id: int, results_list: list, detected_image: np.ndarray, state: tuple):
+        if not self.isCurrentRequest(request_id):
+            return  # 过期请求的结果直接丢弃
+        self.current_detection = state
+        history_store.record('image', self.current_image_path, 0, *state[0].filter(self.main_window.confidenceSpinBox.value()),
+                             state[0].names)
+        self.progressBar.hide()
+        self.displayDetectedImage(detected_image)
+        self.displayDetectionResults(results_list)
+        self.updateImageDisplay() # 初始加载后也更新显示
+        self.detectionResultReady.emit(results_list) # 发送信号
+
+    def refilterDetections(self, conf: float):
+        # 置信度阈值变化时：缓存的原始结果覆盖该阈值则直接过滤重绘，否则重新检测
+        if self.current_image_path is None:
+            return
+        if self.current_detection is None or not self.current_detection[0].covers(conf):
+            if self.detection_model is not None:
+                self.runDetection(self.current_image_path, conf=conf, max_det=self.main_window.maxDetSpinBox.value(),
+                                  tiling=self.main_window.tilingOptions())
+            return
+        self.latest_request += 1  # 使仍在进行中的旧请求失效
+        self.progressBar.hide()
+        entry, preview, scale = self.current_detection
+        renderer = OverlayRenderer(entry.names, skip_empty=False)
+        results_list = entry.to_detections(conf)
+        self.displayDetectedImage(renderer.render_arrays(preview, *entry.filter(conf), scale=scale))
+        self.displayDetectionResults(results_list)
+        self.detectionResultReady.emit(results_list)
+
+    def onDetectionFailed(self, request_id: int, message: str):
+        if not self.isCurrentRequest(request_id):
+            return
+        self.progressBar.hide()
+        MessageBox("错误", f"检测过程中发生错误: {message}", self).exec()
 
     def displayDetectionResults(self, results: list):
         self.resultTable.clearContents()
@@ -516,6 +1129,296 @@ class DetectionInterface(ScrollArea):
             self.resultTable.setItem(row, 0, label_item)
             self.resultTable.setItem(row, 1, confidence_item)
 
+# ========================== 检测历史模型 ==========================
+class DetectionHistoryModel(QAbstractTableModel):
+    # 虚拟化的历史表格模型：只保存已滚动到的行，滚动到底部时由视图调用 fetchMore 按页键集查询
+    HEADERS = ["时间", "类型", "来源", "帧", "缺陷类别", "置信度", "检测框"]
+    KINDS = {'image': "图片", 'video': "视频", 'camera': "摄像头"}
+    PAGE_SIZE = 500
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.history_filter = HistoryFilter()
+        self.rows = []
+        self.exhausted = True
+
+    def setFilter(self, history_filter: HistoryFilter):
+        self.beginResetModel()
+        self.history_filter = history_filter
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        before_id = self.rows[-1][0] if self.rows else None
+        page = self.store.fetch(self.history_filter, self.PAGE_SIZE, before_id)
+        self.exhausted = len(page) < self.PAGE_SIZE
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        _, ts, kind, source, frame, label, confidence, x1, y1, x2, y2 = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+            if column == 1:
+                return self.KINDS.get(kind, kind)
+            if column == 2:
+                return source
+            if column == 3:
+                return str(frame) if kind != 'image' else ""
+            if column == 4:
+                return label
+            if column == 5:
+                return f"{confidence:.2f}"
+            return f"({x1:.0f}, {y1:.0f}, {x2:.0f}, {y2:.0f})"
+        if role == Qt.ItemDataRole.TextAlignmentRole and column in (3, 5):
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+class HistoryCountSignals(QObject):
+    countReady = Signal(int, int)  # 查询编号、总条数
+
+
+class HistoryCountTask(QRunnable):
+    # 大表上的 COUNT 可能需要数百毫秒，放到线程池执行，表格先显示第一页
+    def __init__(self, query_id, history_filter, signals):
+        super().__init__()
+        self.query_id = query_id
+        self.history_filter = history_filter
+        self.signals = signals
+
+    def run(self):
+        try:
+            total = history_store.count(self.history_filter)
+        except Exception as e:
+            print(f"Error: Could not count detection history: {e}")
+            total = -1
+        self.signals.countReady.emit(self.query_id, total)
+
+class HistoryLabelSignals(QObject):
+    labelsReady = Signal(list)
+
+
+class HistoryLabelTask(QRunnable):
+    # 类别列表同样在线程池中读取，切换到历史页时界面线程不访问数据库
+    def __init__(self, signals):
+        super().__init__()
+        self.signals = signals
+
+    def run(self):
+        try:
+            labels = history_store.labels()
+        except Exception as e:
+            print(f"Error: Could not load detection history labels: {e}")
+            return
+        self.signals.labelsReady.emit(labels)
+
+# ========================== 检测历史界面 ==========================
+class HistoryInterface(QWidget):
+    def __init__(self, main_window, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.main_window = main_window
+        self.setObjectName("HistoryInterface")
+        self.historyModel = DetectionHistoryModel(history_store, self)
+        self.countSignals = HistoryCountSignals(self)
+        self.countSignals.countReady.connect(self.onCountReady) # type: ignore
+        self.labelSignals = HistoryLabelSignals(self)
+        self.labelSignals.labelsReady.connect(self.updateLabels) # type: ignore
+        self.query_id = 0
+        self.total = None
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+
+        filterLayout = QHBoxLayout()
+        self.timeComboBox = QComboBox(self)
+        for text, seconds in (("全部时间", 0), ("最近 1 小时", 3600), ("最近 24 小时", 86400), ("最近 7 天", 7 * 86400)):
+            self.timeComboBox.addItem(text, seconds)
+        filterLayout.addWidget(self.timeComboBox)
+
+        self.kindComboBox = QComboBox(self)
+        self.kindComboBox.addItem("全部类型", None)
+        for kind, name in DetectionHistoryModel.KINDS.items():
+            self.kindComboBox.addItem(name, kind)
+        filterLayout.addWidget(self.kindComboBox)
+
+        self.labelComboBox = QComboBox(self)
+        self.labelComboBox.addItem("全部类别", None)
+        filterLayout.addWidget(self.labelComboBox)
+
+        self.sourceLineEdit = LineEdit(self)
+        self.sourceLineEdit.setPlaceholderText("来源包含...")
+        self.sourceLineEdit.returnPressed.connect(self.runQuery) # type: ignore
+        filterLayout.addWidget(self.sourceLineEdit, 1)
+
+        self.minConfSpinBox = QDoubleSpinBox(self)
+        self.minConfSpinBox.setRange(0.0, 1.0)
+        self.minConfSpinBox.setSingleStep(0.05)
+        self.minConfSpinBox.setPrefix("置信度 ≥ ")
+        filterLayout.addWidget(self.minConfSpinBox)
+
+        self.queryButton = PrimaryPushButton("查询", self)
+        self.queryButton.setIcon(FIF.SEARCH)
+        self.queryButton.clicked.connect(self.runQuery) # type: ignore
+        filterLayout.addWidget(self.queryButton)
+        layout.addLayout(filterLayout)
+
+        self.historyTable = TableView(self)
+        self.historyTable.setModel(self.historyModel)
+        self.historyTable.verticalHeader().hide()
+        self.historyTable.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.historyTable)
+
+        self.summaryLabel = BodyLabel(self)
+        layout.addWidget(self.summaryLabel)
+        self.historyModel.rowsInserted.connect(self.updateSummary) # type: ignore
+        self.historyModel.modelReset.connect(self.updateSummary) # type: ignore
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refreshLabels()
+        self.runQuery()
+
+    def refreshLabels(self):
+        QThreadPool.globalInstance().start(HistoryLabelTask(self.labelSignals))
+
+    def updateLabels(self, labels: list):
+        current = self.labelComboBox.currentData()
+        self.labelComboBox.blockSignals(True)
+        self.labelComboBox.clear()
+        self.labelComboBox.addItem("全部类别", None)
+        for label in labels:
+            self.labelComboBox.addItem(label, label)
+        index = self.labelComboBox.findData(current)
+        self.labelComboBox.setCurrentIndex(max(index, 0))
+        self.labelComboBox.blockSignals(False)
+
+    def runQuery(self):
+        seconds = self.timeComboBox.currentData()
+        history_filter = HistoryFilter(
+            since=time.time() - seconds if seconds else None,
+            kind=self.kindComboBox.currentData(),
+            source=self.sourceLineEdit.text().strip() or None,
+            label=self.labelComboBox.currentData(),
+            min_conf=self.minConfSpinBox.value() or None,
+        )
+        self.query_id += 1
+        self.total = None
+        QThreadPool.globalInstance().start(HistoryCountTask(self.query_id, history_filter, self.countSignals))
+        self.historyModel.setFilter(history_filter)
+        self.historyModel.fetchMore()
+
+    def onCountReady(self, query_id: int, total: int):
+        if query_id == self.query_id:
+            self.total = total
+            self.updateSummary()
+
+    def updateSummary(self, *args):
+        total = "..." if self.total is None else self.total
+        self.summaryLabel.setText(f"共 {total} 条检测记录，已加载 {self.historyModel.rowCount()} 条（滚动到底部继续加载）")
+
+# ========================== 模型加载线程 ==========================
+class ModelLoaderThread(QThread):
+    modelLoaded = Signal(object)
+    loadFailed = Signal(str)
+
+    def __init__(self, path=DEFAULT_MODEL_PATH, backend='pytorch', imgsz=DEFAULT_IMGSZ, threads=0, warmup=True,
+                 precision='fp32', service_url=None):
+        super().__init__()
+        self.path = path
+        self.service_url = service_url  # 非 None 时作为瘦客户端连接检测服务，不在本机加载模型
+        self.backend = backend
+        self.precision = precision
+        self.imgsz = imgsz
+        self.threads = threads
+        self.warmup = warmup
+
+    def run(self):
+        try:
+            # 非 PyTorch 后端首次使用时导出并缓存；同一模型文件与输入尺寸只会真正加载一次
+            if self.service_url:
+                model = RemoteModel(self.service_url)
+            elif self.precision == 'fp32':
+                model = load_backend(self.path, self.backend, self.imgsz, self.threads, warmup=self.warmup)
+            else:
+                # 量化模型固定走 OpenVINO，且必须已通过精度护栏
+                model = load_quantized(self.path, self.precision, self.imgsz, self.threads, warmup=self.warmup)
+        except Exception as e:
+            self.loadFailed.emit(str(e))
+            return
+        self.modelLoaded.emit(model)
+
+# ========================== 后端对比线程 ==========================
+class BackendCompareThread(QThread):
+    compareFinished = Signal(str)
+    compareFailed = Signal(str)
+
+    def __init__(self, sample_dir, imgsz=DEFAULT_IMGSZ, threads=0):
+        super().__init__()
+        self.sample_dir = sample_dir
+        self.imgsz = imgsz
+        self.threads = threads
+
+    def run(self):
+        try:
+            images = collect_images(self.sample_dir)
+            report = compare_backends(images, DEFAULT_MODEL_PATH, imgsz=self.imgsz, threads=self.threads)
+        except Exception as e:
+            self.compareFailed.emit(str(e))
+            return
+        self.compareFinished.emit(format_report(report))
+
+# ========================== 量化校准线程 ==========================
+class QuantizeThread(QThread):
+    quantizeFinished = Signal(bool, str)
+    quantizeFailed = Signal(str)
+
+    def __init__(self, calib_dir, val_dir, precision='int8', imgsz=DEFAULT_IMGSZ, conf=0.25):
+        super().__init__()
+        self.calib_dir = calib_dir
+        self.val_dir = val_dir  # 校验图片单独一个目录：在校准用过的图片上校验，护栏会偏乐观
+        self.precision = precision
+        self.imgsz = imgsz
+        self.conf = conf
+
+    def run(self):
+        try:
+            if not collect_images(self.calib_dir):
+                raise ValueError("校准目录中没有图片")
+            images = collect_images(self.val_dir)
+            if not images:
+                raise ValueError("校验目录中没有图片")
+            path = quantize_model(DEFAULT_MODEL_PATH, self.precision, self.calib_dir, self.imgsz)
+            report = validate_quantized(images, DEFAULT_MODEL_PATH, path, self.imgsz, self.conf)
+        except Exception as e:
+            self.quantizeFailed.emit(str(e))
+            return
+        self.quantizeFinished.emit(report["passed"], format_validation(report))
+
 # ========================== 主窗口 ==========================
 class MainWindow(FluentWindow):
     def __init__(self):
@@ -537,6 +1440,7 @@ class MainWindow(FluentWindow):
         self.detectionInterface = DetectionInterface(self) # 将 MainWindow 实例传递给 DetectionInterface
         self.videoDetectionInterface = VideoDetectionInterface(self) # 将 MainWindow 实例传递给 VideoDetectionInterface
         self.cameraDetectionInterface = CameraDetectionInterface(self) # 将 MainWindow 实例传递给 CameraDetectionInterface
+        self.historyInterface = HistoryInterface(self)
         self.settingsInterface = QWidget()
         self.settingsInterface.setObjectName("SettingsInterface")
 
@@ -556,6 +1460,11 @@ class MainWindow(FluentWindow):
             FIF.CAMERA,
             "实时检测"
         )
+        self.addSubInterface(
+            self.historyInterface,
+            FIF.HISTORY,
+            "检测历史"
+        )
         self.addSubInterface(
             self.settingsInterface,
             FIF.SETTING,
@@ -566,6 +1475,114 @@ class MainWindow(FluentWindow):
         # 初始化设置
         self.initSettings()
 
+        # 窗口显示之后再在后台加载模型，三个检测界面共用同一个实例
+        self.model_loader = None
+        self.model_options = None  # 当前模型（或正在加载的模型）对应的后端选项，用于判断保存设置后是否需要重新加载
+        self.pending_reload = False  # 加载途中又保存了新的后端选项，当前加载结束后按新选项再加载一次
+        self.compare_thread = None
+        self.quantize_thread = None
+        QTimer.singleShot(0, self.startModelLoading)
+
+    def closeEvent(self, event):
+        analysis = self.videoDetectionInterface.analysis_thread
+        if analysis is not None:
+            analysis.stop()  # 等进行中的段写完，已完成的段留在检查点中供下次续跑
+            analysis.wait()
+        history_store.flush()  # 退出前提交尚未写入的检测历史
+        super().closeEvent(event)
+
+    def startModelLoading(self):
+        if self.model_loader is not None:
+            return
+        self.applyBackendBtn.setEnabled(False)
+        self.model_options = self.backendOptions()
+        self.model_loader = ModelLoaderThread(
+            DEFAULT_MODEL_PATH, self.backendComboBox.currentData(),
+            self.imgszSpinBox.value(), self.threadsSpinBox.value(), warmup=True,
+            precision=self.precisionComboBox.currentData(), service_url=self.serviceUrl()
+        )
+        self.model_loader.modelLoaded.connect(self.onModelLoaded) # type: ignore
+        self.model_loader.loadFailed.connect(self.onModelLoadFailed) # type: ignore
+        self.model_loader.start()
+
+    def onModelLoaded(self, model):
+        previous = self.detectionInterface.detection_model
+        if isinstance(previous, RemoteModel) and previous is not model:
+            previous.close()  # 远程模型不在注册表中，单独回收它的上传线程池
+        elif previous is not None and previous is not model:
+            registry.release(previous.path, previous.imgsz)  # 切换后端或输入尺寸后旧模型不再常驻内存
+        for interface in (self.detectionInterface, self.videoDetectionInterface, self.cameraDetectionInterface):
+            interface.setDetectionModel(model)
+        detection_config.publish(model=model)  # 新模型已在后台预热，运行中的视频与摄像头检测从下一批起切换，无需停止
+        self.model_loader = None
+        self.applyBackendBtn.setEnabled(True)
+        self.startPendingReload()
+
+    def onModelLoadFailed(self, message: str):
+        self.model_loader = None
+        self.model_options = None
+        self.applyBackendBtn.setEnabled(True)
+        MessageBox("错误", f"加载模型失败: {message}", self).exec()
+        self.startPendingReload()
+
+    def startPendingReload(self):
+        if self.pending_reload and self.model_options != self.backendOptions():
+            self.startModelLoading()
+        self.pending_reload = False
+
+    def compareBackends(self):
+        sample_dir = QFileDialog.getExistingDirectory(self, "选择样本图片目录")
+        if not sample_dir:
+            return
+        self.compareBtn.setEnabled(False)
+        self.compare_thread = BackendCompareThread(sample_dir, self.imgszSpinBox.value(), self.threadsSpinBox.value())
+        self.compare_thread.compareFinished.connect(self.onBackendCompareFinished) # type: ignore
+        self.compare_thread.compareFailed.connect(self.onBackendCompareFailed) # type: ignore
+        self.compare_thread.start()
+
+    def onBackendCompareFinished(self, report: str):
+        self.compareBtn.setEnabled(True)
+        self.compare_thread = None
+        MessageBox("推理后端对比", report, self).exec()
+
+    def onBackendCompareFailed(self, message: str):
+        self.compareBtn.setEnabled(True)
+        self.compare_thread = None
+        MessageBox("错误", f"后端对比失败: {message}", self).exec()
+
+    def quantizeModel(self):
+        precision = self.precisionComboBox.currentData()
+        if precision == 'fp32':
+            MessageBox("提示", "请先选择 FP16 或 INT8 量化精度", self).exec()
+            return
+        calib_dir = QFileDialog.getExistingDirectory(self, "选择校准图片目录")
+        if not calib_dir:
+            return
+        val_dir = QFileDialog.getExistingDirectory(self, "选择校验图片目录（不要与校准图片重复）")
+        if not val_dir:
+            return
+        if os.path.realpath(val_dir) == os.path.realpath(calib_dir):
+            MessageBox("提示", "校验图片目录不能与校准图片目录相同，否则精度护栏是在校准数据上自我检验", self).exec()
+            return
+        self.quantizeBtn.setEnabled(False)
+        self.quantize_thread = QuantizeThread(calib_dir, val_dir, precision, self.imgszSpinBox.value(),
+                                              self.confidenceSpinBox.value())
+        self.quantize_thread.quantizeFinished.connect(self.onQuantizeFinished) # type: ignore
+        self.quantize_thread.quantizeFailed.connect(self.onQuantizeFailed) # type: ignore
+        self.quantize_thread.start()
+
+    def onQuantizeFinished(self, passed: bool, report: str):
+        self.quantizeBtn.setEnabled(True)
+        self.quantize_thread = None
+        if passed:
+            report += "\n\n点击“应用推理后端”即可启用量化模型"
+        MessageBox("量化校验结果", report, self).exec()
+
+    def onQuantizeFailed(self, message: str):
+        self.quantizeBtn.setEnabled(True)
+        self.quantize_thread = None
+        MessageBox("错误", f"量化失败: {message}", self).exec()
+
     def initSettings(self):
         layout = QFormLayout(self.settingsInterface)
 
@@ -582,18 +1599,281 @@ class MainWindow(FluentWindow):
         self.maxDetSpinBox.setSingleStep(10)
         self.maxDetSpinBox.setValue(1000)  # 设置默认值
         layout.addRow(StrongBodyLabel("最大检测数量:"), self.maxDetSpinBox)
+        self.confidenceSpinBox.valueChanged.connect(self.detectionInterface.refilterDetections) # type: ignore
+
+        # 检测结果磁盘缓存
+        self.diskCacheCheckBox = QCheckBox("同时缓存到磁盘", self)
+        self.diskCacheCheckBox.toggled.connect(self.toggleDiskCache) # type: ignore
+        layout.addRow(StrongBodyLabel("图片检测结果缓存:"), self.diskCacheCheckBox)
+
+        # 高分辨率图片分块检测：小缺陷不会因整图缩放到模型输入尺寸而丢失
+        self.tiledCheckBox = QCheckBox("启用", self)
+        layout.addRow(StrongBodyLabel("图片分块检测:"), self.tiledCheckBox)
+
+        self.tileSizeSpinBox = QSpinBox(self)
+        self.tileSizeSpinBox.setRange(320, 2048)
+        self.tileSizeSpinBox.setSingleStep(32)
+        self.tileSizeSpinBox.setValue(DEFAULT_TILE_SIZE)
+        layout.addRow(StrongBodyLabel("切块尺寸:"), self.tileSizeSpinBox)
+
+        self.tileOverlapSpinBox = QDoubleSpinBox(self)
+        self.tileOverlapSpinBox.setRange(0.0, 0.5)
+        self.tileOverlapSpinBox.setSingleStep(0.05)
+        self.tileOverlapSpinBox.setValue(DEFAULT_TILE_OVERLAP)
+        layout.addRow(StrongBodyLabel("切块重叠比例:"), self.tileOverlapSpinBox)
+
+        # 视频批处理大小（离线视频一次推理的帧数）
+        self.batchSizeSpinBox = QSpinBox(self)
+        self.batchSizeSpinBox.setRange(1, 32)
+        self.batchSizeSpinBox.setValue(1)  # 默认逐帧推理
+        layout.addRow(StrongBodyLabel("视频批处理大小:"), self.batchSizeSpinBox)
+
+        # 长视频并行离线分析的工作进程数，每个进程各自加载一份模型
+        self.analysisWorkersSpinBox = QSpinBox(self)
+        self.analysisWorkersSpinBox.setRange(1, os.cpu_count() or 1)
+        self.analysisWorkersSpinBox.setValue(min(4, os.cpu_count() or 1))
+        layout.addRow(StrongBodyLabel("离线分析进程数:"), self.analysisWorkersSpinBox)
+
+        # 视频检测输出：逐帧检测记录 (Parquet/JSONL) 与标注视频，保存在 runs/video 目录
+        self.videoLogCheckBox = QCheckBox("保存逐帧检测记录", self)
+        self.videoLogCheckBox.setChecked(True)
+        self.videoExportCheckBox = QCheckBox("导出标注视频", self)
+        videoOutputLayout = QHBoxLayout()
+        videoOutputLayout.addWidget(self.videoLogCheckBox)
+        videoOutputLayout.addWidget(self.videoExportCheckBox)
+        layout.addRow(StrongBodyLabel("视频检测输出:"), videoOutputLayout)
+
+        # 视频播放节奏
+        self.videoPacingComboBox = QComboBox(self)
+        self.videoPacingComboBox.addItem("按视频原始帧率", True)
+        self.videoPacingComboBox.addItem("尽可能快（离线分析）", False)
+        layout.addRow(StrongBodyLabel("视频播放节奏:"), self.videoPacingComboBox)
+
+        # 多路摄像头推理方式
+        self.multiStreamModeComboBox = QComboBox(self)
+        self.multiStreamModeComboBox.addItem("各路合并批量推理", True)
+        self.multiStreamModeComboBox.addItem("各路轮询推理", False)
+        layout.addRow(StrongBodyLabel("多路摄像头推理:"), self.multiStreamModeComboBox)
+
+        # 摄像头运动门控：画面静止时跳过推理，沿用上一次检测结果
+        self.motionGateCheckBox = QCheckBox("画面无变化时跳过推理", self)
+        layout.addRow(StrongBodyLabel("摄像头运动门控:"), self.motionGateCheckBox)
+
+        self.motionThresholdSpinBox = QDoubleSpinBox(self)
+        self.motionThresholdSpinBox.setRange(0.1, 50.0)
+        self.motionThresholdSpinBox.setSingleStep(0.5)
+        self.motionThresholdSpinBox.setSuffix(" %")
+        self.motionThresholdSpinBox.setValue(DEFAULT_MOTION_THRESHOLD * 100)
+        layout.addRow(StrongBodyLabel("变化像素占比阈值:"), self.motionThresholdSpinBox)
+
+        # 跟踪模式（视频与摄像头）：每 N 帧做一次完整检测，中间帧由跟踪器外推，每个缺陷一个编号、只计数一次
+        self.trackingCheckBox = QCheckBox("跟踪缺陷，按缺陷而不是逐帧输出", self)
+        layout.addRow(StrongBodyLabel("跟踪模式:"), self.trackingCheckBox)
+
+        self.detectIntervalSpinBox = QSpinBox(self)
+        self.detectIntervalSpinBox.setRange(2, 60)
+        self.detectIntervalSpinBox.setValue(DEFAULT_DETECT_INTERVAL)
+        self.detectIntervalSpinBox.setSuffix(" 帧")
+        layout.addRow(StrongBodyLabel("跟踪模式检测间隔:"), self.detectIntervalSpinBox)
+
+        # 推理后端、线程数与输入尺寸
+        self.backendComboBox = QComboBox(self)
+        for backend, name in BACKENDS.items():
+            self.backendComboBox.addItem(name, backend)
+        layout.addRow(StrongBodyLabel("推理后端:"), self.backendComboBox)
+
+        self.threadsSpinBox = QSpinBox(self)
+        self.threadsSpinBox.setRange(0, 64)
+        self.threadsSpinBox.setSpecialValueText("自动")  # 0 表示由运行时决定
+        layout.addRow(StrongBodyLabel("推理线程数:"), self.threadsSpinBox)
+
+        self.imgszSpinBox = QSpinBox(self)
+        self.imgszSpinBox.setRange(160, 1920)
+        self.imgszSpinBox.setSingleStep(32)
+        self.imgszSpinBox.setValue(DEFAULT_IMGSZ)
+        layout.addRow(StrongBodyLabel("输入尺寸:"), self.imgszSpinBox)
+
+        # 量化精度：FP16/INT8 需先以本厂焊缝图片校准并通过与 FP32 结果的对比校验
+        self.precisionComboBox = QComboBox(self)
+        for precision, name in PRECISIONS.items():
+            self.precisionComboBox.addItem(name, precision)
+        layout.addRow(StrongBodyLabel("量化精度:"), self.precisionComboBox)
+
+        # 瘦客户端：推理交给局域网内的检测服务 (detection_service.py)，本机不加载模型
+        self.serviceCheckBox = QCheckBox("使用检测服务", self)
+        self.serviceUrlEdit = LineEdit(self)
+        self.serviceUrlEdit.setText(f"http://127.0.0.1:{DEFAULT_PORT}")
+        serviceLayout = QHBoxLayout()
+        serviceLayout.addWidget(self.serviceCheckBox)
+        serviceLayout.addWidget(self.serviceUrlEdit, 1)
+        layout.addRow(StrongBodyLabel("检测服务:"), serviceLayout)
+
+        backendLayout = QHBoxLayout()
+        self.applyBackendBtn = PrimaryPushButton("应用推理后端")
+        self.applyBackendBtn.clicked.connect(self.startModelLoading)  # type: ignore
+        backendLayout.addWidget(self.applyBackendBtn)
+        self.compareBtn = PrimaryPushButton("对比各后端延迟与精度")
+        self.compareBtn.clicked.connect(self.compareBackends)  # type: ignore
+        backendLayout.addWidget(self.compareBtn)
+        self.quantizeBtn = PrimaryPushButton("量化校准")
+        self.quantizeBtn.clicked.connect(self.quantizeModel)  # type: ignore
+        backendLayout.addWidget(self.quantizeBtn)
+        layout.addRow(backendLayout)
+
+        # 性能监视：检测画面下方的实时 HUD，以及可导出到 chrome://tracing / Perfetto 的逐次计时追踪
+        self.perfHudCheckBox = QCheckBox("显示性能 HUD", self)
+        self.perfHudCheckBox.toggled.connect(self.togglePerfHud)  # type: ignore
+        self.perfTraceCheckBox = QCheckBox("记录性能追踪", self)
+        self.perfTraceCheckBox.toggled.connect(self.togglePerfTracing)  # type: ignore
+        self.exportTraceBtn = PrimaryPushButton("导出性能追踪")
+        self.exportTraceBtn.clicked.connect(self.exportPerfTrace)  # type: ignore
+        perfLayout = QHBoxLayout()
+        perfLayout.addWidget(self.perfHudCheckBox)
+        perfLayout.addWidget(self.perfTraceCheckBox)
+        perfLayout.addWidget(self.exportTraceBtn)
+        layout.addRow(StrongBodyLabel("性能监视:"), perfLayout)
 
         # 保存按钮
         self.saveBtn = PrimaryPushButton("保存设置")
         self.saveBtn.clicked.connect(self.saveSettings)  # type: ignore
         layout.addRow(self.saveBtn)
 
+        # 恢复上次保存的设置；之后阈值、检测数量与批大小一经修改即下发给运行中的检测线程
+        self.restoreSettings(settings_store.load())
+        for spinBox in (self.confidenceSpinBox, self.maxDetSpinBox, self.batchSizeSpinBox):
+            spinBox.valueChanged.connect(self.publishDetectionConfig)  # type: ignore
+        self.publishDetectionConfig()
+
+    def settingWidgets(self) -> dict:
+        # 持久化的设置项：键名 -> 控件
+        return {
+            "conf": self.confidenceSpinBox,
+            "max_det": self.maxDetSpinBox,
+            "disk_cache": self.diskCacheCheckBox,
+            "tiled": self.tiledCheckBox,
+            "tile_size": self.tileSizeSpinBox,
+            "tile_overlap": self.tileOverlapSpinBox,
+            "batch_size": self.batchSizeSpinBox,
+            "analysis_workers": self.analysisWorkersSpinBox,
+            "video_log": self.videoLogCheckBox,
+            "video_export": self.videoExportCheckBox,
+            "video_realtime": self.videoPacingComboBox,
+            "multi_stream_batch": self.multiStreamModeComboBox,
+            "motion_gate": self.motionGateCheckBox,
+            "motion_threshold": self.motionThresholdSpinBox,
+            "tracking": self.trackingCheckBox,
+            "detect_interval": self.detectIntervalSpinBox,
+            "backend": self.backendComboBox,
+            "threads": self.threadsSpinBox,
+            "imgsz": self.imgszSpinBox,
+            "precision": self.precisionComboBox,
+            "use_service": self.serviceCheckBox,
+            "service_url": self.serviceUrlEdit,
+            "perf_hud": self.perfHudCheckBox,
+        }
+
+    def currentSettings(self) -> dict:
+        values = {}
+        for key, widget in self.settingWidgets().items():
+            if isinstance(widget, QComboBox):
+                values[key] = widget.currentData()
+            elif isinstance(widget, QCheckBox):
+                values[key] = widget.isChecked()
+            elif isinstance(widget, LineEdit):
+                values[key] = widget.text().strip()
+            else:
+                values[key] = widget.value()
+        return values
+
+    def restoreSettings(self, values: dict):
+        # 设置文件可能来自旧版本或被手工修改：类型不对或下拉框里已没有的值直接忽略，保留控件默认值
+        for key, widget in self.settingWidgets().items():
+            value = values.get(key)
+            if value is None:
+                continue
+            if isinstance(widget, QComboBox):
+                index = widget.findData(value)
+                if index >= 0:
+                    widget.setCurrentIndex(index)
+            elif isinstance(widget, QCheckBox):
+                if isinstance(value, bool):
+                    widget.setChecked(value)
+            elif isinstance(widget, LineEdit):
+                if isinstance(value, str):
+                    widget.setText(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                widget.setValue(value if isinstance(widget, QDoubleSpinBox) else int(value))
+
+    def publishDetectionConfig(self):
+        detection_config.publish(conf=self.confidenceSpinBox.value(), max_det=self.maxDetSpinBox.value(),
+                                 batch_size=self.batchSizeSpinBox.value())
+
+    def backendOptions(self) -> tuple:
+        return (self.backendComboBox.currentData(), self.imgszSpinBox.value(), self.threadsSpinBox.value(),
+                self.precisionComboBox.currentData(), self.serviceUrl())
+
+    def tilingOptions(self) -> Optional[Tuple[int, float]]:
+        if not self.tiledCheckBox.isChecked():
+            return None
+        return self.tileSizeSpinBox.value(), self.tileOverlapSpinBox.value()
+
+    def motionThreshold(self) -> float:
+        # 0 表示关闭运动门控
+        return self.motionThresholdSpinBox.value() / 100 if self.motionGateCheckBox.isChecked() else 0.0
+
+    def togglePerfHud(self, checked: bool):
+        self.videoDetectionInterface.perfHud.setVisible(checked)
+        self.cameraDetectionInterface.perfHud.setVisible(checked)
+
+    def togglePerfTracing(self, checked: bool):
+        perf_monitor.tracing = checked
+
+    def exportPerfTrace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出性能追踪", "perf_trace.json", "Chrome 追踪文件 (*.json)")
+        if not path:
+            return
+        try:
+            events = perf_monitor.export_chrome_trace(path)
+        except OSError as e:
+            MessageBox("导出失败", str(e), self).exec()
+            return
+        hint = "" if events else "\n（未记录到事件，请先勾选“记录性能追踪”并运行检测）"
+        MessageBox("导出完成", f"已导出 {events} 个事件到 {path}\n可在 chrome://tracing 或 Perfetto 中打开{hint}", self).exec()
+
+    def serviceUrl(self) -> Optional[str]:
+        url = self.serviceUrlEdit.text().strip()
+        return url if self.serviceCheckBox.isChecked() and url else None
+
+    def trackInterval(self) -> int:
+        # 0 表示关闭跟踪模式，逐帧检测
+        return self.detectIntervalSpinBox.value() if self.trackingCheckBox.isChecked() else 0
+
+    def toggleDiskCache(self, checked: bool):
+        detection_cache.cache_dir = DETECTION_CACHE_DIR if checked else None
+
     def saveSettings(self):
+        try:
+            settings_store.save(self.currentSettings())
+        except OSError as e:
+            MessageBox("保存失败", str(e), self).exec()
+            return
+        self.publishDetectionConfig()
+        # 推理后端、输入尺寸等有变化时在后台重新加载模型，加载完成后运行中的检测自动切换
+        reload = self.model_options != self.backendOptions()
+        deferred = reload and self.model_loader is not None
+        if deferred:
+            self.pending_reload = True  # 正在加载的是旧选项，等它结束后再按新选项加载
+        elif reload:
+            self.startModelLoading()
         conf = self.confidenceSpinBox.value()
         max_det = self.maxDetSpinBox.value()
+        batch_size = self.batchSizeSpinBox.value()
         MessageBox(
             "设置已保存",
-            f"当前设置：\n置信度阈值: {conf}\n最大检测数量: {max_det}",
+            f"当前设置：\n置信度阈值: {conf}\n最大检测数量: {max_det}\n视频批处理大小: {batch_size}\n"
+            f"已保存到 {settings_store.path}，正在运行的检测已同步使用新设置"
+            + ("\n推理后端正在加载上一次的选项，完成后将按新选项重新加载并自动切换" if deferred else
+               "\n推理后端正在后台重新加载，完成后自动切换" if reload else ""),
             self
         ).exec()
 
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+SETTINGS_PATH = os.path.join('config', 'settings.json')
+
+
+# ========================== 设置存储 ==========================
+class SettingsStore:
+    # 设置页各项的持久化：启动时读入，点击“保存设置”时整体写回。
+    # 写入先落到临时文件再替换，保存途中断电也不会留下半个 JSON；不认识的键原样保留
+
+    def __init__(self, path: str = SETTINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._values: Dict[str, Any] = {}
+
+    def load(self) -> Dict[str, Any]:
+        # 文件不存在或已损坏时按空设置处理，界面使用各控件的默认值
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            values = {}
+        if not isinstance(values, dict):
+            values = {}
+        with self._lock:
+            self._values = values
+        return dict(values)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def save(self, values: Dict[str, Any]):
+        with self._lock:
+            self._values.update(values)
+            data = dict(self._values)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+
+# ========================== 运行中检测的配置通道 ==========================
+class DetectionConfig:
+    # 检测线程每批推理使用的参数快照，创建后不再修改
+    __slots__ = ('conf', 'max_det', 'batch_size', 'model')
+
+    def __init__(self, conf: float = 0.25, max_det: int = 1000, batch_size: int = 1, model=None):
+        self.conf = conf
+        self.max_det = max_det
+        self.batch_size = max(1, batch_size)
+        self.model = model
+
+    def replace(self, **changes) -> 'DetectionConfig':
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return DetectionConfig(**values)
+
+
+class ConfigChannel:
+    # 界面线程发布、检测线程读取：每次发布都整体换成一个新的快照，读取方每批推理前取一次引用即可，
+    # 不需要加锁，也不会读到一半新一半旧的参数。模型也经由这里下发，切换后端后运行中的检测从下一批起使用新模型
+
+    def __init__(self, config: Optional[DetectionConfig] = None):
+        self._lock = threading.Lock()
+        self._current = config or DetectionConfig()
+        self.version = 0
+
+    @property
+    def current(self) -> DetectionConfig:
+        return self._current
+
+    def publish(self, **changes) -> DetectionConfig:
+        with self._lock:  # 只串行化发布方，避免两次发布互相覆盖对方修改的字段
+            self._current = self._current.replace(**changes)
+            self.version += 1
+            return self._current
+
+
+settings_store = SettingsStore()
+detection_config = ConfigChannel()
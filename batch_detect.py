@@ -0,0 +1,149 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from detection_utils import IMAGE_EXTENSIONS, extract_detections
+from model_registry import DEFAULT_MODEL_PATH
+
+# 无界面批量检测入口：python batch_detect.py <目录或通配符> -o results.jsonl
+# 整条路径不导入 Qt，可在产线服务器上直接运行。
+
+_worker_model = None
+_worker_options = {}
+
+
+# ========================== 图片收集 ==========================
+def collect_images(source: str, recursive: bool = False) -> List[str]:
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+        candidates = glob.glob(pattern, recursive=recursive)
+    else:
+        candidates = glob.glob(source, recursive=True)
+    return sorted(p for p in candidates if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+# ========================== 工作进程 ==========================
+def _init_worker(model_path: str, conf: float, max_det: int, threads: int):
+    # 每个工作进程持有自己的模型实例，并限制算子线程数，避免多个进程相互抢占 CPU
+    global _worker_model, _worker_options
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from model_registry import registry
+    _worker_model = registry.get(model_path)
+    _worker_options = {"conf": conf, "max_det": max_det}
+
+
+def _detect_image(path: str) -> dict:
+    start = time.perf_counter()
+    try:
+        results = _worker_model(path, **_worker_options)
+        detections = extract_detections(results[0])
+        error = None
+    except Exception as e:
+        detections = []
+        error = str(e)
+    return {
+        "image": path,
+        "detections": detections,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "error": error,
+    }
+
+
+# ========================== 结果输出 ==========================
+class ResultWriter:
+    # 根据扩展名选择输出格式：.csv 每个检测框一行，其余按 JSON Lines 每张图片一行
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_csv = path.lower().endswith('.csv')
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._csv = None
+        if self.is_csv:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(["image", "label", "confidence", "x1", "y1", "x2", "y2", "error"])
+
+    def write(self, record: dict):
+        if not self.is_csv:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            return
+        if not record["detections"]:
+            self._csv.writerow([record["image"], "", "", "", "", "", "", record["error"] or ""])
+        for det in record["detections"]:
+            self._csv.writerow([record["image"], det["label"], f"{det['confidence']:.4f}", *det["box"], ""])
+
+    def close(self):
+        self._file.close()
+
+
+# ========================== 主流程 ==========================
+def run_batch(images: List[str], output: str, model_path: str = DEFAULT_MODEL_PATH,
+              conf: float = 0.25, max_det: int = 1000, workers: Optional[int] = None,
+              chunksize: int = 4, report_every: int = 100) -> dict:
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    writer = ResultWriter(output)
+    processed = failed = detections = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path, conf, max_det, threads)) as pool:
+            for record in pool.map(_detect_image, images, chunksize=chunksize):
+                writer.write(record)
+                processed += 1
+                failed += record["error"] is not None
+                detections += len(record["detections"])
+                if report_every and processed % report_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"[{processed}/{len(images)}] {processed / elapsed:.1f} 张/秒", flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "images": processed,
+        "failed": failed,
+        "detections": detections,
+        "seconds": round(elapsed, 2),
+        "images_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="焊缝图片批量检测（无界面）")
+    parser.add_argument("source", help="图片目录或通配符，例如 'data/**/*.jpg'")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="结果文件，.jsonl 或 .csv")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--conf", type=float, default=0.25, help="置信度阈值")
+    parser.add_argument("--max-det", type=int, default=1000, help="最大检测数量")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数，默认等于 CPU 核数")
+    parser.add_argument("--chunksize", type=int, default=4, help="每次分发给工作进程的图片数")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录")
+    args = parser.parse_args(argv)
+
+    images = collect_images(args.source, recursive=args.recursive)
+    if not images:
+        print(f"Error: No images found at {args.source}", file=sys.stderr)
+        return 1
+
+    print(f"共 {len(images)} 张图片，开始检测...", flush=True)
+    summary = run_batch(images, args.output, model_path=args.model, conf=args.conf,
+                        max_det=args.max_det, workers=args.workers, chunksize=args.chunksize)
+    print(f"完成: {summary['images']} 张图片，{summary['detections']} 个缺陷，"
+          f"失败 {summary['failed']} 张，耗时 {summary['seconds']} 秒，"
+          f"吞吐 {summary['images_per_second']} 张/秒")
+    print(f"结果已写入 {args.output}")
+    return 0 if summary['failed'] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from batch_detect import collect_images
+from detection_cache import model_checksum
+from frame_display import DisplayFrameConverter
+from model_registry import DEFAULT_MODEL_PATH, registry
+from overlay_renderer import OverlayRenderer, result_arrays
+from video_pipeline import VideoPipeline
+
+STAGES = ["decode", "preprocess", "infer", "postprocess", "plot", "qimage"]
+DISPLAY_SIZE = (640, 480)  # 与界面画面标签的默认大小一致
+
+
+# ========================== 统计工具 ==========================
+class StageTimes:
+    # 按阶段收集耗时样本 (ms)，输出均值与 P50/P90/P99
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, ms: float):
+        self.samples.setdefault(stage, []).append(ms)
+
+    def summary(self) -> Dict[str, dict]:
+        stats = {}
+        for stage in STAGES + sorted(set(self.samples) - set(STAGES)):
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            data = np.array(values)
+            stats[stage] = {
+                "count": len(values),
+                "mean_ms": round(float(data.mean()), 3),
+                "p50_ms": round(float(np.percentile(data, 50)), 3),
+                "p90_ms": round(float(np.percentile(data, 90)), 3),
+                "p99_ms": round(float(np.percentile(data, 99)), 3),
+            }
+        return stats
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # macOS 为字节，Linux 为 KB
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows 上没有 resource 模块
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_speed(times: StageTimes, result, wall_ms: float, frames: int = 1):
+    # ultralytics 结果自带 speed（每张图的预处理/推理/后处理 ms）；没有时整次调用记为 infer
+    speed = getattr(result, 'speed', None) or {}
+    if 'inference' in speed:
+        times.add("preprocess", speed.get('preprocess') or 0.0)
+        times.add("infer", speed['inference'])
+        times.add("postprocess", speed.get('postprocess') or 0.0)
+    else:
+        times.add("infer", wall_ms / frames)
+
+
+# ========================== 合成数据集 ==========================
+def synthetic_weld_image(rng: np.random.Generator, width: int = 1280, height: int = 960) -> np.ndarray:
+    # 灰色金属底纹 + 一道焊缝 + 若干暗色气孔，固定随机种子保证每次生成完全相同
+    image = rng.normal(120, 12, (height, width)).astype(np.float32)
+    seam_y = int(height * rng.uniform(0.35, 0.65))
+    seam_half = int(height * 0.06)
+    image[seam_y - seam_half:seam_y + seam_half] += 40
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+    for _ in range(rng.integers(2, 8)):
+        center = (int(rng.uniform(0.05, 0.95) * width), int(seam_y + rng.uniform(-1, 1) * seam_half))
+        cv2.circle(image, center, int(rng.uniform(3, 12)), 40, -1)
+    return cv2.cvtColor(np.clip(image, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+def make_synthetic_dataset(directory: str, images: int, video_frames: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(images):
+        path = os.path.join(directory, f"weld_{i:04d}.jpg")
+        cv2.imwrite(path, synthetic_weld_image(rng))
+        paths.append(path)
+    video_path = os.path.join(directory, "weld.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (1280, 720))
+    base = synthetic_weld_image(rng, 1280 + video_frames * 4, 720)
+    for i in range(video_frames):
+        writer.write(np.ascontiguousarray(base[:, i * 4:i * 4 + 1280]))  # 模拟焊枪沿焊缝移动
+    writer.release()
+    return paths, video_path
+
+
+# ========================== 各检测路径 ==========================
+def bench_images(model, images: List[str], conf: float, max_det: int, warmup: int = 3) -> dict:
+    # 与 ImageDetectionTask 相同的步骤：读图 -> 推理 -> 缩放到显示尺寸并标注 -> 转为 QImage
+    from PyQt6.QtGui import QImage
+
+    renderer = OverlayRenderer(model.names, skip_empty=False)
+    times = StageTimes()
+    for path in images[:warmup]:
+        model(cv2.imread(path), conf=conf, max_det=max_det)
+
+    start = time.perf_counter()
+    for path in images:
+        t0 = time.perf_counter()
+        image = cv2.imread(path)
+        t1 = time.perf_counter()
+        result = model(image, conf=conf, max_det=max_det)[0]
+        t2 = time.perf_counter()
+        detected = renderer.render_arrays(image, *result_arrays(result), display_size=DISPLAY_SIZE)
+        t3 = time.perf_counter()
+        height, width = detected.shape[:2]
+        QImage(detected.data, width, height, 3 * width, QImage.Format.Format_RGB888).rgbSwapped()
+        t4 = time.perf_counter()
+        times.add("decode", (t1 - t0) * 1000)
+        record_speed(times, result, (t2 - t1) * 1000)
+        times.add("plot", (t3 - t2) * 1000)
+        times.add("qimage", (t4 - t3) * 1000)
+    elapsed = time.perf_counter() - start
+    return {"images": len(images), "throughput_ips": round(len(images) / elapsed, 2), "stages": times.summary()}
+
+
+def bench_video(model, video_path: str, conf: float, max_det: int, batch_size: int = 1) -> dict:
+    # 与 VideoDetectionThread 相同的流水线（离线节奏），在本线程完成标注与显示转换
+    times = StageTimes()
+
+    def infer(frames: List[np.ndarray]) -> list:
+        t0 = time.perf_counter()
+        results = list(model(frames[0] if len(frames) == 1 else frames, conf=conf, max_det=max_det))
+        wall_ms = (time.perf_counter() - t0) * 1000
+        for result in results:
+            record_speed(times, result, wall_ms, len(frames))
+        return results
+
+    # 单独测一遍纯解码，流水线中的解码与推理是并行的，无法直接拆分
+    cap = cv2.VideoCapture(video_path)
+    while True:
+        t0 = time.perf_counter()
+        success, _ = cap.read()
+        if not success:
+            break
+        times.add("decode", (time.perf_counter() - t0) * 1000)
+    cap.release()
+
+    pipeline = VideoPipeline(video_path, infer, batch_size=batch_size)
+    if not pipeline.open():
+        raise ValueError(f"无法打开视频: {video_path}")
+    renderer = OverlayRenderer(model.names)
+    display = DisplayFrameConverter()
+    display.set_target_size(*DISPLAY_SIZE)
+
+    plot_ms = [0.0]
+
+    def timed(overlay):
+        # 标注在 convert 内部执行，单独计时后从显示转换耗时中扣除
+        if overlay is None:
+            return None
+
+        def draw(image, scale):
+            t0 = time.perf_counter()
+            overlay(image, scale)
+            plot_ms[0] = (time.perf_counter() - t0) * 1000
+            times.add("plot", plot_ms[0])
+        return draw
+
+    frames = 0
+    start = time.perf_counter()
+    pipeline.start()
+    try:
+        for packet in pipeline:
+            display.acquire(timeout=1.0)
+            plot_ms[0] = 0.0
+            t0 = time.perf_counter()
+            display.convert(packet.frame, timed(renderer.overlay(packet.result)))
+            times.add("qimage", (time.perf_counter() - t0) * 1000 - plot_ms[0])  # 缩放与颜色转换
+            display.release()
+            frames += 1
+    finally:
+        pipeline.stop()
+    if pipeline.error is not None:
+        raise pipeline.error
+    elapsed = time.perf_counter() - start
+    return {"frames": frames, "batch_size": batch_size, "throughput_fps": round(frames / elapsed, 2),
+            "stages": times.summary()}
+
+
+# ========================== 主流程 ==========================
+def run_benchmark(model_path: str = DEFAULT_MODEL_PATH, images: Optional[List[str]] = None, video: Optional[str] = None,
+                  synthetic_images: int = 50, synthetic_frames: int = 150, conf: float = 0.25, max_det: int = 1000,
+                  batch_size: int = 1, seed: int = 0) -> dict:
+    with tempfile.TemporaryDirectory(prefix="weld-bench-") as workdir:
+        if not images or not video:
+            synthetic_paths, synthetic_video = make_synthetic_dataset(workdir, synthetic_images, synthetic_frames, seed)
+            images = images or synthetic_paths
+            video = video or synthetic_video
+        start = time.perf_counter()
+        model = registry.get(model_path, warmup=True)
+        load_s = time.perf_counter() - start
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "model": model_path,
+                "model_checksum": model_checksum(model_path),
+                "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "opencv": cv2.__version__,
+                "conf": conf,
+                "max_det": max_det,
+                "seed": seed,
+            },
+            "model_load_s": round(load_s, 3),
+            "image": bench_images(model, images, conf, max_det),
+            "video": bench_video(model, video, conf, max_det, batch_size),
+        }
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def compare_reports(current: dict, baseline: dict) -> List[str]:
+    # 逐路径、逐阶段对比 P50，便于发现提交或模型版本之间的性能回退
+    lines = []
+    for path, throughput in (("image", "throughput_ips"), ("video", "throughput_fps")):
+        old, new = baseline.get(path, {}), current.get(path, {})
+        if throughput in old and throughput in new and old[throughput]:
+            change = (new[throughput] - old[throughput]) / old[throughput]
+            lines.append(f"{path:5s} {'throughput':11s} {old[throughput]:9.2f} -> {new[throughput]:9.2f}  {change:+.1%}")
+        for stage in STAGES:
+            before = old.get("stages", {}).get(stage)
+            after = new.get("stages", {}).get(stage)
+            if before and after and before["p50_ms"]:
+                change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"]
+                lines.append(f"{path:5s} {stage:11s} {before['p50_ms']:9.3f} -> {after['p50_ms']:9.3f} ms  {change:+.1%}")
+    return lines
+
+
+def format_summary(report: dict) -> List[str]:
+    lines = [f"模型加载 {report['model_load_s']} s    峰值内存 {report['peak_rss_mb']} MB"]
+    for path, throughput, unit in (("image", "throughput_ips", "张/秒"), ("video", "throughput_fps", "帧/秒")):
+        lines.append(f"[{path}] {report[path][throughput]} {unit}")
+        for stage, stats in report[path]["stages"].items():
+            lines.append(f"  {stage:11s} P50 {stats['p50_ms']:8.3f}  P90 {stats['p90_ms']:8.3f}  "
+                         f"P99 {stats['p99_ms']:8.3f} ms")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="检测各路径的性能基准测试（无界面）")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="结果 JSON 文件")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--images", default=None, help="样本图片目录或通配符，默认使用合成焊缝图片")
+    parser.add_argument("--video", default=None, help="样本视频，默认使用合成焊缝视频")
+    parser.add_argument("--synthetic-images", type=int, default=50, help="合成图片数量")
+    parser.add_argument("--synthetic-frames", type=int, default=150, help="合成视频帧数")
+    parser.add_argument("--conf", type=float, default=0.25, help="置信度阈值")
+    parser.add_argument("--max-det", type=int, default=1000, help="每张图片最大检测数量")
+    parser.add_argument("--batch-size", type=int, default=1, help="视频批处理大小")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据随机种子")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    images = collect_images(args.images) if args.images else None
+    if args.images and not images:
+        print(f"Error: No images found at {args.images}", file=sys.stderr)
+        return 1
+    report = run_benchmark(args.model, images, args.video, args.synthetic_images, args.synthetic_frames,
+                           args.conf, args.max_det, args.batch_size, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("\n".join(format_summary(report)))
+    print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n与 {args.compare} 对比 (P50):")
+        print("\n".join(compare_reports(report, baseline)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
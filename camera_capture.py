@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from perf_monitor import PerfMonitor, stage
+
+MAX_READ_FAILURES = 30  # 连续读取失败次数超过该值视为摄像头断开
+
+
+# ========================== 单槽帧缓冲 ==========================
+class LatestFrameSlot:
+    # 只保存最新一帧：写入总是覆盖旧帧，读取总是拿到最新一帧，旧帧不会排队积压
+
+    def __init__(self, notify: Optional[threading.Event] = None):
+        self._cond = threading.Condition()
+        self._notify = notify  # 多路共享的“有新帧”事件，供调度器等待任意一路
+        self._frame: Optional[np.ndarray] = None
+        self._timestamp = 0.0
+        self._seq = 0
+        self._read_seq = 0
+        self.overwritten = 0  # 未被消费就被覆盖的帧数
+        self.closed = False
+
+    def put(self, frame: np.ndarray, timestamp: float):
+        with self._cond:
+            if self._seq > self._read_seq:
+                self.overwritten += 1
+            self._frame = frame
+            self._timestamp = timestamp
+            self._seq += 1
+            self._cond.notify_all()
+        if self._notify is not None:
+            self._notify.set()
+
+    def get(self, timeout: float = 1.0) -> Optional[Tuple[np.ndarray, float]]:
+        # 等待一帧尚未读取过的新帧，返回 (帧, 采集时刻)；超时或已关闭返回 None
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self.closed, timeout):
+                return None
+            if self._seq == self._read_seq:
+                return None
+            self._read_seq = self._seq
+            return self._frame, self._timestamp
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._notify is not None:
+            self._notify.set()
+
+
+# ========================== 采集线程 ==========================
+class CameraGrabber:
+    # 专用采集线程持续读取摄像头，把驱动缓冲区排空，只把最新一帧放入单槽缓冲。
+    # 采集时刻使用 time.perf_counter()，与显示端比较即可得到采集到显示的延迟。
+
+    def __init__(self, source, notify: Optional[threading.Event] = None, monitor: Optional[PerfMonitor] = None):
+        self.source = source
+        self.slot = LatestFrameSlot(notify)
+        self.monitor = monitor
+        self.fps = 0.0
+        self._cap = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # 部分后端不支持，采集线程本身也会持续排空缓冲
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 0.0
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._grab_loop, name=f"camera-grab:{self.source}", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def dropped(self) -> int:
+        return self.slot.overwritten
+
+    def read(self, timeout: float = 1.0) -> Optional[Tuple[np.ndarray, float]]:
+        return self.slot.get(timeout)
+
+    def _grab_loop(self):
+        cap = self._cap
+        failures = 0
+        try:
+            while not self._stop.is_set():
+                with stage(self.monitor, f"camera{self.source}/grab"):  # 主要是等待下一帧的时间，反映摄像头实际帧率
+                    success, frame = cap.read()
+                if not success:
+                    failures += 1
+                    if failures > MAX_READ_FAILURES:
+                        break
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                self.slot.put(frame, time.perf_counter())
+        finally:
+            cap.release()
+            self.slot.close()
+
+
+# ========================== 多路推理调度 ==========================
+class StreamScheduler:
+    # 多路摄像头共用一个模型的中央调度器。每轮只取各路尚未处理的最新帧：
+    # batch 模式下把这些帧合成一次批量推理；轮询模式下每轮只推理一路，起点依次后移，保证各路公平。
+    # gate(路编号, 帧) 返回实际送去推理的图像（如 ROI 裁剪），返回 None 表示该帧跳过推理。
+
+    def __init__(self, grabbers: Dict[int, CameraGrabber], infer: Callable[[List[np.ndarray]], List[Any]],
+                 batch: bool = True, notify: Optional[threading.Event] = None,
+                 gate: Optional[Callable[[int, np.ndarray], Optional[np.ndarray]]] = None):
+        self.grabbers = grabbers
+        self.infer = infer
+        self.batch = batch
+        self.gate = gate
+        self.notify = notify or threading.Event()
+        self._order = list(grabbers)
+        self._next = 0
+
+    @property
+    def running(self) -> bool:
+        return any(grabber.running for grabber in self.grabbers.values())
+
+    def _fresh_frames(self) -> List[Tuple[int, np.ndarray, float]]:
+        count = len(self._order)
+        ordered = self._order[self._next:] + self._order[:self._next]
+        frames = []
+        for stream_id in ordered:
+            item = self.grabbers[stream_id].read(timeout=0)
+            if item is not None:
+                frames.append((stream_id, item[0], item[1]))
+                if not self.batch:
+                    self._next = (self._order.index(stream_id) + 1) % count
+                    break
+        return frames
+
+    def next_round(self, timeout: float = 1.0) -> List[Tuple[int, np.ndarray, float, Any]]:
+        # 返回 [(路编号, 帧, 采集时刻, 推理结果)]，被 gate 跳过的帧推理结果为 None；超时无新帧返回空列表
+        frames = self._fresh_frames()
+        if not frames:
+            self.notify.wait(timeout)
+            self.notify.clear()
+            frames = self._fresh_frames()
+            if not frames:
+                return []
+        if self.gate is None:
+            inputs = [frame for _, frame, _ in frames]
+        else:
+            inputs = [self.gate(stream_id, frame) for stream_id, frame, _ in frames]
+        pending = [image for image in inputs if image is not None]
+        results = iter(self.infer(pending) if pending else [])
+        return [(stream_id, frame, captured_at, next(results) if image is not None else None)
+                for (stream_id, frame, captured_at), image in zip(frames, inputs)]
@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+import cv2
+
+CAMERA_CACHE_PATH = os.path.join('cache', 'cameras.json')
+MAX_CAMERA_INDEX = 8  # 探测 0 ~ MAX_CAMERA_INDEX-1，中间出现空号不会提前停止
+PROBE_TIMEOUT = 3.0  # 单个设备的探测超时（秒）
+
+
+# ========================== 设备探测 ==========================
+def probe_camera(index: int) -> bool:
+    cap = cv2.VideoCapture(index)
+    try:
+        return cap.isOpened() and cap.read()[0]
+    finally:
+        cap.release()
+
+
+def scan_cameras(max_index: int = MAX_CAMERA_INDEX, timeout: float = PROBE_TIMEOUT) -> List[int]:
+    # 所有索引并行探测，总耗时约等于最慢的一个设备且不超过 timeout；
+    # 驱动卡死的设备无法被强制中断，探测线程设为守护线程，超时后直接视为不可用
+    found = [False] * max_index
+
+    def worker(index):
+        try:
+            found[index] = probe_camera(index)
+        except Exception:
+            found[index] = False
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"camera-probe:{i}", daemon=True)
+               for i in range(max_index)]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+    return [i for i in range(max_index) if found[i] and not threads[i].is_alive()]
+
+
+# ========================== 磁盘缓存 ==========================
+def load_cached_cameras(path: str = CAMERA_CACHE_PATH) -> Optional[List[int]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [int(i) for i in json.load(f)["cameras"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_cached_cameras(cameras: List[int], path: str = CAMERA_CACHE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"cameras": cameras, "scanned_at": time.time()}, f)
@@ -0,0 +1,174 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from detection_utils import box_iou
+
+DEFAULT_DETECT_INTERVAL = 5  # 跟踪模式下每隔多少帧做一次完整检测
+TRACK_IOU_THRESHOLD = 0.3  # 预测框与检测框（各自扩大后）IoU 低于该值不关联
+TRACK_IOU_BUFFER = 0.5  # 关联前把框的每边向外扩大宽高的该比例：间隔数帧才检测一次时，小而快的缺陷仍能与预测框重叠
+TRACK_MAX_MISSES = 6  # 连续这么多次完整检测都没有关联上即结束该轨迹（按检测次数计，与检测间隔无关）
+TRACK_MIN_HITS = 2  # 至少被检测到这么多次才确认为一个缺陷，过滤单帧误检
+POSITION_GAIN = 0.6  # alpha-beta 滤波（稳态的匀速卡尔曼滤波）的位置与速度增益
+VELOCITY_GAIN = 0.2
+
+
+# ========================== 轨迹 ==========================
+class Track:
+    # 一个物理缺陷：框位置按匀速模型外推，每次关联上检测框时用 alpha-beta 滤波修正位置与速度
+
+    def __init__(self, track_id: int, box: np.ndarray, conf: float, cls: int, frame: int):
+        self.id = track_id
+        self.cls = cls
+        self.box = box.astype(np.float32)
+        self.velocity = np.zeros(4, np.float32)  # 每帧位移
+        self.conf = conf
+        self.best_conf = conf
+        self.best_box = self.box.copy()
+        self.first_frame = frame
+        self.last_frame = frame  # 最近一次关联上检测框的帧
+        self.hits = 1
+
+    def predict(self, frame: int) -> np.ndarray:
+        return self.box + self.velocity * (frame - self.last_frame)
+
+    def update(self, box: np.ndarray, conf: float, frame: int):
+        elapsed = max(1, frame - self.last_frame)
+        predicted = self.predict(frame)
+        residual = box - predicted
+        if self.hits == 1:
+            self.velocity = residual / elapsed  # 第二次检测时直接由两次位置得到初速度
+        else:
+            self.velocity = self.velocity + VELOCITY_GAIN * residual / elapsed
+        self.box = predicted + POSITION_GAIN * residual
+        self.conf = conf
+        if conf > self.best_conf:
+            self.best_conf, self.best_box = conf, box.astype(np.float32)
+        self.last_frame = frame
+        self.hits += 1
+
+
+# ========================== 缺陷跟踪器 ==========================
+class DefectTracker:
+    # 基于 IoU 的多目标跟踪：每 N 帧做一次完整检测并与现有轨迹关联（同类别、按 IoU 贪心匹配），
+    # 中间帧只把轨迹按速度外推。每条确认的轨迹即一个缺陷，只计数一次
+
+    def __init__(self, names: Dict[int, str], iou_threshold: float = TRACK_IOU_THRESHOLD,
+                 max_misses: int = TRACK_MAX_MISSES, min_hits: int = TRACK_MIN_HITS, buffer: float = TRACK_IOU_BUFFER,
+                 detect_interval: int = DEFAULT_DETECT_INTERVAL):
+        self.names = names
+        self.iou_threshold = iou_threshold
+        self.buffer = buffer
+        # 轨迹按帧号判断是否过期：允许的漏检次数换算成帧数，检测间隔越大，轨迹在两次检测之间等待越久
+        self.max_age = max_misses * max(1, detect_interval)
+        self.min_hits = min_hits
+        self.tracks: List[Track] = []
+        self.finished: List[Track] = []  # 已结束且确认的轨迹
+        self._unreported: List[Track] = []  # 已结束但尚未被 pop_finished 取走的轨迹
+        self._last_detection: Optional[int] = None
+        self._next_id = 1
+
+    @property
+    def defect_count(self) -> int:
+        return len(self.finished) + sum(track.hits >= self.min_hits for track in self.tracks)
+
+    def update(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray,
+               frame: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # 检测帧：关联检测框并返回本帧确认轨迹的 (xyxy, conf, cls, 轨迹编号)
+        predicted = np.array([track.predict(frame) for track in self.tracks], np.float32).reshape(-1, 4)
+        iou = box_iou(buffered(predicted, self.buffer), buffered(xyxy, self.buffer))
+        if iou.size:
+            track_classes = np.array([track.cls for track in self.tracks])
+            iou[track_classes[:, None] != cls[None, :]] = 0  # 不同类别的缺陷不关联
+        matched_tracks, matched_detections = set(), set()
+        for flat in np.argsort(-iou, axis=None):
+            t, d = divmod(int(flat), iou.shape[1])
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            self.tracks[t].update(xyxy[d], float(conf[d]), frame)
+            matched_tracks.add(t)
+            matched_detections.add(d)
+        for d in range(len(conf)):
+            if d not in matched_detections:
+                self.tracks.append(Track(self._next_id, xyxy[d], float(conf[d]), int(cls[d]), frame))
+                self._next_id += 1
+        self._retire(frame)
+        return self._visible(frame, lambda track: track.last_frame == frame)
+
+    def predict(self, frame: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # 非检测帧：只外推上一次检测时仍然可见的轨迹，不做推理
+        return self._visible(frame, lambda track: track.last_frame == self._last_detection)
+
+    def finish(self) -> List[Track]:
+        # 流结束：结束所有轨迹，返回尚未取走的已确认轨迹
+        self._retire(None)
+        return self.pop_finished()
+
+    def pop_finished(self) -> List[Track]:
+        tracks, self._unreported = self._unreported, []
+        return tracks
+
+    def defects(self) -> List[dict]:
+        # 按首次出现的帧排序的缺陷列表
+        tracks = self.finished + [track for track in self.tracks if track.hits >= self.min_hits]
+        return [{
+            "id": track.id,
+            "class_id": track.cls,
+            "label": self.names.get(track.cls, str(track.cls)),
+            "confidence": round(track.best_conf, 4),
+            "first_frame": track.first_frame,
+            "last_frame": track.last_frame,
+            "detections": track.hits,
+            "box": [round(float(v), 1) for v in track.best_box],
+        } for track in sorted(tracks, key=lambda track: (track.first_frame, track.id))]
+
+    def _retire(self, frame: Optional[int]):
+        self._last_detection = frame
+        alive = []
+        for track in self.tracks:
+            if frame is not None and frame - track.last_frame <= self.max_age:
+                alive.append(track)
+            elif track.hits >= self.min_hits:
+                self.finished.append(track)
+                self._unreported.append(track)
+        self.tracks = alive
+
+    def _visible(self, frame: int, selected) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        tracks = [track for track in self.tracks if track.hits >= self.min_hits and selected(track)]
+        if not tracks:
+            return (np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32),
+                    np.empty(0, np.int32))
+        return (np.array([track.predict(frame) for track in tracks], np.float32),
+                np.array([track.conf for track in tracks], np.float32),
+                np.array([track.cls for track in tracks], np.int32),
+                np.array([track.id for track in tracks], np.int32))
+
+
+def buffered(xyxy: np.ndarray, buffer: float) -> np.ndarray:
+    # 每边向外扩大宽高的 buffer 倍 (Buffered IoU)
+    size = xyxy[:, 2:] - xyxy[:, :2]
+    return np.hstack([xyxy[:, :2] - size * buffer, xyxy[:, 2:] + size * buffer])
+
+
+def track_arrays(tracks: List[Track]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 轨迹的代表框（置信度最高的一次检测），用于按缺陷写入检测历史
+    if not tracks:
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32)
+    return (np.array([track.best_box for track in tracks], np.float32),
+            np.array([track.best_conf for track in tracks], np.float32),
+            np.array([track.cls for track in tracks], np.int32))
+
+
+def save_defects(path: str, defects: List[dict], fps: float = 0.0):
+    # 缺陷列表写为 JSON；给出帧率时附带首末出现时刻 (ms)
+    if fps > 0:
+        for defect in defects:
+            defect["first_ms"] = round(defect["first_frame"] * 1000 / fps, 1)
+            defect["last_ms"] = round(defect["last_frame"] * 1000 / fps, 1)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(defects, f, ensure_ascii=False, indent=2)
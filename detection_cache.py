@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from overlay_renderer import result_arrays
+
+DETECTION_CACHE_DIR = os.path.join('cache', 'detections')
+CACHE_CONF_FLOOR = 0.05  # 缓存未命中时按该下限推理，之后在其之上调整置信度都只需重新过滤
+
+
+# ========================== 摘要计算 ==========================
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_model_checksums: Dict[Tuple[str, float, int], str] = {}
+
+
+def model_checksum(path: str) -> str:
+    # 模型文件较大，按 (路径, 修改时间, 大小) 记住摘要，替换权重后自动失效；
+    # OpenVINO 导出结果是目录，按其中各文件的摘要合并计算
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if key not in _model_checksums:
+        if os.path.isdir(path):
+            digest = hashlib.blake2b(digest_size=16)
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name)):
+                    digest.update(file_digest(os.path.join(path, name)).encode())
+            _model_checksums[key] = digest.hexdigest()
+        else:
+            _model_checksums[key] = file_digest(path)
+    return _model_checksums[key]
+
+
+# ========================== 缓存条目 ==========================
+class CachedDetections:
+    # 一张图片的原始检测结果：按 raw_conf 推理得到，任何不低于 raw_conf 的阈值都可直接过滤得到
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: Dict[int, str],
+                 raw_conf: float, image_size: Tuple[int, int]):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.names = names
+        self.raw_conf = raw_conf
+        self.image_size = image_size  # (宽, 高)
+
+    @classmethod
+    def from_result(cls, result, raw_conf: float) -> 'CachedDetections':
+        xyxy, conf, classes = result_arrays(result)
+        height, width = result.orig_img.shape[:2]
+        return cls(xyxy, conf, classes, dict(result.names), raw_conf, (width, height))
+
+    def covers(self, conf: float) -> bool:
+        return conf >= self.raw_conf
+
+    def filter(self, conf: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        keep = self.conf >= conf
+        return self.xyxy[keep], self.conf[keep], self.cls[keep]
+
+    def to_detections(self, conf: float) -> List[dict]:
+        xyxy, confs, classes = self.filter(conf)
+        return [{
+            "label": self.names[int(class_id)],
+            "confidence": float(confidence),
+            "box": [round(float(v), 1) for v in box],
+        } for box, confidence, class_id in zip(xyxy, confs, classes)]
+
+
+# ========================== 检测结果缓存 ==========================
+class DetectionCache:
+    # 以 (图片内容摘要, 模型摘要, max_det) 为键的两级缓存：内存中 LRU 淘汰，可选磁盘层 (.npz)
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: 'OrderedDict[str, CachedDetections]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image_digest: str, model_digest: str, max_det: int, variant: str = '') -> str:
+        # variant 区分同一模型的不同推理方式（如分块检测参数）
+        return f"{image_digest}-{model_digest[:16]}-{max_det}{'-' + variant if variant else ''}"
+
+    def get(self, key: str, conf: float) -> Optional[CachedDetections]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or not entry.covers(conf):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedDetections):
+        self._remember(key, entry)
+        self._store(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, entry: CachedDetections):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load(self, key: str) -> Optional[CachedDetections]:
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                meta = json.loads(str(data['meta']))
+                return CachedDetections(
+                    data['xyxy'], data['conf'], data['cls'],
+                    {int(k): v for k, v in meta['names'].items()},
+                    meta['raw_conf'], tuple(meta['image_size'])
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key: str, entry: CachedDetections):
+        if not self.cache_dir:
+            return
+        meta = json.dumps({"names": entry.names, "raw_conf": entry.raw_conf, "image_size": entry.image_size},
+                          ensure_ascii=False)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(self._path(key), xyxy=entry.xyxy, conf=entry.conf, cls=entry.cls, meta=np.array(meta))
+        except OSError as e:
+            print(f"Error: Could not write detection cache: {e}")
+
+
+detection_cache = DetectionCache()
@@ -0,0 +1,188 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from overlay_renderer import OverlayRenderer
+
+RUNS_DIR = os.path.join('runs', 'video')
+LOG_COLUMNS = ["frame", "timestamp_ms", "class_id", "label", "confidence", "x1", "y1", "x2", "y2"]
+_STOP = object()
+
+
+def has_parquet() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_schema():
+    # 逐帧检测记录的 Parquet 列类型；实时写入与并行分析合并共用，保证两处产出的文件可以直接拼接比较
+    import pyarrow as pa
+    return pa.schema([("frame", pa.int64()), ("timestamp_ms", pa.float64()), ("class_id", pa.int32()),
+                      ("label", pa.string()), ("confidence", pa.float32()), ("x1", pa.float32()),
+                      ("y1", pa.float32()), ("x2", pa.float32()), ("y2", pa.float32())])
+
+
+def run_paths(video_path: str, runs_dir: str = RUNS_DIR) -> Tuple[str, str, str]:
+    # 每次检测一个带时间戳的文件前缀：(逐帧检测记录路径, 标注视频路径, 跟踪模式的缺陷列表路径)
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    prefix = os.path.join(runs_dir, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}")
+    return f"{prefix}.{'parquet' if has_parquet() else 'jsonl'}", f"{prefix}-annotated.mp4", f"{prefix}-defects.json"
+
+
+# ========================== 检测记录 ==========================
+class DetectionLogWriter:
+    # 逐帧检测结果的只追加日志：推理侧只把数组放入队列，由后台线程攒批写盘，写盘不会阻塞推理。
+    # 每个检测框一行；安装了 pyarrow 时写 Parquet（每次刷新一个 row group），否则写 JSON Lines
+
+    def __init__(self, path: str, names: Dict[int, str], flush_rows: int = 4096, flush_interval: float = 1.0):
+        self.path = path
+        self.names = names
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows = 0
+        self.error: Optional[Exception] = None
+        self._queue: 'queue.Queue' = queue.Queue()  # 不设上限：一帧只有几个小数组，宁可占内存也不让推理等待
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name="detection-log", daemon=True)
+        self._thread.start()
+
+    def write(self, frame_index: int, timestamp_ms: float, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        if len(conf):
+            self._queue.put((frame_index, timestamp_ms, xyxy, conf, cls))
+
+    def close(self):
+        # 写入剩余数据后返回
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _columns(self, items: list) -> Dict[str, list]:
+        columns: Dict[str, list] = {name: [] for name in LOG_COLUMNS}
+        for frame_index, timestamp_ms, xyxy, conf, cls in items:
+            count = len(conf)
+            columns["frame"].extend([frame_index] * count)
+            columns["timestamp_ms"].extend([round(float(timestamp_ms), 1)] * count)
+            columns["class_id"].extend(cls.tolist())
+            columns["label"].extend(self.names.get(int(c), str(c)) for c in cls.tolist())
+            columns["confidence"].extend(round(float(c), 4) for c in conf.tolist())
+            for i, name in enumerate(("x1", "y1", "x2", "y2")):
+                columns[name].extend(round(float(v), 1) for v in xyxy[:, i].tolist())
+        return columns
+
+    def _write_loop(self):
+        parquet = self.path.lower().endswith('.parquet')
+        writer = None
+        pending: List[tuple] = []
+        pending_rows = 0
+        last_flush = time.perf_counter()
+        done = False
+        item = None
+        try:
+            if parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                schema = parquet_schema()
+                writer = pq.ParquetWriter(self.path, schema)
+            else:
+                writer = open(self.path, 'a', encoding='utf-8')
+
+            while not done:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    done = True
+                elif item is not None:
+                    pending.append(item)
+                    pending_rows += len(item[3])
+                now = time.perf_counter()
+                if pending and (done or pending_rows >= self.flush_rows or now - last_flush >= self.flush_interval):
+                    columns = self._columns(pending)
+                    if parquet:
+                        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                    else:
+                        writer.write(''.join(json.dumps(dict(zip(LOG_COLUMNS, row)), ensure_ascii=False) + '\n'
+                                             for row in zip(*columns.values())))
+                        writer.flush()
+                    self.rows += pending_rows
+                    pending, pending_rows, last_flush = [], 0, now
+        except Exception as e:
+            self.error = e
+            print(f"Error: Could not write detection log: {e}")
+            # 写盘失败后继续取空队列，避免 close() 等待
+            while item is not _STOP:
+                item = self._queue.get()
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+# ========================== 标注视频导出 ==========================
+class AnnotatedVideoWriter:
+    # 独立编码线程：在原分辨率帧上绘制检测框并交给 cv2.VideoWriter（mp4v 编码，不依赖特定硬件）。
+    # 队列有上限，编码跟不上时让出帧的一方等待，而不是无限占用内存；推理在流水线线程中不受影响
+
+    def __init__(self, path: str, fps: float, names: Dict[int, str], queue_size: int = 32):
+        self.path = path
+        self.fps = fps if fps > 0 else 25.0
+        self.renderer = OverlayRenderer(names)
+        self.frames = 0
+        self.error: Optional[Exception] = None
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._thread = threading.Thread(target=self._encode_loop, name="video-encoder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame: np.ndarray, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        if self.error is None:
+            self._queue.put((frame, xyxy, conf, cls))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _encode_loop(self):
+        writer = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                frame, xyxy, conf, cls = item
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+                    if not writer.isOpened():
+                        raise IOError(f"无法创建视频文件: {self.path}")
+                if len(conf):
+                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # 标注配色为 RGB
+                    frame = cv2.cvtColor(self.renderer.draw(rgb, xyxy, conf, cls), cv2.COLOR_RGB2BGR)
+                writer.write(frame)
+                self.frames += 1
+        except Exception as e:
+            self.error = e
+            print(f"Error: Could not write annotated video: {e}")
+            while self._queue.get() is not _STOP:
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
@@ -0,0 +1,420 @@
+import argparse
+import hashlib
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detection_cache import model_checksum
+from model_registry import DEFAULT_MODEL_PATH
+from overlay_renderer import result_arrays
+from perf_monitor import PerfMonitor
+
+# 局域网检测服务：python detection_service.py --host 0.0.0.0 --port 8765
+#   POST /detect?conf=0.25&max_det=1000   请求体为编码后的图片 (PNG/JPEG)，返回 JSON 检测结果
+#   GET  /health                           模型信息与类别名
+#   GET  /metrics                          Prometheus 文本格式的指标
+# 并发请求在延迟预算内合并为一次批量推理；队列满时立即返回 503，由调用方稍后重试。
+# 整条路径不导入 Qt，可在产线服务器上直接运行；界面可以作为瘦客户端通过 RemoteModel 使用该服务。
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 8
+DEFAULT_MAX_WAIT_MS = 10.0  # 第一张图片到达后最多再等这么久凑批
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_REQUEST_TIMEOUT = 30.0
+MAX_BODY_BYTES = 64 << 20
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+# ========================== 动态批处理 ==========================
+class DetectionRequest:
+    __slots__ = ('image', 'conf', 'max_det', 'future', 'enqueued')
+
+    def __init__(self, image: np.ndarray, conf: float, max_det: int):
+        self.image = image
+        self.conf = conf
+        self.max_det = max_det
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class DynamicBatcher:
+    # 单个推理线程从有界队列取请求：取到第一张后在 max_wait_ms 内继续收集，最多 max_batch 张合成一次推理。
+    # 同一批中 conf/max_det 不同的请求按最低 conf、最大 max_det 推理，再逐个按各自的参数过滤，
+    # 与 runDetection 单独推理的结果一致
+
+    def __init__(self, model, max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, monitor: Optional[PerfMonitor] = None):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.monitor = monitor or PerfMonitor()
+        self.batches = 0
+        self.images = 0
+        self.batch_sizes = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._queue: 'queue.Queue[Optional[DetectionRequest]]' = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="detection-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, image: np.ndarray, conf: float, max_det: int) -> Future:
+        request = DetectionRequest(image, conf, max_det)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise ServiceBusy(f"队列已满 ({self._queue.maxsize})")
+        return request.future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> Tuple[List[DetectionRequest], bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        closed = False
+        while not closed:
+            batch, closed = self._collect()
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for request in batch:
+                self.monitor.add("service/queue_wait", (started - request.enqueued) * 1000, request.enqueued)
+            try:
+                with self.monitor.stage("service/infer"):
+                    images = [request.image for request in batch]
+                    results = self.model(images[0] if len(images) == 1 else images,
+                                         conf=min(request.conf for request in batch),
+                                         max_det=max(request.max_det for request in batch))
+                    arrays = [result_arrays(result) for result in results]
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            self.batch_sizes[int(np.searchsorted(BATCH_SIZE_BUCKETS, len(batch)))] += 1
+            for request, (xyxy, conf, cls) in zip(batch, arrays):
+                order = np.argsort(-conf, kind='stable')
+                order = order[conf[order] >= request.conf][:request.max_det]
+                request.future.set_result((xyxy[order], conf[order], cls[order]))
+
+
+# ========================== HTTP 服务 ==========================
+class DetectionService:
+    # 把模型、批处理器与 HTTP 服务组合在一起；port 为 0 时由系统分配空闲端口（本机测试用）
+
+    def __init__(self, model, host: str = '127.0.0.1', port: int = DEFAULT_PORT, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.model = model
+        self.request_timeout = request_timeout
+        self.monitor = PerfMonitor(window=1000)
+        self.batcher = DynamicBatcher(model, max_batch, max_wait_ms, max_queue, self.monitor)
+        self.counters: Dict[str, int] = {"requests": 0, "rejected": 0, "errors": 0, "timeouts": 0}
+        self._counter_lock = threading.Lock()
+        try:
+            checksum = model_checksum(model.path)
+        except OSError:
+            checksum = model.path
+        self.info = {"model": model.path, "checksum": checksum, "imgsz": getattr(model, 'imgsz', None),
+                     "names": {str(k): v for k, v in model.names.items()},
+                     "max_batch": max_batch, "max_wait_ms": max_wait_ms, "max_queue": max_queue}
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def start(self) -> 'DetectionService':
+        # 在后台线程中提供服务
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="detection-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.batcher.close()
+
+    def detect(self, body: bytes, conf: float, max_det: int) -> dict:
+        image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)  # 在各请求线程中并行解码
+        if image is None:
+            raise ValueError("无法解码图片")
+        started = time.perf_counter()
+        future = self.batcher.submit(image, conf, max_det)
+        try:
+            xyxy, confs, cls = future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()  # 仍在排队的请求不再推理
+            raise
+        self.monitor.add("service/request", (time.perf_counter() - started) * 1000, started)
+        height, width = image.shape[:2]
+        return {"xyxy": xyxy.tolist(), "conf": confs.tolist(), "cls": cls.tolist(), "conf_threshold": conf,
+                "max_det": max_det, "image_size": [width, height]}
+
+    def metrics(self) -> str:
+        lines = []
+        with self._counter_lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines += [f"# TYPE weld_detection_{name}_total counter", f"weld_detection_{name}_total {value}"]
+        lines += ["# TYPE weld_detection_images_total counter", f"weld_detection_images_total {self.batcher.images}",
+                  "# TYPE weld_detection_queue_depth gauge", f"weld_detection_queue_depth {self.batcher.depth}",
+                  "# TYPE weld_detection_batch_size histogram"]
+        cumulative = 0
+        for bound, count in zip(list(BATCH_SIZE_BUCKETS) + ["+Inf"], self.batcher.batch_sizes):
+            cumulative += count
+            lines.append(f'weld_detection_batch_size_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"weld_detection_batch_size_sum {self.batcher.images}",
+                  f"weld_detection_batch_size_count {self.batcher.batches}"]
+        # 延迟为最近 1000 次的滚动窗口分位数
+        for stage, stat in sorted(self.monitor.snapshot("service/").items()):
+            name = f"weld_detection_{stage.split('/', 1)[1]}_ms"
+            lines.append(f"# TYPE {name} summary")
+            lines += [f'{name}{{quantile="{q}"}} {stat[key]:.3f}' for q, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"))]
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，瘦客户端逐帧请求时不必每次重新握手
+
+    def log_message(self, format, *args):
+        pass  # 逐请求打印日志本身就很耗时
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json', headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), headers=headers)
+
+    def do_GET(self):
+        service: DetectionService = self.server.service
+        path = urllib.parse.urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, dict(service.info, queue=service.batcher.depth))
+        elif path == '/metrics':
+            self._send(200, service.metrics().encode('utf-8'), 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        service: DetectionService = self.server.service
+        url = urllib.parse.urlparse(self.path)
+        if url.path != '/detect':
+            self._send_json(404, {"error": "not found"})
+            return
+        service.count("requests")
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = 0  # 非数字的 Content-Length 与空请求体同样按 400 处理
+        if length <= 0 or length > MAX_BODY_BYTES:
+            service.count("errors")
+            self.close_connection = True  # 未读取的请求体不能留在连接上
+            self._send_json(413 if length > 0 else 400, {"error": "请求体应为一张编码后的图片"})
+            return
+        body = self.rfile.read(length)
+        params = urllib.parse.parse_qs(url.query)
+        try:
+            conf = float(params.get('conf', ['0.25'])[0])
+            max_det = int(params.get('max_det', ['1000'])[0])
+            self._send_json(200, service.detect(body, conf, max_det))
+        except ServiceBusy as e:
+            service.count("rejected")
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except FutureTimeoutError:
+            service.count("timeouts")
+            self._send_json(504, {"error": "推理超时"})
+        except ValueError as e:
+            service.count("errors")
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            service.count("errors")
+            self._send_json(500, {"error": str(e)})
+
+
+# ========================== 瘦客户端 ==========================
+class RemoteBoxes:
+    # 与 ultralytics Boxes 相同的 xyxy/conf/cls 字段，数据已是 NumPy 数组
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+
+class RemoteResult:
+    def __init__(self, payload: dict, image: np.ndarray, names: Dict[int, str]):
+        self.boxes = RemoteBoxes(np.array(payload["xyxy"], np.float32).reshape(-1, 4),
+                                 np.array(payload["conf"], np.float32), np.array(payload["cls"], np.int32))
+        self.orig_img = image
+        self.names = names
+
+
+class RemoteModel:
+    # 与 SharedModel 相同的调用方式，推理交给检测服务：界面各检测线程无需改动即可作为瘦客户端运行。
+    # 图片以 PNG（无损、低压缩级别）上传，结果与本地推理一致；多张图片并发提交，由服务端合批
+
+    def __init__(self, url: str, timeout: float = DEFAULT_REQUEST_TIMEOUT, concurrency: int = 8, retries: int = 3):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="remote-detect")
+        self._closed = False
+        try:
+            info = self._request('/health')
+        except Exception:
+            self.close()
+            raise
+        self.imgsz = info.get("imgsz")  # 服务端的推理输入尺寸
+        # 检测缓存按该摘要区分模型：服务端换了输入尺寸，同一模型文件的结果也不能复用
+        self.checksum = hashlib.sha256(f"{info['checksum']}@{self.imgsz}".encode('utf-8')).hexdigest()
+        self._names = {int(k): v for k, v in info["names"].items()}
+
+    @property
+    def path(self) -> str:
+        return self.url
+
+    @property
+    def names(self):
+        return self._names
+
+    def _request(self, path: str, body: Optional[bytes] = None) -> dict:
+        request = urllib.request.Request(self.url + path, data=body, method='POST' if body is not None else 'GET',
+                                         headers={'Content-Type': 'image/png'} if body is not None else {})
+        for attempt in range(self.retries + 1):
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                if e.code == 503 and attempt < self.retries:  # 服务端队列已满，稍后重试
+                    time.sleep(float(e.headers.get('Retry-After') or 1) * (attempt + 1) / self.retries)
+                    continue
+                try:
+                    message = json.loads(e.read()).get("error", e.reason)
+                except ValueError:
+                    message = e.reason
+                raise RuntimeError(f"检测服务返回 {e.code}: {message}")
+            except urllib.error.URLError as e:
+                raise ConnectionError(f"无法连接检测服务 {self.url}: {e.reason}")
+        raise RuntimeError("检测服务繁忙")
+
+    def _detect(self, image, conf: float, max_det: int) -> RemoteResult:
+        if isinstance(image, str):
+            image = cv2.imread(image)
+            if image is None:
+                raise ValueError("无法读取图片文件")
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError("无法编码图片")
+        query = urllib.parse.urlencode({"conf": conf, "max_det": max_det})
+        return RemoteResult(self._request(f"/detect?{query}", encoded.tobytes()), image, self._names)
+
+    def __call__(self, source, conf: float = 0.25, max_det: int = 300, **kwargs) -> List[RemoteResult]:
+        images = source if isinstance(source, list) else [source]
+        if len(images) == 1:
+            return [self._detect(images[0], conf, max_det)]
+        try:
+            return list(self._pool.map(lambda image: self._detect(image, conf, max_det), images))
+        except RuntimeError:
+            if not self._closed:
+                raise
+        # 已被 close：切换模型前已取到旧模型引用的检测线程把这一批逐张推理完
+        return [self._detect(image, conf, max_det) for image in images]
+
+    def close(self):
+        # 界面换用其他模型后调用，回收并发上传的线程池；正在上传的请求不等待，照常完成
+        self._closed = True
+        self._pool.shutdown(wait=False)
+
+    def warmup(self, imgsz: Optional[int] = None):
+        pass  # 模型在服务端已预热
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from inference_backends import BACKENDS, DEFAULT_IMGSZ, load_backend
+    from model_quantization import PRECISIONS, load_quantized
+
+    parser = argparse.ArgumentParser(description="焊缝检测服务（HTTP，动态合批）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，局域网访问使用 0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--backend", default="pytorch", choices=list(BACKENDS), help="推理后端")
+    parser.add_argument("--precision", default="fp32", choices=list(PRECISIONS), help="量化精度")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ, help="推理输入尺寸")
+    parser.add_argument("--threads", type=int, default=0, help="推理线程数，0 表示自动")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="每批最多图片数")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS, help="凑批最长等待 (ms)")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="排队请求上限，超出返回 503")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT, help="单个请求超时 (秒)")
+    args = parser.parse_args(argv)
+
+    if args.precision == 'fp32':
+        model = load_backend(args.model, args.backend, args.imgsz, args.threads, warmup=True)
+    else:
+        model = load_quantized(args.model, args.precision, args.imgsz, args.threads, warmup=True)
+    service = DetectionService(model, args.host, args.port, args.max_batch, args.max_wait_ms, args.max_queue,
+                               args.timeout)
+    print(f"检测服务已启动: {service.url}  (模型 {model.path}，每批最多 {args.max_batch} 张，"
+          f"凑批等待 {args.max_wait_ms} ms，队列上限 {args.max_queue})", flush=True)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def extract_detections(result) -> List[dict]:
+    # 将单张图片的 YOLO 结果整理为 {label, confidence, box} 列表，box 为原图坐标 [x1, y1, x2, y2]
+    detections = []
+    boxes = result.boxes
+    if boxes is None or len(boxes.conf) == 0:
+        return detections
+
+    confs = boxes.conf.cpu().numpy()
+    classes = boxes.cls.cpu().numpy().astype(int)
+    xyxy = boxes.xyxy.cpu().numpy()
+    for confidence, class_id, box in zip(confs, classes, xyxy):
+        detections.append({
+            "label": result.names[int(class_id)],
+            "confidence": float(confidence),
+            "box": [round(float(v), 1) for v in box],
+        })
+    return detections
+
+
+def read_image_reduced(path: str, image_size: Tuple[int, int], display_size: Tuple[int, int]) -> Tuple[np.ndarray, float]:
+    # 按显示尺寸选择 1/2、1/4、1/8 降采样解码（JPEG 可在解码阶段直接缩小），返回 (BGR 图像, 相对原图比例)
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    factor = 1
+    while factor < 8 and image_size[0] // (factor * 2) >= display_size[0] and image_size[1] // (factor * 2) >= display_size[1]:
+        factor *= 2
+    image = cv2.imread(path, flags[factor])
+    if image is None:
+        raise ValueError(f"无法读取图片: {path}")
+    return image, image.shape[1] / image_size[0]
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    # 两组 xyxy 框的两两 IoU，返回 len(boxes1) x len(boxes2) 矩阵
+    if len(boxes1) == 0 or len(boxes2) == 0:
+        return np.zeros((len(boxes1), len(boxes2)), dtype=np.float32)
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    return intersection / np.maximum(area1[:, None] + area2[None, :] - intersection, 1e-9)
@@ -0,0 +1,68 @@
+import threading
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+from PyQt6.QtGui import QImage
+
+
+# ========================== 显示帧转换 ==========================
+class DisplayFrameConverter:
+    # 在工作线程中完成显示前的全部像素处理：先把 BGR 帧缩放到标签大小，再一次性转换为 RGB，
+    # 结果写入预分配的环形缓冲区，QImage 直接引用该缓冲而不再拷贝，GUI 线程只需 QPixmap.fromImage。
+    # 缓冲区由信号量保护：GUI 用完一帧后调用 release()，界面来不及显示时工作线程直接跳过该帧。
+
+    def __init__(self, slots: int = 3):
+        self.slots = slots
+        self._available = threading.Semaphore(slots)
+        self._resized: Optional[np.ndarray] = None
+        self._buffers = [None] * slots
+        self._next = 0
+        self._target_size: Tuple[int, int] = (640, 480)
+        self.skipped = 0  # 因界面未及时消费而跳过的帧数
+
+    def set_target_size(self, width: int, height: int):
+        # 由 GUI 线程在显示时更新，下一帧起生效；元组赋值本身是原子的
+        self._target_size = (max(1, width), max(1, height))
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        if timeout > 0:
+            acquired = self._available.acquire(timeout=timeout)
+        else:
+            acquired = self._available.acquire(blocking=False)
+        if not acquired:
+            self.skipped += 1
+        return acquired
+
+    def release(self):
+        self._available.release()
+
+    def _display_size(self, width: int, height: int) -> Tuple[int, int]:
+        target_width, target_height = self._target_size
+        scale = min(target_width / width, target_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def _buffer(self, shape) -> np.ndarray:
+        index = self._next
+        self._next = (self._next + 1) % self.slots
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[index] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def convert(self, frame: np.ndarray, overlay: Optional[Callable[[np.ndarray, float], None]] = None) -> QImage:
+        # 调用前须已 acquire() 到一个缓冲槽；overlay(rgb, scale) 在显示尺寸的 RGB 缓冲上原地绘制标注
+        height, width = frame.shape[:2]
+        display_width, display_height = self._display_size(width, height)
+        if (display_width, display_height) != (width, height):
+            if self._resized is None or self._resized.shape[:2] != (display_height, display_width):
+                self._resized = np.empty((display_height, display_width, 3), dtype=np.uint8)
+            interpolation = cv2.INTER_AREA if display_width < width else cv2.INTER_LINEAR
+            cv2.resize(frame, (display_width, display_height), dst=self._resized, interpolation=interpolation)
+            frame = self._resized
+
+        rgb = self._buffer((display_height, display_width, 3))
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        if overlay is not None:
+            overlay(rgb, display_width / width)
+        return QImage(rgb.data, display_width, display_height, rgb.strides[0], QImage.Format.Format_RGB888)
@@ -0,0 +1,119 @@
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from overlay_renderer import result_arrays
+
+DEFAULT_MOTION_THRESHOLD = 0.01  # 变化像素占比超过 1% 视为画面有变化
+MOTION_PIXEL_DELTA = 25  # 灰度差超过该值的像素计为变化
+MOTION_SAMPLE_WIDTH = 96  # 运动检测在缩小到该宽度的灰度图上进行
+MOTION_MAX_INTERVAL = 2.0  # 即使画面静止，最长间隔该秒数也强制推理一次
+
+
+# ========================== 运动门控 ==========================
+class MotionGate:
+    # 低成本帧差：与“上一次推理时”的缩小灰度图比较（而非上一帧），缓慢累积的变化同样能触发推理
+
+    def __init__(self, threshold: float = DEFAULT_MOTION_THRESHOLD, pixel_delta: int = MOTION_PIXEL_DELTA,
+                 max_interval: float = MOTION_MAX_INTERVAL):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_interval = max_interval
+        self._reference: Optional[np.ndarray] = None
+        self._last_pass = 0.0
+
+    def reset(self):
+        self._reference = None
+
+    def _sample(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (MOTION_SAMPLE_WIDTH, max(1, int(height * MOTION_SAMPLE_WIDTH / max(width, 1))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)  # 抑制传感器噪声
+
+    def changed(self, frame: np.ndarray) -> bool:
+        sample = self._sample(frame)
+        now = time.perf_counter()
+        passed = (self._reference is None or self._reference.shape != sample.shape
+                  or now - self._last_pass >= self.max_interval)
+        if not passed:
+            diff = cv2.absdiff(sample, self._reference)
+            passed = np.count_nonzero(diff > self.pixel_delta) >= self.threshold * diff.size
+        if passed:
+            self._reference = sample
+            self._last_pass = now
+        return passed
+
+
+# ========================== 单路门控 ==========================
+class StreamGate:
+    # 每路摄像头一个：只推理 ROI 裁剪区域，画面无变化时跳过推理并复用上一次的检测结果。
+    # roi 为相对整帧的归一化 (x, y, w, h)，可在运行中由界面线程直接替换。
+    # detect_interval > 1 时（跟踪模式）至少隔这么多帧才推理一次，中间帧由跟踪器外推
+
+    def __init__(self, roi: Optional[Tuple[float, float, float, float]] = None, motion_threshold: float = 0.0,
+                 detect_interval: int = 1):
+        self.roi = roi
+        self.motion = MotionGate(motion_threshold) if motion_threshold > 0 else None
+        self.detect_interval = max(1, detect_interval)
+        self.frames = 0
+        self.skipped = 0
+        self.last = (np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32))
+        self._roi_in_use = roi
+        self._offset = (0, 0)
+        self._waited = self.detect_interval - 1  # 距上一次推理的帧数，第一帧总是推理
+
+    @property
+    def skip_ratio(self) -> float:
+        return self.skipped / self.frames if self.frames else 0.0
+
+    @property
+    def area_ratio(self) -> float:
+        roi = self.roi
+        return roi[2] * roi[3] if roi else 1.0
+
+    def crop(self, frame: np.ndarray, roi: Optional[Tuple[float, float, float, float]]) -> Tuple[np.ndarray, Tuple[int, int]]:
+        if not roi:
+            return frame, (0, 0)
+        height, width = frame.shape[:2]
+        x1, y1 = int(roi[0] * width), int(roi[1] * height)
+        x2, y2 = max(x1 + 1, int((roi[0] + roi[2]) * width)), max(y1 + 1, int((roi[1] + roi[3]) * height))
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def prepare(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        # 返回需要推理的图像（ROI 裁剪）；画面未变化时返回 None
+        self.frames += 1
+        roi = self.roi
+        if roi != self._roi_in_use:
+            # ROI 变化后旧结果与参考帧都不再适用
+            self._roi_in_use = roi
+            self.last = (np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32))
+            self._waited = self.detect_interval - 1
+            if self.motion is not None:
+                self.motion.reset()
+        self._waited += 1
+        if self._waited < self.detect_interval:
+            self.skipped += 1
+            return None
+        image, offset = self.crop(frame, roi)
+        if self.motion is not None and not self.motion.changed(image):
+            self.skipped += 1
+            return None
+        self._offset = offset
+        self._waited = 0
+        return image
+
+    def resolve(self, result) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 把 ROI 内的检测结果换算回整帧坐标并记住；result 为 None（已跳过）时沿用上一次结果
+        if result is None:
+            return self.last
+        xyxy, conf, cls = result_arrays(result)
+        if len(conf) and self._offset != (0, 0):
+            x, y = self._offset
+            xyxy = xyxy + np.array([x, y, x, y], dtype=np.float32)
+        self.last = (xyxy, conf, cls)
+        return self.last
@@ -0,0 +1,49 @@
+import time
+from typing import Optional
+
+MAX_SOURCE_FPS = 240.0  # 超过该值的帧率多半是容器信息有误，按未知处理
+
+
+# ========================== 帧调度器 ==========================
+class FrameScheduler:
+    # 替代固定的 time.sleep：第 i 帧应在 start + i / fps 时刻显示。
+    # 处理得快就等到该时刻再出帧；落后超过 max_lag 的帧直接丢弃，不再越积越多。
+    # target_fps <= 0 表示“尽可能快”，用于离线分析，从不等待也从不丢帧。
+
+    def __init__(self, target_fps: float = 0.0, max_lag: Optional[float] = None):
+        if target_fps > MAX_SOURCE_FPS:
+            target_fps = 0.0
+        self.interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.max_lag = max_lag if max_lag is not None else 2 * self.interval
+        self.dropped = 0
+        self._start = None
+
+    @property
+    def realtime(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def deadline(self, index: int) -> float:
+        if self._start is None:
+            self.start()
+        return self._start + index * self.interval
+
+    def is_late(self, index: int) -> bool:
+        # 由推理阶段调用：已经赶不上显示时刻的帧不再推理
+        if not self.realtime:
+            return False
+        late = time.perf_counter() - self.deadline(index) > self.max_lag
+        if late:
+            self.dropped += 1
+        return late
+
+    def wait(self, index: int):
+        # 由显示阶段调用：提前完成的帧等到其显示时刻
+        if not self.realtime:
+            return
+        delay = self.deadline(index) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
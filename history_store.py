@@ -0,0 +1,180 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+HISTORY_DB_PATH = os.path.join('runs', 'history.db')
+HISTORY_COLUMNS = ["id", "ts", "kind", "source", "frame", "label", "confidence", "x1", "y1", "x2", "y2"]
+_STOP = object()
+
+# 单列索引的条目按 rowid 排序，等值过滤后 ORDER BY id DESC LIMIT 可以直接沿索引取到最新的一页，无需排序
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    frame INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS idx_detections_kind ON detections (kind);
+CREATE INDEX IF NOT EXISTS idx_detections_source ON detections (source);
+CREATE INDEX IF NOT EXISTS idx_detections_label ON detections (label);
+CREATE INDEX IF NOT EXISTS idx_detections_confidence ON detections (confidence);
+"""
+
+
+# ========================== 查询条件 ==========================
+class HistoryFilter:
+    # 历史查询条件；各项为 None 表示不限
+
+    def __init__(self, since: Optional[float] = None, until: Optional[float] = None, kind: Optional[str] = None,
+                 source: Optional[str] = None, label: Optional[str] = None, min_conf: Optional[float] = None):
+        self.since = since
+        self.until = until
+        self.kind = kind
+        self.source = source  # 子串匹配
+        self.label = label
+        self.min_conf = min_conf
+
+    def where(self) -> Tuple[str, list]:
+        clauses, params = [], []
+        if self.since is not None:
+            clauses.append("ts >= ?")
+            params.append(self.since)
+        if self.until is not None:
+            clauses.append("ts < ?")
+            params.append(self.until)
+        if self.kind:
+            clauses.append("kind = ?")
+            params.append(self.kind)
+        if self.source:
+            clauses.append("source LIKE ?")
+            params.append(f"%{self.source}%")
+        if self.label:
+            clauses.append("label = ?")
+            params.append(self.label)
+        if self.min_conf:
+            clauses.append("confidence >= ?")
+            params.append(self.min_conf)
+        return " AND ".join(clauses), params
+
+
+# ========================== 历史记录库 ==========================
+class HistoryStore:
+    # 本地 SQLite 检测历史：图片、视频、摄像头的每个检测框一行。
+    # 写入只在调用方线程入队，由后台线程按批次在单个事务中提交；查询使用各线程自己的只读连接
+
+    def __init__(self, path: str = HISTORY_DB_PATH, flush_rows: int = 2000, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")  # 写入时查询不被阻塞
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # ---------- 写入 ----------
+    def record(self, kind: str, source: str, frame: int, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray,
+               names: Dict[int, str], timestamp: Optional[float] = None):
+        if len(conf) == 0:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(timestamp, kind, source, frame, names.get(int(c), str(c)), round(float(p), 4),
+                 *(round(float(v), 1) for v in box))
+                for box, p, c in zip(xyxy.tolist(), conf.tolist(), cls.tolist())]
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(rows)
+
+    def flush(self):
+        # 等待已入队的记录全部提交
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        pending: List[tuple] = []
+        last_flush = time.perf_counter()
+        done = False
+        try:
+            while not done:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    done = True
+                elif item is not None:
+                    pending.extend(item)
+                now = time.perf_counter()
+                if pending and (done or len(pending) >= self.flush_rows or now - last_flush >= self.flush_interval):
+                    try:
+                        with connection:
+                            connection.executemany(
+                                "INSERT INTO detections (ts, kind, source, frame, label, confidence, x1, y1, x2, y2) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", pending)
+                    except sqlite3.Error as e:
+                        print(f"Error: Could not write detection history: {e}")
+                    pending, last_flush = [], now
+        finally:
+            connection.execute("PRAGMA optimize")  # 更新查询规划统计
+            connection.close()
+
+    # ---------- 查询 ----------
+    def count(self, history_filter: HistoryFilter) -> int:
+        where, params = history_filter.where()
+        sql = f"SELECT COUNT(*) FROM detections{' WHERE ' + where if where else ''}"
+        return self._reader().execute(sql, params).fetchone()[0]
+
+    def fetch(self, history_filter: HistoryFilter, limit: int = 500, before_id: Optional[int] = None) -> List[tuple]:
+        # 按 id 倒序（即最新在前）分页；before_id 为上一页最后一行的 id，键集翻页，深翻页同样只走索引
+        where, params = history_filter.where()
+        if before_id is not None:
+            where = f"{where} AND id < ?" if where else "id < ?"
+            params = params + [before_id]
+        sql = (f"SELECT {', '.join(HISTORY_COLUMNS)} FROM detections{' WHERE ' + where if where else ''} "
+               f"ORDER BY id DESC LIMIT ?")
+        return self._reader().execute(sql, params + [limit]).fetchall()
+
+    def labels(self) -> List[str]:
+        # 沿 label 索引逐个跳到下一个不同的类别，耗时只与类别数有关，而不是像 DISTINCT 那样扫描整个索引
+        sql = """
+            WITH RECURSIVE labels(label) AS (
+                SELECT MIN(label) FROM detections
+                UNION ALL
+                SELECT (SELECT MIN(label) FROM detections WHERE label > labels.label) FROM labels
+                WHERE labels.label IS NOT NULL
+            )
+            SELECT label FROM labels WHERE label IS NOT NULL
+        """
+        return [row[0] for row in self._reader().execute(sql)]
+
+
+history_store = HistoryStore()
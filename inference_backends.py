@@ -0,0 +1,274 @@
+import argparse
+import functools
+import glob
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from batch_detect import collect_images
+from detection_cache import model_checksum
+from detection_utils import box_iou
+from model_registry import DEFAULT_MODEL_PATH, SharedModel, load_model, registry
+from overlay_renderer import result_arrays
+
+# 可选推理后端：PyTorch 直接加载 best.pt；ONNX Runtime / OpenVINO 首次使用时导出，之后复用缓存的导出文件
+BACKENDS = {
+    'pytorch': "PyTorch",
+    'onnx': "ONNX Runtime",
+    'openvino': "OpenVINO",
+}
+EXPORT_DIR = os.path.join('models', 'exports')
+DEFAULT_IMGSZ = 640
+
+
+# ========================== 模型导出 ==========================
+def exported_path(weights: str, backend: str, imgsz: int, variant: str = '') -> str:
+    # 导出文件以权重摘要命名，权重更新后自动重新导出
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    name = f"{stem}-{model_checksum(weights)[:12]}-{imgsz}{'-' + variant if variant else ''}"
+    if backend == 'onnx':
+        return os.path.join(EXPORT_DIR, f"{name}.onnx")
+    return os.path.join(EXPORT_DIR, f"{name}_openvino_model")  # ultralytics 依据该后缀识别 OpenVINO 模型
+
+
+def export_model(weights: str, backend: str, imgsz: int = DEFAULT_IMGSZ, variant: str = '', **export_args) -> str:
+    # 返回可直接交给 YOLO() 加载的模型路径；已导出过则直接复用
+    if backend == 'pytorch':
+        return weights
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的推理后端: {backend}")
+    target = exported_path(weights, backend, imgsz, variant)
+    if os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+    # dynamic=True 保留批量维度可变，视频批处理与多路摄像头合并推理同样可用
+    export_args.setdefault('dynamic', True)
+    output = YOLO(weights, task='detect').export(format=backend, imgsz=imgsz, **export_args)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    shutil.move(str(output), target)
+    return target
+
+
+# ========================== 后端加载 ==========================
+_default_torch_threads: Optional[int] = None  # 第一次修改之前 PyTorch 的线程数，设回“自动”时恢复
+
+
+def torch_threads() -> Optional[int]:
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch.get_num_threads()
+
+
+def configure_threads(threads: int):
+    # 设置 PyTorch 的算子线程数；0 表示恢复运行时默认值。
+    # 不写 OMP_NUM_THREADS：运行时已经初始化后再改环境变量不起作用。ONNX Runtime 与 OpenVINO 各有自己的线程池，
+    # 分别由 apply_onnx_threads / apply_openvino_threads 在会话或编译参数中设置
+    global _default_torch_threads
+    current = torch_threads()
+    if current is None:
+        return
+    if _default_torch_threads is None:
+        _default_torch_threads = current
+    import torch
+    torch.set_num_threads(threads if threads > 0 else _default_torch_threads)
+
+
+def _runtime_backend(model: SharedModel):
+    # 新版 ultralytics 的 AutoBackend 把各运行时封装在 .backend 中，旧版直接挂在 AutoBackend 上
+    autobackend = model.model.predictor.model
+    return getattr(autobackend, 'backend', autobackend)
+
+
+def apply_onnx_threads(model: SharedModel, threads: int):
+    # ONNX Runtime 使用自己的线程池：在预热创建会话后，按指定线程数重建一次会话；0 表示按默认选项重建
+    threads = max(0, threads)
+    if threads == model.threads:
+        return
+    try:
+        import onnxruntime
+        backend = _runtime_backend(model)
+        session = backend.session
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        with model.lock:
+            backend.session = onnxruntime.InferenceSession(model.path, sess_options=options,
+                                                           providers=session.get_providers())
+        model.threads = threads
+    except (ImportError, AttributeError) as e:
+        print(f"Error: Could not apply ONNX Runtime thread count: {e}")
+
+
+def apply_openvino_threads(model: SharedModel, threads: int):
+    # OpenVINO 在编译模型时确定推理线程数：预热之后带上 INFERENCE_NUM_THREADS 在原设备上重新编译一次；
+    # 0 表示按 ultralytics 默认的编译参数重新编译
+    threads = max(0, threads)
+    if threads == model.threads:
+        return
+    try:
+        import openvino
+        backend = _runtime_backend(model)
+        device = backend.ov_compiled_model.get_property('EXECUTION_DEVICES')[0]
+        xml = model.path if model.path.endswith('.xml') else sorted(glob.glob(os.path.join(model.path, '*.xml')))[0]
+        core = openvino.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads > 0:
+            config["INFERENCE_NUM_THREADS"] = threads
+        with model.lock:
+            backend.ov_compiled_model = core.compile_model(core.read_model(xml), device_name=device, config=config)
+            if hasattr(backend, 'compile_model'):  # 按输入尺寸重新编译时沿用同样的线程数
+                backend.compile_model = functools.partial(core.compile_model, device_name=device, config=config)
+        model.threads = threads
+    except (ImportError, AttributeError, IndexError, RuntimeError) as e:
+        print(f"Error: Could not apply OpenVINO thread count: {e}")
+
+
+def apply_runtime_threads(model: SharedModel, backend: str, threads: int):
+    if backend == 'onnx':
+        apply_onnx_threads(model, threads)
+    elif backend == 'openvino':
+        apply_openvino_threads(model, threads)
+
+
+def load_backend(weights: str = DEFAULT_MODEL_PATH, backend: str = 'pytorch', imgsz: int = DEFAULT_IMGSZ,
+                 threads: int = 0, warmup: bool = True) -> SharedModel:
+    configure_threads(threads)
+    path = export_model(weights, backend, imgsz)
+    # 运行时的线程数只能在会话创建之后调整，需要先预热一次让 ultralytics 建立会话
+    model = registry.get(path, warmup=warmup or (threads > 0 and backend != 'pytorch'), imgsz=imgsz)
+    apply_runtime_threads(model, backend, threads)
+    return model
+
+
+# ========================== 后端对比 ==========================
+def map50(predictions: List[tuple], references: List[tuple], iou_threshold: float = 0.5) -> float:
+    # 以参考后端 (PyTorch) 的检测结果作为伪真值，计算 mAP@0.5；predictions/references 为逐图 (xyxy, conf, cls)
+    classes = set()
+    for _, _, cls in references:
+        classes.update(cls.tolist())
+    if not classes:
+        return 1.0 if all(len(conf) == 0 for _, conf, _ in predictions) else 0.0
+
+    aps = []
+    for class_id in classes:
+        scores, matched, total = [], [], 0
+        for (pred_xyxy, pred_conf, pred_cls), (ref_xyxy, _, ref_cls) in zip(predictions, references):
+            refs = ref_xyxy[ref_cls == class_id]
+            preds = pred_cls == class_id
+            boxes, confs = pred_xyxy[preds], pred_conf[preds]
+            total += len(refs)
+            used = np.zeros(len(refs), dtype=bool)
+            ious = box_iou(boxes, refs)
+            for i in np.argsort(-confs):
+                hit = False
+                if len(refs):
+                    candidates = np.where(~used & (ious[i] >= iou_threshold))[0]
+                    if len(candidates):
+                        used[candidates[np.argmax(ious[i, candidates])]] = True
+                        hit = True
+                scores.append(confs[i])
+                matched.append(hit)
+        if total == 0:
+            continue
+        order = np.argsort(-np.array(scores))
+        tp = np.cumsum(np.array(matched, dtype=float)[order])
+        fp = np.cumsum(1.0 - np.array(matched, dtype=float)[order])
+        recall = np.concatenate(([0.0], tp / total, [1.0]))
+        precision = np.concatenate(([1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]))
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        aps.append(float(np.sum((recall[1:] - recall[:-1]) * precision[1:])))
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def compare_backends(images: List[str], weights: str = DEFAULT_MODEL_PATH, backends: Optional[List[str]] = None,
+                     imgsz: int = DEFAULT_IMGSZ, threads: int = 0, conf: float = 0.25, repeats: int = 1) -> Dict[str, dict]:
+    # 在样本图片上比较各后端的单张延迟与相对 PyTorch 的 mAP@0.5 漂移
+    backends = backends or list(BACKENDS)
+    frames = [cv2.imread(path) for path in images]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise ValueError("样本目录中没有可读取的图片")
+
+    # 各后端使用不经过注册表的独立实例，重建会话不会影响界面正在使用的模型；PyTorch 线程数是进程级设置，结束后恢复
+    outputs, report = {}, {}
+    previous_threads = torch_threads()
+    try:
+        for backend in ['pytorch'] + [b for b in backends if b != 'pytorch']:
+            outputs[backend], report[backend] = _measure_backend(frames, weights, backend, imgsz, threads, conf,
+                                                                 repeats, outputs.get('pytorch'))
+    finally:
+        if previous_threads is not None:
+            import torch
+            torch.set_num_threads(previous_threads)
+    return {backend: report[backend] for backend in backends if backend in report}
+
+
+def _measure_backend(frames: List[np.ndarray], weights: str, backend: str, imgsz: int, threads: int, conf: float,
+                     repeats: int, reference: Optional[List[tuple]]) -> Tuple[List[tuple], dict]:
+    if threads > 0:
+        configure_threads(threads)
+    model = load_model(export_model(weights, backend, imgsz), imgsz, warmup=True)
+    apply_runtime_threads(model, backend, threads)
+    latencies, predictions = [], []
+    for frame in frames:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = model(frame, conf=conf)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(result_arrays(result))
+    map50_vs_pytorch = round(map50(predictions, predictions if reference is None else reference), 4)
+    return predictions, {
+        "latency_ms_mean": round(float(np.mean(latencies)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "map50_vs_pytorch": map50_vs_pytorch,
+        "map50_drift": round(1.0 - map50_vs_pytorch, 4),
+    }
+
+
+def format_report(report: Dict[str, dict]) -> str:
+    lines = []
+    for backend, stats in report.items():
+        lines.append(f"{BACKENDS.get(backend, backend)}: 平均 {stats['latency_ms_mean']} ms, "
+                     f"P95 {stats['latency_ms_p95']} ms, mAP@0.5 漂移 {stats['map50_drift']:.2%}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="推理后端导出与对比")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出并缓存指定后端的模型")
+    export_parser.add_argument("backend", choices=[b for b in BACKENDS if b != 'pytorch'])
+
+    compare_parser = subparsers.add_parser("compare", help="在样本图片上对比各后端延迟与精度漂移")
+    compare_parser.add_argument("source", help="样本图片目录或通配符")
+    compare_parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    compare_parser.add_argument("--threads", type=int, default=0, help="推理线程数，0 表示自动")
+
+    for sub in (export_parser, compare_parser):
+        sub.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+        sub.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ, help="推理输入尺寸")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print(export_model(args.model, args.backend, args.imgsz))
+        return 0
+
+    images = collect_images(args.source)
+    if not images:
+        print(f"Error: No images found at {args.source}", file=sys.stderr)
+        return 1
+    print(format_report(compare_backends(images, args.model, args.backends, args.imgsz, args.threads)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from batch_detect import collect_images
+from detection_utils import box_iou
+from inference_backends import (DEFAULT_IMGSZ, EXPORT_DIR, apply_openvino_threads, configure_threads, export_model,
+                                exported_path)
+from model_registry import DEFAULT_MODEL_PATH, SharedModel, load_model, registry
+from overlay_renderer import result_arrays
+
+# 量化精度：FP32 即原始 PyTorch 模型；FP16/INT8 通过 OpenVINO 导出 (INT8 使用 NNCF 以校准图片做训练后量化)
+PRECISIONS = {
+    'fp32': "FP32",
+    'fp16': "FP16",
+    'int8': "INT8",
+}
+# 精度护栏：量化模型相对 FP32 检测结果的最低要求，未全部达到则拒绝启用
+MIN_MATCH_RATE = 0.95  # FP32 检测框中被量化模型以 IoU>=0.5 找回的比例
+MIN_MEAN_IOU = 0.85  # 匹配框的平均 IoU
+MIN_CLASS_AGREEMENT = 0.98  # 匹配框类别一致的比例
+
+
+# ========================== 量化导出 ==========================
+def quantized_path(weights: str, precision: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    return exported_path(weights, 'openvino', imgsz, precision)
+
+
+def report_path(model_path: str) -> str:
+    return f"{model_path.rstrip(os.sep)}.validation.json"
+
+
+def write_calibration_yaml(calib_dir: str, names: Dict[int, str]) -> str:
+    # ultralytics 通过数据集 yaml 获取校准图片；JSON 本身是合法的 YAML，无需额外依赖
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, 'calibration.yaml')
+    calib_dir = os.path.abspath(calib_dir)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"path": calib_dir, "train": calib_dir, "val": calib_dir,
+                   "names": {int(k): v for k, v in names.items()}}, f, ensure_ascii=False)
+    return path
+
+
+def quantize_model(weights: str, precision: str, calib_dir: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    if precision == 'fp32':
+        return weights
+    if precision == 'fp16':
+        return export_model(weights, 'openvino', imgsz, variant=precision, half=True)
+    if precision != 'int8':
+        raise ValueError(f"未知的量化精度: {precision}")
+    # 每次校准都重新量化，并删除旧的校验报告：新模型必须重新通过护栏
+    target = quantized_path(weights, precision, imgsz)
+    if os.path.exists(report_path(target)):
+        os.remove(report_path(target))
+    shutil.rmtree(target, ignore_errors=True)
+    registry.release(target, imgsz)
+    # 只为读取类别名加载一个临时实例，不放进注册表常驻
+    data = write_calibration_yaml(calib_dir, load_model(weights, imgsz).names)
+    return export_model(weights, 'openvino', imgsz, variant=precision, int8=True, data=data)
+
+
+# ========================== 精度校验 ==========================
+def match_detections(reference: Tuple[np.ndarray, np.ndarray, np.ndarray], candidate: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                     iou_threshold: float = 0.5) -> List[Tuple[float, bool]]:
+    # 不区分类别按 IoU 从大到小贪心一对一匹配，返回每个匹配对的 (IoU, 类别是否一致)
+    ious = box_iou(reference[0], candidate[0])
+    pairs = []
+    if ious.size == 0:
+        return pairs
+    used_ref = np.zeros(ious.shape[0], dtype=bool)
+    used_cand = np.zeros(ious.shape[1], dtype=bool)
+    for flat in np.argsort(-ious, axis=None):
+        i, j = np.unravel_index(flat, ious.shape)
+        if ious[i, j] < iou_threshold:
+            break
+        if used_ref[i] or used_cand[j]:
+            continue
+        used_ref[i] = used_cand[j] = True
+        pairs.append((float(ious[i, j]), bool(reference[2][i] == candidate[2][j])))
+    return pairs
+
+
+def _run(model: SharedModel, frames: List[np.ndarray], conf: float) -> Tuple[List[tuple], List[float]]:
+    outputs, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model(frame, conf=conf)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(result_arrays(result))
+    return outputs, latencies
+
+
+def validate_quantized(images: List[str], weights: str, model_path: str, imgsz: int = DEFAULT_IMGSZ,
+                       conf: float = 0.25) -> dict:
+    # 以 FP32 模型的检测结果为参照，统计量化模型的找回率、平均 IoU、类别一致率与加速比，并写入校验报告
+    frames = [cv2.imread(path) for path in images]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise ValueError("校验目录中没有可读取的图片")
+
+    # 参照与候选都用不经过注册表的临时实例，校验结束即回收，不与界面当前使用的后端一起常驻内存
+    reference, reference_ms = _run(load_model(weights, imgsz, warmup=True), frames, conf)
+    candidate, candidate_ms = _run(load_model(model_path, imgsz, warmup=True), frames, conf)
+
+    pairs, total, extra = [], 0, 0
+    for ref, cand in zip(reference, candidate):
+        matched = match_detections(ref, cand)
+        pairs.extend(matched)
+        total += len(ref[1])
+        extra += len(cand[1]) - len(matched)
+
+    report = {
+        "model": model_path,
+        "images": len(frames),
+        "reference_boxes": total,
+        "match_rate": round(len(pairs) / total, 4) if total else 1.0,
+        "mean_iou": round(float(np.mean([iou for iou, _ in pairs])), 4) if pairs else (1.0 if total == 0 else 0.0),
+        "class_agreement": round(float(np.mean([same for _, same in pairs])), 4) if pairs else (1.0 if total == 0 else 0.0),
+        "extra_boxes": extra,
+        "fp32_ms": round(float(np.mean(reference_ms)), 2),
+        "quantized_ms": round(float(np.mean(candidate_ms)), 2),
+    }
+    report["speedup"] = round(report["fp32_ms"] / report["quantized_ms"], 2) if report["quantized_ms"] > 0 else 0.0
+    report["passed"] = (report["match_rate"] >= MIN_MATCH_RATE and report["mean_iou"] >= MIN_MEAN_IOU
+                        and report["class_agreement"] >= MIN_CLASS_AGREEMENT)
+    with open(report_path(model_path), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def load_report(model_path: str) -> Optional[dict]:
+    try:
+        with open(report_path(model_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_validation(report: dict) -> str:
+    return (f"{'通过' if report['passed'] else '未通过'}精度校验 ({report['images']} 张图片, "
+            f"{report['reference_boxes']} 个参照框)\n"
+            f"找回率 {report['match_rate']:.2%} (要求 ≥ {MIN_MATCH_RATE:.0%}), "
+            f"平均 IoU {report['mean_iou']:.3f} (要求 ≥ {MIN_MEAN_IOU}), "
+            f"类别一致 {report['class_agreement']:.2%} (要求 ≥ {MIN_CLASS_AGREEMENT:.0%}), "
+            f"多出 {report['extra_boxes']} 个框\n"
+            f"FP32 {report['fp32_ms']} ms → 量化 {report['quantized_ms']} ms, 加速 {report['speedup']}x")
+
+
+# ========================== 量化模型加载 ==========================
+def load_quantized(weights: str = DEFAULT_MODEL_PATH, precision: str = 'int8', imgsz: int = DEFAULT_IMGSZ,
+                   threads: int = 0, warmup: bool = True) -> SharedModel:
+    # 只加载已通过精度护栏的量化模型；FP32 直接返回原始模型
+    configure_threads(threads)
+    if precision == 'fp32':
+        return registry.get(weights, warmup=warmup, imgsz=imgsz)
+    path = quantized_path(weights, precision, imgsz)
+    report = load_report(path)
+    if not os.path.exists(path) or report is None:
+        raise RuntimeError(f"{PRECISIONS[precision]} 模型尚未量化校验，请先在设置中执行量化校准")
+    if not report.get("passed"):
+        raise RuntimeError(f"{PRECISIONS[precision]} 模型未通过精度校验:\n{format_validation(report)}")
+    model = registry.get(path, warmup=warmup or threads > 0, imgsz=imgsz)
+    apply_openvino_threads(model, threads)  # 量化模型固定走 OpenVINO
+    return model
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="量化模型导出与精度校验")
+    parser.add_argument("calib", help="校准图片目录")
+    parser.add_argument("--precision", choices=[p for p in PRECISIONS if p != 'fp32'], default='int8')
+    parser.add_argument("--val", default=None, help="单独的校验图片目录，默认使用校准目录")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ, help="推理输入尺寸")
+    parser.add_argument("--conf", type=float, default=0.25, help="校验时使用的置信度阈值")
+    args = parser.parse_args(argv)
+
+    images = collect_images(args.val or args.calib)
+    if not images:
+        print(f"Error: No images found at {args.val or args.calib}", file=sys.stderr)
+        return 1
+    path = quantize_model(args.model, args.precision, args.calib, args.imgsz)
+    report = validate_quantized(images, args.model, path, args.imgsz, args.conf)
+    print(format_validation(report))
+    return 0 if report["passed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+from ultralytics import YOLO
+
+DEFAULT_MODEL_PATH = 'models/best.pt'  # 确保模型文件路径正确
+
+
+# ========================== 共享模型 ==========================
+class SharedModel:
+    # 对 YOLO 实例的轻量包装：推理调用串行化，多个检测线程可以安全地共用同一个模型
+
+    def __init__(self, model, path: str, imgsz: Optional[int] = None):
+        self.model = model
+        self.path = path
+        self.imgsz = imgsz  # 推理输入尺寸，None 表示使用模型默认值
+        self.threads = 0  # 推理运行时（ONNX Runtime / OpenVINO）的线程数，0 表示运行时默认值
+        self.lock = threading.Lock()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def __call__(self, source, **kwargs):
+        kwargs.setdefault('verbose', False)  # 逐帧打印日志本身就很耗时
+        if self.imgsz:
+            kwargs.setdefault('imgsz', self.imgsz)
+        with self.lock:
+            return self.model(source, **kwargs)
+
+    def warmup(self, imgsz: Optional[int] = None):
+        # 用一张空白图跑一次推理，完成权重搬运与算子初始化，避免第一帧明显卡顿
+        imgsz = imgsz or self.imgsz or 640
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        self(dummy)
+
+
+def load_model(path: str = DEFAULT_MODEL_PATH, imgsz: Optional[int] = None, warmup: bool = False) -> SharedModel:
+    # 不经过注册表的独立实例：后端对比、量化校验等一次性任务使用，用完即回收，不影响界面正在使用的模型
+    model = SharedModel(YOLO(path, task='detect'), path, imgsz)
+    if warmup:
+        model.warmup()
+    return model
+
+
+# ========================== 模型注册表 ==========================
+class ModelRegistry:
+    # 进程内唯一的模型注册表：每个 (模型文件, 输入尺寸) 只加载一次，所有界面借用同一个实例
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, SharedModel] = {}
+        self._loading: Dict[str, threading.Event] = {}
+        self._errors: Dict[str, Exception] = {}
+
+    @staticmethod
+    def _key(path: str, imgsz: Optional[int]) -> str:
+        return f"{path}@{imgsz}" if imgsz else path
+
+    def get(self, path: str = DEFAULT_MODEL_PATH, warmup: bool = False, imgsz: Optional[int] = None) -> SharedModel:
+        # 阻塞式获取；若其他线程正在加载同一个模型，则等待其完成而不是重复加载
+        key = self._key(path, imgsz)
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+            event = self._loading.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._loading[key] = event
+                self._errors.pop(key, None)
+
+        if not owner:
+            event.wait()
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+                raise self._errors[key]
+
+        try:
+            model = load_model(path, imgsz, warmup)
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = e
+                del self._loading[key]
+            event.set()
+            raise
+
+        with self._lock:
+            self._models[key] = model
+            del self._loading[key]
+        event.set()
+        return model
+
+    def release(self, path: str = DEFAULT_MODEL_PATH, imgsz: Optional[int] = None):
+        # 不再使用的模型移出注册表；仍在借用它的线程用完后即被回收
+        with self._lock:
+            self._models.pop(self._key(path, imgsz), None)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,151 @@
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 按类别循环使用的框颜色 (RGB)，与 ultralytics 默认配色相近
+PALETTE = np.array([
+    (255, 56, 56), (255, 157, 151), (255, 112, 31), (255, 178, 29), (207, 210, 49),
+    (72, 249, 10), (146, 204, 23), (61, 219, 134), (26, 147, 52), (0, 212, 187),
+    (44, 153, 168), (0, 194, 255), (52, 69, 147), (100, 115, 255), (0, 24, 236),
+    (132, 56, 255), (82, 0, 133), (203, 56, 255), (255, 149, 200), (255, 55, 199),
+], dtype=np.uint8)
+MAX_SPRITES = 4096  # 标签小图缓存上限
+
+
+def result_arrays(result) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 一次性把 boxes 张量取到 CPU：返回 (xyxy Nx4, conf N, cls N)；检测服务返回的结果已是 NumPy 数组
+    boxes = result.boxes
+    if boxes is None or len(boxes.conf) == 0:
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32)
+    return (_numpy(boxes.xyxy).astype(np.float32),
+            _numpy(boxes.conf).astype(np.float32),
+            _numpy(boxes.cls).astype(np.int32))
+
+
+def _numpy(values) -> np.ndarray:
+    return values if isinstance(values, np.ndarray) else values.cpu().numpy()
+
+
+# ========================== 标注渲染器 ==========================
+class OverlayRenderer:
+    # 直接根据 boxes/conf/cls 数组在显示尺寸的 RGB 帧上绘制检测框，替代逐帧 results[0].plot()：
+    # 坐标缩放与裁剪一次性向量化完成，标签文字按 (类别, 置信度) 预渲染为小图缓存，绘制时直接贴图。
+    # 跟踪模式下传入 ids，标签前加上缺陷编号。
+
+    def __init__(self, names: Dict[int, str], line_width: int = 2, font_scale: float = 0.5, skip_empty: bool = True):
+        self.names = names
+        self.line_width = line_width
+        self.font_scale = font_scale
+        self.skip_empty = skip_empty  # 无检测结果时不做任何标注工作
+        self._sprites: Dict[Tuple[int, int, Optional[int]], np.ndarray] = {}
+
+    def color(self, class_id: int) -> Tuple[int, int, int]:
+        return tuple(int(c) for c in PALETTE[class_id % len(PALETTE)])
+
+    def _sprite(self, class_id: int, confidence: float, track_id: Optional[int] = None) -> np.ndarray:
+        key = (class_id, int(round(confidence * 100)), track_id)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            if len(self._sprites) >= MAX_SPRITES:
+                self._sprites.clear()  # 缺陷编号不断增长，长时间跟踪时限制缓存大小
+            text = f"{self.names.get(class_id, class_id)} {key[1] / 100:.2f}"
+            if track_id is not None:
+                text = f"#{track_id} {text}"
+            (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+            sprite = np.empty((text_height + baseline + 4, text_width + 4, 3), dtype=np.uint8)
+            sprite[:] = self.color(class_id)
+            cv2.putText(sprite, text, (2, text_height + 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        self.font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+            self._sprites[key] = sprite
+        return sprite
+
+    def draw(self, image: np.ndarray, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, scale: float = 1.0,
+             ids: Optional[np.ndarray] = None):
+        # image 为显示尺寸的 RGB 帧（原地绘制），xyxy 为原图坐标，scale = 显示宽度 / 原图宽度
+        if len(conf) == 0:
+            return image
+        height, width = image.shape[:2]
+        boxes = np.rint(xyxy * scale).astype(np.int32)
+        np.clip(boxes[:, 0::2], 0, width - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, height - 1, out=boxes[:, 1::2])
+        boxes = boxes.tolist()
+        track_ids = ids.tolist() if ids is not None else [None] * len(boxes)
+        for (x1, y1, x2, y2), confidence, class_id, track_id in zip(boxes, conf.tolist(), cls.tolist(), track_ids):
+            cv2.rectangle(image, (x1, y1), (x2, y2), self.color(class_id), self.line_width)
+            sprite = self._sprite(class_id, confidence, track_id)
+            sprite_height, sprite_width = sprite.shape[:2]
+            top = y1 - sprite_height if y1 >= sprite_height else y1  # 放不下时贴到框内
+            visible_height = min(sprite_height, height - top)
+            visible_width = min(sprite_width, width - x1)
+            if visible_height > 0 and visible_width > 0:
+                image[top:top + visible_height, x1:x1 + visible_width] = sprite[:visible_height, :visible_width]
+        return image
+
+    def overlay(self, result):
+        # 返回供 DisplayFrameConverter.convert 使用的绘制回调；skip_empty 且无检测时返回 None
+        return self.overlay_arrays(*result_arrays(result))
+
+    def overlay_arrays(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, ids: Optional[np.ndarray] = None):
+        if self.skip_empty and len(conf) == 0:
+            return None
+        return lambda image, scale: self.draw(image, xyxy, conf, cls, scale, ids)
+
+    def render(self, frame_bgr: np.ndarray, result, display_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        # 单张图片用：缩放到 display_size (宽, 高) 以内后绘制，返回 BGR 图像
+        xyxy, conf, cls = result_arrays(result)
+        return self.render_arrays(frame_bgr, xyxy, conf, cls, display_size)
+
+    def render_arrays(self, frame_bgr: np.ndarray, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray,
+                      display_size: Optional[Tuple[int, int]] = None, scale: float = 1.0) -> np.ndarray:
+        # scale 为 frame_bgr 相对于检测坐标所在原图的比例（frame_bgr 本身已是缩小图时使用）
+        height, width = frame_bgr.shape[:2]
+        resize = 1.0
+        if display_size is not None:
+            resize = min(display_size[0] / width, display_size[1] / height, 1.0)
+        image = cv2.resize(frame_bgr, (max(1, int(width * resize)), max(1, int(height * resize))),
+                           interpolation=cv2.INTER_AREA) if resize < 1.0 else frame_bgr.copy()
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self.draw(rgb, xyxy, conf, cls, scale * resize)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+# ========================== 性能对比 ==========================
+def benchmark(result, display_size: Tuple[int, int] = (640, 480), iterations: int = 100) -> Dict[str, float]:
+    # 对比两条显示路径每帧的耗时 (ms)：
+    # plot: results[0].plot() 在原图上标注后再缩放；overlay: 先缩放原图再由 OverlayRenderer 绘制
+    frame = result.orig_img
+    height, width = frame.shape[:2]
+    scale = min(display_size[0] / width, display_size[1] / height)
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    renderer = OverlayRenderer(result.names)
+    xyxy, conf, cls = result_arrays(result)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        annotated = result.plot()
+        cv2.cvtColor(cv2.resize(annotated, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+    plot_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        rgb = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        renderer.draw(rgb, xyxy, conf, cls, scale)
+    overlay_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    return {"plot_ms": plot_ms, "overlay_ms": overlay_ms, "speedup": plot_ms / overlay_ms if overlay_ms > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    # 用法: python overlay_renderer.py 图片路径 [模型路径]
+    from model_registry import DEFAULT_MODEL_PATH, registry
+
+    if len(sys.argv) < 2:
+        print("用法: python overlay_renderer.py 图片路径 [模型路径]")
+        sys.exit(1)
+    model = registry.get(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH)
+    stats = benchmark(model(sys.argv[1])[0])
+    print(f"plot(): {stats['plot_ms']:.2f} ms/帧    OverlayRenderer: {stats['overlay_ms']:.2f} ms/帧    "
+          f"加速 {stats['speedup']:.1f}x")
@@ -0,0 +1,373 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+
+from detection_log import LOG_COLUMNS, RUNS_DIR, has_parquet, parquet_schema
+from model_registry import DEFAULT_MODEL_PATH
+from overlay_renderer import result_arrays
+
+# 长视频离线并行分析：python parallel_video.py 视频文件 -j 4
+# 按关键帧把视频切成若干段，多个工作进程各自解码、各自推理，完成后按帧序合并检测记录。
+# 每段完成即落盘，任务目录中保留 job.json 检查点，中断后以相同参数重新运行即从未完成的段继续。
+
+DEFAULT_SEGMENT_SECONDS = 60.0  # 目标段长；段越短负载越均衡，但每段都要重新定位与预热
+JOB_FILE = 'job.json'
+SEGMENTS_DIR = 'segments'
+
+_worker_model = None
+_worker_options = {}
+_worker_batch_size = 1
+
+
+# ========================== 分段规划 ==========================
+def probe_video(path: str) -> Tuple[float, int]:
+    # 返回 (帧率, 总帧数)
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    if frames <= 0:
+        raise IOError(f"无法获取视频总帧数: {path}")
+    return fps, frames
+
+
+def probe_keyframes(path: str, fps: float) -> Optional[List[int]]:
+    # 用 ffprobe 只读取数据包头（不解码）得到关键帧的帧序号；没有 ffprobe 或读取失败时返回 None
+    if shutil.which('ffprobe') is None:
+        return None
+    # 同时取流的 start_time：起始 PTS 不为 0 的文件（如从直播流截取的录像）需要减去它，帧序号才与解码顺序一致
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=start_time:packet=pts_time,flags', '-of', 'csv', path]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True, timeout=600).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    start_time = 0.0
+    packets = []
+    for line in output.splitlines():
+        section, _, fields = line.partition(',')
+        if section == 'stream' and fields not in ('', 'N/A'):
+            start_time = float(fields)
+        elif section == 'packet':
+            pts, _, flags = fields.partition(',')
+            if 'K' in flags and pts not in ('', 'N/A'):
+                packets.append(float(pts))
+    keyframes = {int(round((pts - start_time) * fps)) for pts in packets}
+    return sorted(keyframes) or None
+
+
+def plan_segments(total_frames: int, fps: float, keyframes: Optional[List[int]] = None,
+                  segment_seconds: float = DEFAULT_SEGMENT_SECONDS) -> List[Tuple[int, int]]:
+    # 返回 [(起始帧, 结束帧)) 列表；有关键帧信息时每段都从关键帧开始，定位无需解码丢弃多余的帧
+    step = max(1, int(segment_seconds * fps))
+    if keyframes:
+        # 依次取距上一个切点至少一个段长的第一个关键帧，关键帧稀疏时段会变长，但不会切出过短的段
+        bounds = [0]
+        for keyframe in keyframes:
+            if bounds[-1] + step <= keyframe < total_frames:
+                bounds.append(keyframe)
+        bounds.append(total_frames)
+    else:
+        bounds = [0] + list(range(step, total_frames, step)) + [total_frames]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def job_id(video_path: str, model_path: str, conf: float, max_det: int, imgsz: Optional[int]) -> str:
+    # 同一视频、同一组检测参数得到同一个任务目录，重新运行即可续跑
+    stat = os.stat(video_path)
+    key = json.dumps([os.path.abspath(video_path), stat.st_size, int(stat.st_mtime), model_path, conf, max_det, imgsz])
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return f"{stem}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]}"
+
+
+# ========================== 工作进程 ==========================
+def _init_worker(model_path: str, imgsz: Optional[int], conf: float, max_det: int, batch_size: int, threads: int):
+    # 每个工作进程持有自己的模型实例，并限制算子线程数，避免多个进程相互抢占 CPU
+    global _worker_model, _worker_options, _worker_batch_size
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    cv2.setNumThreads(1)  # 解码并行度来自多进程本身
+    from model_registry import registry
+    _worker_model = registry.get(model_path, imgsz=imgsz)
+    _worker_options = {"conf": conf, "max_det": max_det}
+    _worker_batch_size = batch_size
+
+
+def _segment_rows(frame_indices: List[int], timestamps: List[float], frames: list, names: Dict[int, str]) -> List[dict]:
+    source = frames[0] if len(frames) == 1 else frames
+    rows = []
+    for frame_index, timestamp_ms, result in zip(frame_indices, timestamps, _worker_model(source, **_worker_options)):
+        xyxy, conf, cls = result_arrays(result)
+        for box, p, c in zip(xyxy.tolist(), conf.tolist(), cls.tolist()):
+            rows.append(dict(zip(LOG_COLUMNS, [frame_index, round(timestamp_ms, 1), c, names.get(int(c), str(c)),
+                                               round(p, 4), *(round(v, 1) for v in box)])))
+    return rows
+
+
+def _process_segment(video_path: str, fps: float, index: int, start: int, end: int, output: str) -> dict:
+    began = time.perf_counter()
+    names = dict(_worker_model.names)
+    cap = cv2.VideoCapture(video_path)
+    processed = detections = 0
+    error = None
+    temp = f"{output}.part"
+    try:
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频: {video_path}")
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        with open(temp, 'w', encoding='utf-8') as f:
+            batch, indices = [], []
+            for frame_index in range(start, end):
+                success, frame = cap.read()
+                if not success:
+                    break
+                batch.append(frame)
+                indices.append(frame_index)
+                if len(batch) >= _worker_batch_size:
+                    # 时间戳按帧序计算，不依赖各段解码器定位后的时间戳
+                    rows = _segment_rows(indices, [i * 1000 / fps for i in indices], batch, names)
+                    f.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+                    processed += len(batch)
+                    detections += len(rows)
+                    batch, indices = [], []
+            if batch:  # 最后不满一批的帧
+                rows = _segment_rows(indices, [i * 1000 / fps for i in indices], batch, names)
+                f.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+                processed += len(batch)
+                detections += len(rows)
+        os.replace(temp, output)  # 改名即完成标记：中途中断的段只留下 .part 文件，续跑时重做
+    except Exception as e:
+        error = str(e)
+    finally:
+        cap.release()
+    return {"index": index, "frames": processed, "detections": detections,
+            "seconds": round(time.perf_counter() - began, 2), "error": error}
+
+
+# ========================== 并行分析任务 ==========================
+class ParallelVideoJob:
+    # 一个视频 + 一组检测参数对应 runs/video 下的一个任务目录：
+    #   job.json           检查点（参数、分段、已完成段的统计）
+    #   segments/NNNNN.jsonl  每段的检测记录，写完后才改名生效
+    #   detections.{parquet|jsonl}  全部完成后按帧序合并的结果，列与逐帧检测记录相同
+
+    def __init__(self, video_path: str, model_path: str = DEFAULT_MODEL_PATH, conf: float = 0.25, max_det: int = 1000,
+                 imgsz: Optional[int] = None, batch_size: int = 1, workers: Optional[int] = None,
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS, runs_dir: str = RUNS_DIR):
+        self.video_path = video_path
+        self.model_path = model_path
+        self.conf = conf
+        self.max_det = max_det
+        self.imgsz = imgsz
+        self.batch_size = max(1, batch_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.segment_seconds = segment_seconds
+        self.job_dir = os.path.join(runs_dir, job_id(video_path, model_path, conf, max_det, imgsz))
+        self.state: dict = {}
+        self._cancel = threading.Event()
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(self.job_dir, f"detections.{'parquet' if has_parquet() else 'jsonl'}")
+
+    def segment_path(self, index: int) -> str:
+        return os.path.join(self.job_dir, SEGMENTS_DIR, f"{index:05d}.jsonl")
+
+    def cancel(self):
+        # 正在处理的段会继续跑完并保存，未开始的段留给下次续跑
+        self._cancel.set()
+
+    def _save_state(self):
+        temp = os.path.join(self.job_dir, f"{JOB_FILE}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp, os.path.join(self.job_dir, JOB_FILE))
+
+    def prepare(self, restart: bool = False) -> dict:
+        # 读取已有检查点，或探测关键帧并规划分段
+        path = os.path.join(self.job_dir, JOB_FILE)
+        if restart and os.path.isdir(self.job_dir):
+            shutil.rmtree(self.job_dir)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            # 记录为已完成但文件丢失的段重新处理
+            self.state["completed"] = {index: stats for index, stats in self.state["completed"].items()
+                                       if os.path.exists(self.segment_path(int(index)))}
+            return self.state
+
+        fps, total_frames = probe_video(self.video_path)
+        keyframes = probe_keyframes(self.video_path, fps)
+        segments = plan_segments(total_frames, fps, keyframes, self.segment_seconds)
+        os.makedirs(os.path.join(self.job_dir, SEGMENTS_DIR), exist_ok=True)
+        self.state = {
+            "video": os.path.abspath(self.video_path),
+            "model": self.model_path,
+            "conf": self.conf,
+            "max_det": self.max_det,
+            "imgsz": self.imgsz,
+            "fps": fps,
+            "total_frames": total_frames,
+            "keyframe_aligned": keyframes is not None,
+            "segments": segments,
+            "completed": {},  # 段序号(字符串) -> 该段统计
+            "created": time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self._save_state()
+        return self.state
+
+    def run(self, progress: Optional[Callable[[int, int], None]] = None, restart: bool = False) -> dict:
+        # progress(已完成段数, 总段数)；返回汇总统计，被取消时 summary["cancelled"] 为 True
+        state = self.prepare(restart)
+        segments = state["segments"]
+        completed = state["completed"]
+        pending = [index for index in range(len(segments)) if str(index) not in completed]
+        start = time.perf_counter()
+        processed = 0
+        errors: List[str] = []
+        if progress:
+            progress(len(completed), len(segments))
+
+        if pending and not self._cancel.is_set():
+            workers = min(self.workers, len(pending))
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn 启动的工作进程不继承界面进程中的线程与 Qt 状态
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(self.model_path, self.imgsz, self.conf, self.max_det,
+                                               self.batch_size, threads)) as pool:
+                running = set()
+                queued = iter(pending)
+                for index in queued:
+                    # 提交数限制在进程数的两倍，取消时不必等待一长串已排队的段
+                    running.add(pool.submit(_process_segment, self.video_path, state["fps"], index,
+                                            *segments[index], self.segment_path(index)))
+                    if len(running) >= workers * 2:
+                        break
+                while running:
+                    done, running = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stats = future.result()
+                        if stats["error"]:
+                            errors.append(f"第 {stats['index']} 段: {stats['error']}")
+                        else:
+                            completed[str(stats["index"])] = stats
+                            processed += stats["frames"]
+                            self._save_state()
+                        if progress:
+                            progress(len(completed), len(segments))
+                        if not self._cancel.is_set():
+                            index = next(queued, None)
+                            if index is not None:
+                                running.add(pool.submit(_process_segment, self.video_path, state["fps"], index,
+                                                        *segments[index], self.segment_path(index)))
+
+        finished = len(completed) == len(segments)
+        if finished and not os.path.exists(self.output_path):
+            self.merge()
+        return {
+            "job_dir": self.job_dir,
+            "output": self.output_path if finished else None,
+            "segments": len(segments),
+            "completed": len(completed),
+            "keyframe_aligned": state["keyframe_aligned"],
+            "frames": sum(stats["frames"] for stats in completed.values()),
+            "detections": sum(stats["detections"] for stats in completed.values()),
+            "processed": processed,  # 本次运行处理的帧数，续跑时不含之前已完成的段
+            "seconds": round(time.perf_counter() - start, 2),
+            "cancelled": self._cancel.is_set() and not finished,
+            "errors": errors,
+        }
+
+    def merge(self) -> str:
+        # 各段本身按帧序写入，按段序号依次拼接即得到完整的时间线
+        output = self.output_path
+        temp = f"{output}.part"
+        if output.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # 显式给出与 DetectionLogWriter 相同的列类型，而不是按每段的内容推断：各段类型一致，空结果也是同样的表结构
+            schema = parquet_schema()
+            writer = pq.ParquetWriter(temp, schema)
+            try:
+                for index in range(len(self.state["segments"])):
+                    with open(self.segment_path(index), 'r', encoding='utf-8') as f:
+                        rows = [json.loads(line) for line in f]
+                    if rows:
+                        writer.write_table(pa.Table.from_pylist(rows, schema=schema))  # 每段一个 row group
+            finally:
+                writer.close()
+        else:
+            with open(temp, 'wb') as out:
+                for index in range(len(self.state["segments"])):
+                    with open(self.segment_path(index), 'rb') as f:
+                        shutil.copyfileobj(f, out)
+        os.replace(temp, output)
+        return output
+
+
+def format_summary(summary: dict) -> str:
+    fps = summary["processed"] / summary["seconds"] if summary["seconds"] else 0.0
+    lines = [f"已完成 {summary['completed']}/{summary['segments']} 段"
+             f"（{'按关键帧切分' if summary['keyframe_aligned'] else '按固定时长切分'}），"
+             f"{summary['frames']} 帧，{summary['detections']} 个缺陷，本次耗时 {summary['seconds']} 秒，{fps:.1f} 帧/秒"]
+    if summary["cancelled"]:
+        lines.append(f"已中断，重新运行即可从检查点继续: {summary['job_dir']}")
+    if summary["output"]:
+        lines.append(f"结果已写入 {summary['output']}")
+    lines.extend(summary["errors"])
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="长视频并行离线检测（无界面，可中断续跑）")
+    parser.add_argument("video", help="视频文件")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--conf", type=float, default=0.25, help="置信度阈值")
+    parser.add_argument("--max-det", type=int, default=1000, help="每帧最大检测数量")
+    parser.add_argument("--imgsz", type=int, default=None, help="推理输入尺寸")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次推理的帧数")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数，默认等于 CPU 核数")
+    parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS, help="目标段长（秒）")
+    parser.add_argument("--restart", action="store_true", help="丢弃已有检查点，从头开始")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.video):
+        print(f"Error: Video not found at {args.video}", file=sys.stderr)
+        return 1
+    job = ParallelVideoJob(args.video, model_path=args.model, conf=args.conf, max_det=args.max_det, imgsz=args.imgsz,
+                           batch_size=args.batch_size, workers=args.workers, segment_seconds=args.segment_seconds)
+
+    def report(done: int, total: int):
+        print(f"[{done}/{total}] 段", flush=True)
+
+    try:
+        summary = job.run(progress=report, restart=args.restart)
+    except KeyboardInterrupt:
+        print(f"已中断，重新运行即可从检查点继续: {job.job_dir}")
+        return 130
+    print(format_summary(summary))
+    return 0 if summary["output"] and not summary["errors"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
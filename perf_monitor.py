@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+WINDOW_SIZE = 300  # 每个阶段保留最近的样本数，统计与直方图都基于这个滚动窗口
+MAX_TRACE_EVENTS = 200_000  # 追踪事件环形缓冲上限，超出后丢弃最旧的事件
+HISTOGRAM_EDGES_MS = (1, 2, 4, 8, 16, 33, 66)  # 直方图分桶上界 (ms)，最后一桶为 >66 ms
+_SPARK = "▁▂▃▄▅▆▇█"
+
+
+# ========================== 性能监视器 ==========================
+class PerfMonitor:
+    # 热路径上的分阶段计时与计数：每个阶段保留滚动窗口供界面 HUD 展示分位数与直方图，
+    # 开启 tracing 后同时记录每次计时的起止，可导出为 Chrome 追踪格式 (chrome://tracing / Perfetto)。
+
+    def __init__(self, window: int = WINDOW_SIZE, max_events: int = MAX_TRACE_EVENTS):
+        self.window = window
+        self.tracing = False
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}  # 阶段 -> (结束时刻, 耗时 ms)
+        self._counters: Dict[str, int] = {}
+        self._events: Deque[tuple] = deque(maxlen=max_events)
+        self._thread_names: Dict[int, str] = {}
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000, start)
+
+    def add(self, name: str, ms: float, start: Optional[float] = None):
+        # 记录一个耗时样本；start 为 perf_counter 起始时刻，省略时按“刚刚结束”计算
+        end = time.perf_counter()
+        if start is None:
+            start = end - ms / 1000
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append((end, ms))
+            if self.tracing:
+                thread = threading.current_thread()
+                self._thread_names.setdefault(thread.ident, thread.name)
+                self._events.append((name, thread.ident, start, ms))
+
+    def set_counter(self, name: str, value: int):
+        with self._lock:
+            self._counters[name] = value
+            if self.tracing:
+                self._events.append((name, None, time.perf_counter(), value))
+
+    def reset(self, prefix: str = ''):
+        with self._lock:
+            for name in [name for name in self._samples if name.startswith(prefix)]:
+                del self._samples[name]
+            for name in [name for name in self._counters if name.startswith(prefix)]:
+                del self._counters[name]
+
+    # ---------- 统计 ----------
+    def snapshot(self, prefix: str = '') -> Dict[str, dict]:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items() if name.startswith(prefix)}
+            counters = {name: value for name, value in self._counters.items() if name.startswith(prefix)}
+        stats: Dict[str, dict] = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            ends = np.array([end for end, _ in values])
+            durations = np.array([ms for _, ms in values])
+            span = ends[-1] - ends[0]
+            stats[name] = {
+                "p50_ms": float(np.percentile(durations, 50)),
+                "p95_ms": float(np.percentile(durations, 95)),
+                "max_ms": float(durations.max()),
+                "rate": (len(values) - 1) / span if span > 0 else 0.0,  # 每秒次数
+                "histogram": np.bincount(np.searchsorted(HISTOGRAM_EDGES_MS, durations),
+                                         minlength=len(HISTOGRAM_EDGES_MS) + 1).tolist(),
+            }
+        for name, value in counters.items():
+            stats[name] = {"count": value}
+        return stats
+
+    # ---------- 追踪导出 ----------
+    def export_chrome_trace(self, path: str) -> int:
+        # 导出为 Chrome Trace Event 格式的 JSON，返回事件数
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        pid = os.getpid()
+        trace: List[dict] = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                             for tid, name in thread_names.items()]
+        for name, tid, start, value in events:
+            ts = (start - self._origin) * 1e6
+            if tid is None:
+                trace.append({"name": name, "ph": "C", "pid": pid, "ts": ts, "args": {"value": value}})
+            else:
+                trace.append({"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": ts, "dur": value * 1000})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+def sparkline(histogram: List[int]) -> str:
+    # 把直方图画成一行字符，便于在状态栏里直观看出耗时分布
+    peak = max(histogram) or 1
+    return "".join(_SPARK[min(len(_SPARK) - 1, int(count / peak * (len(_SPARK) - 1) + 0.999))] if count else " "
+                   for count in histogram)
+
+
+def format_hud(stats: Dict[str, dict], prefix: str = '') -> str:
+    lines = []
+    for name, stat in sorted(stats.items()):
+        label = name[len(prefix):]
+        if "count" in stat:
+            lines.append(f"{label:<18} {stat['count']:>8d}")
+        else:
+            lines.append(f"{label:<18} P50 {stat['p50_ms']:6.1f}  P95 {stat['p95_ms']:6.1f}  max {stat['max_ms']:6.1f} ms  "
+                         f"{stat['rate']:5.1f}/s  |{sparkline(stat['histogram'])}|")
+    return "\n".join(lines)
+
+
+@contextmanager
+def _disabled() -> Iterator[None]:
+    yield
+
+
+def stage(monitor: Optional[PerfMonitor], name: str):
+    # monitor 为 None 时不计时
+    return monitor.stage(name) if monitor is not None else _disabled()
+
+
+perf_monitor = PerfMonitor()
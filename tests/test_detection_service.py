@@ -0,0 +1,214 @@
+import http.client
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from detection_service import DetectionService, RemoteBoxes, RemoteModel
+
+NAMES = {0: 'porosity', 1: 'crack'}
+
+
+# ========================== 桩模型 ==========================
+class StubResult:
+    def __init__(self, image: np.ndarray):
+        height, width = image.shape[:2]
+        # 每张图固定三个框，置信度各不相同，用于检查按请求过滤 conf 与 max_det
+        self.boxes = RemoteBoxes(np.array([[0, 0, width / 2, height / 2], [1, 1, 5, 5], [2, 2, width, height]],
+                                          np.float32),
+                                 np.array([0.5, 0.9, 0.2], np.float32), np.array([1, 0, 0], np.int32))
+
+
+class StubModel:
+    # 记录每次推理的批大小与参数；gate 未打开时推理阻塞，用于制造排队与超时
+    path = 'stub.pt'
+    names = NAMES
+
+    def __init__(self):
+        self.calls = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, source, conf=0.25, max_det=300):
+        images = source if isinstance(source, list) else [source]
+        self.calls.append((len(images), conf, max_det))
+        self.entered.set()
+        self.gate.wait(10)
+        return [StubResult(image) for image in images]
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def factory(**kwargs):
+        model = StubModel()
+        service = DetectionService(model, port=0, **kwargs).start()
+        services.append(service)
+        return service, model
+
+    yield factory
+    for service in services:
+        service.model.gate.set()
+        service.shutdown()
+
+
+def encoded_image(width: int = 64, height: int = 48) -> bytes:
+    return cv2.imencode('.png', np.zeros((height, width, 3), np.uint8))[1].tobytes()
+
+
+def post(service: DetectionService, body: bytes, query: str = ''):
+    # 返回 (状态码, 响应头, JSON)
+    request = urllib.request.Request(f"{service.url}/detect{query}", data=body, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, json.loads(e.read())
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+# ========================== 测试 ==========================
+def test_detect_filters_per_request(make_service):
+    service, _ = make_service()
+    status, _, payload = post(service, encoded_image(), '?conf=0.3&max_det=5')
+    assert status == 200
+    assert payload["conf"] == pytest.approx([0.9, 0.5])  # 按置信度从高到低，低于 conf 的被过滤
+    assert payload["cls"] == [0, 1]
+    assert payload["image_size"] == [64, 48]
+
+    _, _, payload = post(service, encoded_image(), '?conf=0.1&max_det=1')
+    assert payload["conf"] == pytest.approx([0.9])
+
+
+def test_bad_requests_return_400(make_service):
+    service, model = make_service()
+    assert post(service, b'not an image')[0] == 400
+    assert post(service, b'')[0] == 400
+    connection = http.client.HTTPConnection(*service.httpd.server_address[:2], timeout=10)
+    connection.putrequest('POST', '/detect')
+    connection.putheader('Content-Length', 'abc')
+    connection.endheaders()
+    assert connection.getresponse().status == 400
+    connection.close()
+    assert service.counters["errors"] == 3
+    assert model.calls == []
+
+
+def test_concurrent_requests_are_batched_with_mixed_thresholds(make_service):
+    service, model = make_service(max_batch=8, max_wait_ms=200)
+    model.gate.clear()
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        # 第一个请求占住推理线程，其余请求在此期间排队，放行后应合成一批
+        first = pool.submit(post, service, encoded_image(), '?conf=0.25')
+        wait_until(model.entered.is_set)
+        queries = ['?conf=0.1&max_det=3', '?conf=0.6&max_det=3', '?conf=0.3&max_det=1'] * 2
+        futures = [pool.submit(post, service, encoded_image(), query) for query in queries]
+        wait_until(lambda: service.batcher.depth == len(queries))
+        model.gate.set()
+        responses = [future.result() for future in futures]
+        assert first.result()[0] == 200
+
+    assert [call[0] for call in model.calls] == [1, len(queries)]
+    assert model.calls[1][1:] == (pytest.approx(0.1), 3)  # 一批按最低 conf、最大 max_det 推理
+    for query, (status, _, payload) in zip(queries, responses):
+        assert status == 200
+        expected = {'?conf=0.1&max_det=3': [0.9, 0.5, 0.2], '?conf=0.6&max_det=3': [0.9],
+                    '?conf=0.3&max_det=1': [0.9]}[query]
+        assert payload["conf"] == pytest.approx(expected)  # 再按各自的参数过滤，与单独推理一致
+
+
+def test_full_queue_returns_503(make_service):
+    service, model = make_service(max_batch=1, max_queue=1)
+    model.gate.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        running = pool.submit(post, service, encoded_image())
+        wait_until(model.entered.is_set)
+        queued = pool.submit(post, service, encoded_image())
+        wait_until(lambda: service.batcher.depth == 1)
+        status, headers, _ = post(service, encoded_image())
+        assert status == 503
+        assert headers["Retry-After"] == "1"
+        model.gate.set()
+        assert running.result()[0] == 200
+        assert queued.result()[0] == 200
+    assert service.counters["rejected"] == 1
+
+
+def test_inference_timeout_returns_504(make_service):
+    service, model = make_service(request_timeout=0.2)
+    model.gate.clear()
+    status, _, _ = post(service, encoded_image())
+    assert status == 504
+    assert service.counters["timeouts"] == 1
+
+
+def test_metrics(make_service):
+    service, _ = make_service()
+    post(service, encoded_image())
+    post(service, b'broken')
+    with urllib.request.urlopen(f"{service.url}/metrics", timeout=10) as response:
+        assert response.headers["Content-Type"].startswith('text/plain')
+        lines = response.read().decode('utf-8').splitlines()
+    assert "weld_detection_requests_total 2" in lines
+    assert "weld_detection_errors_total 1" in lines
+    assert "weld_detection_images_total 1" in lines
+    assert 'weld_detection_batch_size_bucket{le="1"} 1' in lines
+    assert any(line.startswith('weld_detection_request_ms{quantile="0.95"}') for line in lines)
+
+
+def test_remote_model_round_trip(make_service):
+    service, model = make_service(max_wait_ms=100)
+    remote = RemoteModel(service.url)
+    assert remote.names == NAMES
+    assert remote.path == service.url
+
+    image = np.zeros((48, 64, 3), np.uint8)
+    results = remote(image, conf=0.3, max_det=10)
+    assert len(results) == 1
+    assert results[0].boxes.conf.tolist() == pytest.approx([0.9, 0.5])
+    assert results[0].boxes.xyxy.shape == (2, 4)
+    assert results[0].orig_img is image
+
+    results = remote([image] * 4, conf=0.1, max_det=2)  # 多张图片并发提交，由服务端合批
+    assert [len(result.boxes.conf) for result in results] == [2] * 4
+    assert sum(call[0] for call in model.calls) == 5
+
+
+def test_remote_model_retries_when_busy(make_service):
+    service, model = make_service(max_batch=1, max_queue=1)
+    model.gate.clear()
+    remote = RemoteModel(service.url, retries=3)
+    image = np.zeros((48, 64, 3), np.uint8)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        running = pool.submit(remote, image)
+        wait_until(model.entered.is_set)
+        queued = pool.submit(remote, image)
+        wait_until(lambda: service.batcher.depth == 1)
+        retried = pool.submit(remote, image)  # 先收到 503，放行后重试成功
+        wait_until(lambda: service.counters["rejected"] >= 1)
+        model.gate.set()
+        for future in (running, queued, retried):
+            assert len(future.result()[0].boxes.conf) == 2
+
+
+def test_remote_model_close(make_service):
+    service, _ = make_service()
+    remote = RemoteModel(service.url)
+    remote.close()
+    image = np.zeros((48, 64, 3), np.uint8)
+    results = remote([image] * 2)  # 关闭后仍在使用旧引用的调用方逐张推理，不报错
+    assert [len(result.boxes.conf) for result in results] == [2] * 2
@@ -0,0 +1,130 @@
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from overlay_renderer import result_arrays
+
+TILE_CACHE_DIR = os.path.join('cache', 'tiles')
+MAX_TILE_CACHE_FILES = 16  # 解码后的原图按内容摘要落盘为 .npy，只保留最近使用的若干张
+DEFAULT_TILE_SIZE = 640
+DEFAULT_TILE_OVERLAP = 0.2
+
+
+# ========================== 图像读取 ==========================
+def _prune_tile_cache(cache_dir: str, keep: int):
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.npy')]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_image_mmap(path: str, digest: str, cache_dir: str = TILE_CACHE_DIR) -> np.ndarray:
+    # 高分辨率图片只解码一次并写成未压缩的 .npy，之后以内存映射方式打开：
+    # 切块只是对映射数组的切片，按需从磁盘读入，不会为每个切块或每次检测重复解码整张图
+    target = os.path.join(cache_dir, f"{digest}.npy")
+    if not os.path.exists(target):
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"无法读取图片: {path}")
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f"{target}.{os.getpid()}.tmp"
+        with open(partial, 'wb') as f:
+            np.save(f, image)
+        del image
+        os.replace(partial, target)
+        _prune_tile_cache(cache_dir, MAX_TILE_CACHE_FILES)
+    else:
+        os.utime(target)
+    return np.load(target, mmap_mode='r')
+
+
+# ========================== 切块 ==========================
+def tile_grid(width: int, height: int, tile_size: int = DEFAULT_TILE_SIZE,
+              overlap: float = DEFAULT_TILE_OVERLAP) -> List[Tuple[int, int, int, int]]:
+    # 返回覆盖整张图的切块 (x1, y1, x2, y2)；相邻切块重叠 overlap 比例，最后一块贴齐图像边缘
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1.0 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+# ========================== 跨切块合并 ==========================
+def merge_detections(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, iou_threshold: float = 0.5,
+                     ios_threshold: float = 0.8, max_det: int = 1000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 按类别的贪心 NMS：除 IoU 外还用“交集 / 较小框面积”判重，
+    # 以去掉切块边缘被截断、只框住缺陷一部分的重复框；逐框向量化计算，内存只随框数线性增长
+    order = np.argsort(-conf)
+    xyxy, conf, cls = xyxy[order], conf[order], cls[order]
+    areas = np.prod(np.clip(xyxy[:, 2:] - xyxy[:, :2], 0, None), axis=1)
+    suppressed = np.zeros(len(conf), dtype=bool)
+    keep = []
+    for i in range(len(conf)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) >= max_det:
+            break
+        rest = np.where(~suppressed[i + 1:] & (cls[i + 1:] == cls[i]))[0] + i + 1
+        if len(rest) == 0:
+            continue
+        top_left = np.maximum(xyxy[i, :2], xyxy[rest, :2])
+        bottom_right = np.minimum(xyxy[i, 2:], xyxy[rest, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+        iou = intersection / np.maximum(areas[i] + areas[rest] - intersection, 1e-9)
+        ios = intersection / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+        suppressed[rest[(iou >= iou_threshold) | (ios >= ios_threshold)]] = True
+    return xyxy[keep], conf[keep], cls[keep]
+
+
+# ========================== 分块检测 ==========================
+def detect_tiled(model, image: np.ndarray, tile_size: int = DEFAULT_TILE_SIZE, overlap: float = DEFAULT_TILE_OVERLAP,
+                 conf: float = 0.25, max_det: int = 1000, batch_size: int = 8,
+                 full_pass: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # image 可以是内存映射数组；切块按 batch_size 一批送入模型，同一时刻只有一批切块的副本在内存中。
+    # full_pass 额外在缩小的整图上检测一次，找回跨越多个切块的大缺陷
+    height, width = image.shape[:2]
+    tiles = tile_grid(width, height, tile_size, overlap)
+    boxes: List[np.ndarray] = []
+    confs: List[np.ndarray] = []
+    classes: List[np.ndarray] = []
+
+    def collect(result, offset_x: float = 0.0, offset_y: float = 0.0, scale: float = 1.0):
+        xyxy, c, k = result_arrays(result)
+        if len(c):
+            boxes.append(xyxy / scale + np.array([offset_x, offset_y, offset_x, offset_y], dtype=np.float32))
+            confs.append(c)
+            classes.append(k)
+
+    for start in range(0, len(tiles), batch_size):
+        batch = tiles[start:start + batch_size]
+        crops = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in batch]
+        results = model(crops if len(crops) > 1 else crops[0], conf=conf, max_det=max_det)
+        for (x1, y1, _, _), result in zip(batch, results):
+            collect(result, x1, y1)
+
+    if full_pass and len(tiles) > 1:
+        scale = tile_size / max(width, height)
+        reduced = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        collect(model(reduced, conf=conf, max_det=max_det)[0], scale=scale)
+
+    if not confs:
+        return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32)
+    return merge_detections(np.concatenate(boxes), np.concatenate(confs), np.concatenate(classes), max_det=max_det)
+
+
+def tiling_variant(tiling: Optional[Tuple[int, float]]) -> str:
+    # 分块参数不同结果也不同，作为检测缓存键的一部分
+    if not tiling:
+        return ''
+    return f"tile{tiling[0]}x{int(round(tiling[1] * 100))}"
@@ -0,0 +1,172 @@
+import queue
+import threading
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from frame_scheduler import FrameScheduler
+from perf_monitor import PerfMonitor, stage
+
+_END = object()  # 流结束标记，沿流水线逐级向下传递
+
+
+# ========================== 帧数据包 ==========================
+class FramePacket:
+    # 在各级之间传递的单帧数据：帧序号、时间戳(毫秒)、原始帧以及推理结果
+    __slots__ = ('index', 'timestamp', 'frame', 'result', 'detect')
+
+    def __init__(self, index: int, timestamp: float, frame: np.ndarray):
+        self.index = index
+        self.timestamp = timestamp
+        self.frame = frame
+        self.result: Any = None
+        self.detect = True  # False 表示该帧不推理（跟踪模式下的中间帧），result 保持 None
+
+
+# ========================== 视频流水线 ==========================
+class VideoPipeline:
+    # 解码线程 -> 推理线程 -> 调用方(标注/转换)，级间使用有界队列：
+    # 下游处理不过来时上游会阻塞在 put 上，从而形成背压，内存占用保持有界。
+    # 整体帧率取决于最慢的一级，而不是各级耗时之和。
+    # infer 接收一批帧并按相同顺序返回结果；batch_size > 1 时推理线程凑满一批再调用一次，
+    # 用于离线视频分析，摊薄每次调用的固定开销。
+    # 传入 scheduler 时，已错过显示时刻的帧在推理前即被丢弃；传入 monitor 时记录解码与推理各自的耗时。
+    # detect_interval > 1 时每隔这么多帧才推理一次，其余帧不推理、按序直接交给调用方（由跟踪器外推）。
+
+    def __init__(self, source, infer: Callable[[List[np.ndarray]], List[Any]],
+                 queue_size: int = 4, batch_size: int = 1, scheduler: Optional[FrameScheduler] = None,
+                 monitor: Optional[PerfMonitor] = None, detect_interval: int = 1):
+        self.source = source
+        self.infer = infer
+        self.scheduler = scheduler
+        self.monitor = monitor
+        self.batch_size = max(1, batch_size)
+        self.detect_interval = max(1, detect_interval)
+        self._last_detected: Optional[int] = None
+        self.decoded: queue.Queue = queue.Queue(maxsize=max(queue_size, self.batch_size))
+        self.inferred: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.error: Optional[BaseException] = None
+        self.fps = 0.0
+        self._cap = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 0.0
+        return True
+
+    def start(self):
+        if self.scheduler is not None:
+            self.scheduler.start()
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name="video-decode", daemon=True),
+            threading.Thread(target=self._infer_loop, name="video-infer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, wait: bool = True):
+        # wait=False 只发出停止请求，供 GUI 线程调用，避免在界面线程里 join
+        self._stop.set()
+        if not wait:
+            return
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+        self._threads = []
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        # 带超时的阻塞写入，保证 stop() 之后各级能及时退出
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode_loop(self):
+        cap = self._cap
+        index = 0
+        try:
+            while not self._stop.is_set():
+                with stage(self.monitor, "video/decode"):
+                    success, frame = cap.read()
+                if not success:
+                    break
+                packet = FramePacket(index, cap.get(cv2.CAP_PROP_POS_MSEC), frame)
+                if not self._put(self.decoded, packet):
+                    break
+                index += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            cap.release()
+            self._put(self.decoded, _END)
+
+    def _next_batch(self) -> Tuple[List[FramePacket], bool]:
+        # 返回 (本批帧, 是否已到流末尾)；批大小只计需要推理的帧
+        batch = []
+        detect = 0
+        while detect < self.batch_size:
+            packet = self._get(self.decoded)
+            if packet is _END:
+                return batch, True
+            if self.scheduler is not None and self.scheduler.is_late(packet.index):
+                continue
+            # 按距上一次推理的帧数判断而不是取模，被丢弃的帧不会让检测间隔变长
+            packet.detect = self._last_detected is None or packet.index - self._last_detected >= self.detect_interval
+            if packet.detect:
+                self._last_detected = packet.index
+                detect += 1
+            batch.append(packet)
+            if not packet.detect and detect == 0:
+                break  # 中间帧不必等凑满一批，直接交给调用方
+        return batch, False
+
+    def _infer_loop(self):
+        try:
+            ended = False
+            while not ended and not self._stop.is_set():
+                batch, ended = self._next_batch()
+                if not batch:
+                    continue
+                targets = [packet for packet in batch if packet.detect]
+                if targets:
+                    with stage(self.monitor, "video/infer"):
+                        results = self.infer([packet.frame for packet in targets])
+                    for packet, result in zip(targets, results):  # 按帧序拆回各帧
+                        packet.result = result
+                for packet in batch:
+                    if not self._put(self.inferred, packet):
+                        return
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(self.inferred, _END)
+
+    def __iter__(self) -> Iterator[FramePacket]:
+        # 标注/转换阶段由调用方所在线程完成，按帧序依次取出推理结果
+        while True:
+            packet = self._get(self.inferred)
+            if packet is _END:
+                return
+            yield packet